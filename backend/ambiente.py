@@ -0,0 +1,31 @@
+"""
+Variáveis de ambiente numéricas da configuração (processos, lotes, prazos).
+
+Lidas na importação dos módulos: um valor inválido (não numérico ou abaixo do mínimo) vira o padrão
+com um aviso, em vez de impedir o servidor de subir.
+"""
+import os
+
+
+def inteiro_do_ambiente(nome, padrao, minimo=1):
+    """Valor inteiro da variável de ambiente (>= minimo); inválido ou ausente -> padrao (com aviso, se inválido)"""
+    valor = os.getenv(nome)
+    if valor is None or not valor.strip():
+        return padrao
+    try:
+        numero = int(valor)
+    except ValueError:
+        numero = None
+    if numero is None or numero < minimo:
+        print(f"⚠️ {nome}={valor!r} inválido (esperado inteiro >= {minimo}); usando {padrao}")
+        return padrao
+    return numero
+
+
+# Processos do gunicorn (WEB_CONCURRENCY, 2 como no Procfile): cada um abre os próprios pools de processos
+PROCESSOS_WEB = inteiro_do_ambiente('WEB_CONCURRENCY', 2)
+
+
+def processos_por_worker_web():
+    """Padrão dos pools: os núcleos divididos entre os processos do servidor web, para não disputarem a CPU"""
+    return max(1, (os.cpu_count() or 1) // PROCESSOS_WEB)
@@ -0,0 +1,183 @@
+"""
+Análise de itens de um caderno (dificuldade, discriminação e distratores).
+
+As respostas gravadas do caderno são carregadas uma vez em uma matriz uint8 (resultados x questões,
+no layout do gabarito compilado; as respostas compactas já estão nesse formato) e todas as
+estatísticas são calculadas com NumPy:
+- p-valor: proporção de acertos entre os alunos que responderam a questão;
+- discriminação: correlação ponto-bisserial entre acertar a questão e a nota nas demais questões;
+- distratores: frequência de cada alternativa, em branco e marcação múltipla ('X').
+O resultado fica em cache pelo caderno + filtros e é invalidado pelas versões 'gabarito' e 'resultados'.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from database import db, Aluno, Turma, ResultadoAluno, RespostaAluno
+from gabarito_compilado import obter_gabarito_compilado
+from motor_correcao import (
+    corrigir_matriz, codificar_resposta, LETRAS, CODIGO_BRANCO, CODIGO_MULTIPLA, CODIGO_AUSENTE
+)
+from resultados_componente import versao_resultados
+from respostas_compactas import matriz_compacta
+
+LIMITE_CACHE = 128
+
+# Códigos contados na distribuição de respostas de cada questão
+OPCOES = [(letra, codificar_resposta(letra)) for letra in LETRAS] + [('Branco', CODIGO_BRANCO), ('X', CODIGO_MULTIPLA)]
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def _filtrar_resultados(query, gabarito, ano, periodo, turma_ids, escola_id):
+    query = query.filter(
+        ResultadoAluno.caderno_id == gabarito.caderno_id,
+        ResultadoAluno.fez_prova == True
+    )
+    if ano:
+        query = query.filter(ResultadoAluno.ano_avaliacao == ano)
+    if periodo:
+        query = query.filter(ResultadoAluno.periodo_avaliacao == periodo)
+    if turma_ids or escola_id:
+        query = query.join(Aluno, ResultadoAluno.aluno_id == Aluno.id)
+        if turma_ids:
+            query = query.filter(Aluno.turma_id.in_(turma_ids))
+        if escola_id:
+            query = query.join(Turma, Aluno.turma_id == Turma.id).filter(Turma.escola_id == escola_id)
+    return query
+
+
+def carregar_matriz_respostas(gabarito, ano=None, periodo=None, turma_ids=None, escola_id=None):
+    """Carrega as respostas dos alunos que fizeram a prova em uma matriz (linhas = resultados)"""
+    # Resultados com respostas compactas: o texto de cada um já é a linha da matriz
+    compactas = _filtrar_resultados(db.session.query(
+        ResultadoAluno.respostas_compactas, ResultadoAluno.layout_respostas
+    ).filter(
+        ResultadoAluno.respostas_compactas.isnot(None)
+    ), gabarito, ano, periodo, turma_ids, escola_id).order_by(ResultadoAluno.id).all()
+    matriz_compactas = matriz_compacta(gabarito, compactas)
+
+    # Resultados antigos, ainda só em RespostaAluno
+    linhas = _filtrar_resultados(db.session.query(
+        RespostaAluno.resultado_id,
+        RespostaAluno.bloco_id,
+        RespostaAluno.questao_id,
+        RespostaAluno.resposta_marcada
+    ).join(
+        ResultadoAluno, RespostaAluno.resultado_id == ResultadoAluno.id
+    ).filter(
+        ResultadoAluno.respostas_compactas.is_(None)
+    ), gabarito, ano, periodo, turma_ids, escola_id).all()
+    if not linhas:
+        return matriz_compactas
+
+    indice_coluna = {(bloco.id, ordem): coluna for coluna, (bloco, ordem) in enumerate(gabarito.colunas)}
+    resultado_ids = np.fromiter((linha[0] for linha in linhas), dtype=np.int64, count=len(linhas))
+    # Cada resposta vai para a coluna atual da sua questão (o bloco pode ter sido reordenado depois da correção)
+    colunas = np.fromiter((indice_coluna.get((linha[1], gabarito.ordem_da_questao(linha[1], linha[2])), -1) for linha in linhas),
+                          dtype=np.int64, count=len(linhas))
+    codigos = np.fromiter((codificar_resposta(linha[3]) for linha in linhas), dtype=np.uint8, count=len(linhas))
+
+    # Respostas de questões que não existem mais no caderno são ignoradas
+    validas = colunas >= 0
+    _, linhas_matriz = np.unique(resultado_ids, return_inverse=True)
+    matriz = np.full((linhas_matriz.max() + 1, len(gabarito.colunas)), CODIGO_AUSENTE, dtype=np.uint8)
+    matriz[linhas_matriz[validas], colunas[validas]] = codigos[validas]
+    return np.vstack([matriz_compactas, matriz])
+
+
+def _ponto_bisserial(acertou, respondidas):
+    """Correlação ponto-bisserial de cada questão com a nota nas demais questões (item-resto)"""
+    acertou = acertou.astype(np.float64)
+    mascara = respondidas.astype(np.float64)
+    resto = acertou.sum(axis=1, keepdims=True) - acertou  # Nota sem a própria questão
+
+    n = mascara.sum(axis=0)
+    n_acertos = acertou.sum(axis=0)
+    soma = (resto * mascara).sum(axis=0)
+    soma_quadrados = (resto ** 2 * mascara).sum(axis=0)
+    soma_acertos = (resto * acertou).sum(axis=0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        media = soma / n
+        desvio = np.sqrt(soma_quadrados / n - media ** 2)
+        media_acertos = soma_acertos / n_acertos
+        media_erros = (soma - soma_acertos) / (n - n_acertos)
+        p = n_acertos / n
+        correlacao = (media_acertos - media_erros) / desvio * np.sqrt(p * (1 - p))
+    # Indefinida quando todos acertaram/erraram ou as notas não variam
+    return np.where((n_acertos > 0) & (n_acertos < n) & (desvio > 1e-12), correlacao, np.nan)
+
+
+def calcular_analise(gabarito, matriz):
+    """Estatísticas por questão a partir da matriz de respostas"""
+    correcao = corrigir_matriz(gabarito, matriz)
+    respondidas = correcao.respondidas
+    com_gabarito = gabarito.chave != 0
+
+    respondentes = respondidas.sum(axis=0)
+    acertos = correcao.acertou.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p_valor = np.where(respondentes > 0, acertos / respondentes, np.nan)
+    discriminacao = _ponto_bisserial(correcao.acertou[:, com_gabarito], respondidas[:, com_gabarito])
+    discriminacao_por_coluna = np.full(len(gabarito.colunas), np.nan)
+    discriminacao_por_coluna[com_gabarito] = discriminacao
+
+    frequencias = np.stack([(matriz == codigo).sum(axis=0) for _, codigo in OPCOES])
+
+    def valor(numero, casas=3):
+        return None if np.isnan(numero) else round(float(numero), casas)
+
+    itens = []
+    for coluna, (bloco, ordem) in enumerate(gabarito.colunas):
+        item = gabarito.item(bloco.ordem, ordem)
+        total = int(respondentes[coluna])
+        itens.append({
+            'bloco_id': bloco.id,
+            'bloco_ordem': bloco.ordem,
+            'componente': bloco.componente,
+            'questao_ordem': ordem,
+            'questao_id': item.questao_id if item else None,
+            'resposta_correta': item.resposta_correta if item and com_gabarito[coluna] else None,
+            'respondentes': total,
+            'acertos': int(acertos[coluna]),
+            'p_valor': valor(p_valor[coluna]) if com_gabarito[coluna] else None,
+            'discriminacao': valor(discriminacao_por_coluna[coluna]),
+            'alternativas': {
+                opcao: {
+                    'quantidade': int(frequencias[indice, coluna]),
+                    'percentual': round(int(frequencias[indice, coluna]) / total * 100, 1) if total else 0
+                } for indice, (opcao, _) in enumerate(OPCOES)
+            }
+        })
+
+    notas = correcao.acertos
+    return {
+        'total_alunos': int(matriz.shape[0]),
+        'media_acertos': round(float(notas.mean()), 2) if matriz.shape[0] else 0,
+        'itens': itens
+    }
+
+
+def obter_analise_itens(caderno_id, ano=None, periodo=None, turma_ids=None, escola_id=None):
+    """Retorna a análise de itens do caderno, usando o cache enquanto gabarito e resultados não mudarem"""
+    gabarito = obter_gabarito_compilado(caderno_id)
+    versao = (gabarito.versao, versao_resultados(caderno_id))
+    chave = (caderno_id, ano, periodo, tuple(sorted(turma_ids or ())), escola_id)
+
+    with _lock:
+        entrada = _cache.get(chave)
+        if entrada is not None and entrada[0] == versao:
+            _cache.move_to_end(chave)
+            return entrada[1]
+
+    matriz = carregar_matriz_respostas(gabarito, ano, periodo, turma_ids, escola_id)
+    analise = calcular_analise(gabarito, matriz)
+    with _lock:
+        _cache[chave] = (versao, analise)
+        _cache.move_to_end(chave)
+        while len(_cache) > LIMITE_CACHE:
+            _cache.popitem(last=False)
+    return analise
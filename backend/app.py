@@ -1,10 +1,11 @@
-from flask import Flask, render_template, send_from_directory, session, redirect, url_for, send_file, jsonify, request, flash
+from flask import Flask, render_template, send_from_directory, session, redirect, url_for, send_file, jsonify, request, flash, Response, stream_with_context
 import os
 import time
 import json
+import tempfile
 from auth import auth_bp
 from ai_integration import ai_bp
-from database import db, init_db, User, Escola, Turma, Aluno, PlanoAula, Habilidade, Questao, Alternativa, Caderno, BlocoCaderno, BlocoQuestao, ResultadoAluno, RespostaAluno
+from database import db, init_db, User, Escola, Turma, Aluno, PlanoAula, Habilidade, Questao, Alternativa, Caderno, BlocoCaderno, BlocoQuestao, ResultadoAluno, RespostaAluno, ResultadoComponente, TarefaCorrecao, VersaoDados
 from io import BytesIO
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
@@ -24,6 +25,34 @@ from functools import wraps
 from datetime import datetime
 from relatorios import relatorios_bp
 from newsletter import newsletter_bp
+from gabarito_compilado import obter_gabarito_compilado, invalidar_gabarito, invalidar_gabaritos_da_questao, descartar_gabarito
+from motor_correcao import corrigir_matriz, matriz_de_respostas, CODIGO_SEM_GABARITO
+from cartoes_gabarito import gerar_pdf_cartoes, gravar_pdf_cartoes
+from resultados_componente import atualizar_agregados_resultados, remover_agregados_resultados, reconstruir_agregados_resultados, acertos_pelas_respostas, ESCOPO_RESULTADOS
+from dominio_habilidades import consultar_dominio, NIVEIS as NIVEIS_DOMINIO
+from analise_itens import obter_analise_itens
+from desempenho_periodos import comparar_periodos
+from cache_relatorios import cache_relatorio, escopos_pelos_filtros
+from gravacao_resultados import upsert_resultado, upsert_resultados, chave_resultado
+from respostas_compactas import (
+    compactar_correcao, compactar_linhas, respostas_dos_resultados, resultados_com_questao,
+    remover_questao_dos_resultados, compactar_resultados_antigos, SEM_RESPOSTAS, COLUNAS_COMPACTAS
+)
+from paginacao import parametros_paginacao, paginar, dados_paginacao, filtro_prefixo, filtro_contem, CursorInvalido
+from projecao_listagens import Projecao, Campo, coluna, CampoInvalido
+from ranking_resultados import (
+    consultar_ranking, posicao_no_ranking, recalcular_rankings_pendentes, ESCOPOS as ESCOPOS_RANKING
+)
+from exportacao_resultados import (
+    consulta_exportacao, iterar_linhas, cabecalho_exportacao, gerar_csv, gerar_xlsx,
+    TIPOS as TIPOS_EXPORTACAO, FORMATOS as FORMATOS_EXPORTACAO
+)
+from snapshot_analitico import atualizar_snapshot, carregar_manifesto, arquivos_snapshot, diretorio_snapshot
+from armazenamento_imagens import (
+    processar_imagem, url_imagem, tipo_da_imagem, armazenamento, limpar_imagens_orfas, ImagemInvalida
+)
+from worker_correcao import iniciar_worker_embutido
+from fila_correcao import enfileirar_tarefa, serializar_tarefa, solicitar_cancelamento, reenfileirar_falhas, STATUS_FINALIZADOS
 from reportlab.lib.pagesizes import A4
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -32,6 +61,11 @@ from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
 import io
 import json
+import zipfile
+import click
+from itertools import groupby
+from operator import attrgetter
+from werkzeug.utils import secure_filename
 
 
 # Carregar variáveis de ambiente
@@ -109,6 +143,27 @@ app.register_blueprint(kanban_bp)
 app.register_blueprint(relatorios_bp)
 app.register_blueprint(newsletter_bp)
 
+# Relatórios (/api/relatorios/<tipo>): respostas JSON em cache por usuário e filtros, invalidadas pelas
+# gravações de resultados. As listas de opções dos filtros dependem de cadastros e ficam de fora;
+# só GET usa o cache (POST dos relatórios vai sempre para a view).
+for _regra in list(app.url_map.iter_rules()):
+    if _regra.endpoint.startswith(f'{relatorios_bp.name}.') and 'filtros' not in _regra.rule:
+        app.view_functions[_regra.endpoint] = cache_relatorio()(app.view_functions[_regra.endpoint])
+
+# Fila da correção automática: com OMR_WORKER=embutido o worker roda em uma thread do servidor web
+# (hospedagens sem processo separado que enxergue o mesmo disco). Iniciado na primeira requisição de
+# cada processo, para não rodar em comandos `flask ...` nem no processo mestre do gunicorn.
+if os.getenv('OMR_WORKER', '').lower() == 'embutido':
+    _worker_correcao_verificado = False
+
+    @app.before_request
+    def iniciar_worker_correcao():
+        global _worker_correcao_verificado
+        if not _worker_correcao_verificado:
+            _worker_correcao_verificado = True
+            if iniciar_worker_embutido(app):
+                print(f"🚀 Worker da correção automática embutido no processo {os.getpid()}")
+
 
 # Rotas para páginas HTML
 @app.route('/health')
@@ -301,7 +356,9 @@ def habilidades():
     
     # Buscar todas as habilidades do banco de dados
     try:
-        habilidades_list = Habilidade.query.order_by(Habilidade.componente, Habilidade.ano, Habilidade.codigo).all()
+        habilidades_list = Habilidade.query.options(db.load_only(
+            Habilidade.id, Habilidade.codigo, Habilidade.componente, Habilidade.ano, Habilidade.descricao, Habilidade.etapa
+        )).order_by(Habilidade.componente, Habilidade.ano, Habilidade.codigo).all()
         print(f"[DEBUG] Carregadas {len(habilidades_list)} habilidades do banco")
         
         # Converter para dicionários para passar ao template
@@ -367,19 +424,16 @@ def criar_questao():
                 'dificuldade': request.form.get('dificuldade', 'Médio')
             }
             
-            # Processar imagem se presente
-            imagem_data = None
+            # Processar imagem se presente (gravada no armazenamento de imagens; a questão guarda só o hash)
+            imagem_data, imagem_hash = None, None
             if 'imagem' in request.files:
                 imagem_file = request.files['imagem']
                 if imagem_file.filename:
-                    # Converter imagem para base64 para armazenar no banco
-                    import base64
-                    imagem_bytes = imagem_file.read()
-                    imagem_data = base64.b64encode(imagem_bytes).decode('utf-8')
+                    imagem_data, imagem_hash = processar_imagem(imagem_file.read())
         else:
-            # JSON tradicional
+            # JSON tradicional (imagem em base64 ou URL externa)
             data = request.json
-            imagem_data = data.get('imagem')
+            imagem_data, imagem_hash = processar_imagem(data.get('imagem'))
         
         # Buscar informações da habilidade para obter componente se não fornecido
         habilidade = Habilidade.query.get(data['habilidade_id'])
@@ -396,6 +450,7 @@ def criar_questao():
         questao = Questao(
             enunciado=data['enunciado'],
             imagem=imagem_data,
+            imagem_hash=imagem_hash,
             habilidade_id=data['habilidade_id'],
             escola_id=escola_id,
             ano=ano,
@@ -414,91 +469,141 @@ def criar_questao():
         db.session.commit()
         return jsonify({'success': True, 'message': 'Questão criada com sucesso!', 'id': questao.id}), 201
         
+    except ImagemInvalida as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Erro ao criar questão: {str(e)}'}), 500
 
+def alternativas_da_questao(q):
+    """(alternativas, [texto de A a D], resposta_correta) da questão, da tabela Alternativa ou dos campos diretos"""
+    # Buscar alternativas da tabela Alternativa OU usar campos internos da questão
+    if hasattr(q, 'alternativas') and q.alternativas:
+        # Usar tabela Alternativa (modelo novo)
+        alternativas = [
+            {'id': alt.id, 'texto': alt.texto, 'correta': alt.correta}
+            for alt in q.alternativas
+        ]
+
+        # Converter para formato antigo também
+        alternativa_a = alternativa_b = alternativa_c = alternativa_d = ''
+        resposta_correta = ''
+
+        for i, alt in enumerate(alternativas):
+            letra = chr(65 + i)  # A, B, C, D
+            if letra == 'A': alternativa_a = alt['texto']
+            elif letra == 'B': alternativa_b = alt['texto']
+            elif letra == 'C': alternativa_c = alt['texto']
+            elif letra == 'D': alternativa_d = alt['texto']
+
+            if alt['correta']:
+                resposta_correta = letra
+    else:
+        # Usar campos diretos da questão (modelo migrado)
+        alternativa_a = q.alternativa_a or ''
+        alternativa_b = q.alternativa_b or ''
+        alternativa_c = q.alternativa_c or ''
+        alternativa_d = q.alternativa_d or ''
+        resposta_correta = q.resposta_correta or ''
+
+        # Criar lista de alternativas para compatibilidade
+        alternativas = []
+        for i, texto in enumerate([alternativa_a, alternativa_b, alternativa_c, alternativa_d]):
+            if texto:
+                letra = chr(65 + i)  # A, B, C, D
+                alternativas.append({
+                    'id': f"{q.id}_{letra}",
+                    'texto': texto,
+                    'correta': resposta_correta == letra
+                })
+    return alternativas, [alternativa_a, alternativa_b, alternativa_c, alternativa_d], resposta_correta
+
+def _campo_alternativa(valor):
+    # Calculadas uma vez por linha na serialização e compartilhadas pelos campos de alternativas
+    return Campo(_COLUNAS_ALTERNATIVAS, valor, (Questao.alternativas,), alternativas_da_questao)
+
+# Campos da listagem de questões (?fields=): padrão são todos, que a tela do banco de questões usa
+_COLUNAS_ALTERNATIVAS = (
+    Questao.alternativa_a, Questao.alternativa_b, Questao.alternativa_c, Questao.alternativa_d, Questao.resposta_correta
+)
+PROJECAO_QUESTOES = Projecao({
+    'id': coluna(Questao.id),
+    'enunciado': coluna(Questao.enunciado),
+    'imagem': Campo((Questao.imagem, Questao.imagem_hash), url_imagem, ()),
+    'habilidade_id': coluna(Questao.habilidade_id),
+    'escola_id': coluna(Questao.escola_id),
+    'ano': coluna(Questao.ano),
+    'componente': coluna(Questao.componente),
+    'alternativas': _campo_alternativa(lambda alt: alt[0]),
+    # Formato antigo para compatibilidade
+    'alternativa_a': _campo_alternativa(lambda alt: alt[1][0]),
+    'alternativa_b': _campo_alternativa(lambda alt: alt[1][1]),
+    'alternativa_c': _campo_alternativa(lambda alt: alt[1][2]),
+    'alternativa_d': _campo_alternativa(lambda alt: alt[1][3]),
+    'resposta_correta': _campo_alternativa(lambda alt: alt[2]),
+    'dificuldade': coluna(Questao.dificuldade)
+}, chave=[Questao.id])
+
 @app.route('/api/questoes', methods=['GET'])
 def listar_questoes():
     if 'user_id' not in session:
         return jsonify({'error': 'Usuário não autenticado'}), 401
     
     try:
-        # Questões agora são filtradas por escola_id e ano (opcional)
+        # Filtros opcionais: escola_id, ano, componente (um ou vários, separados por vírgula), habilidade,
+        # dificuldade e busca (trecho do enunciado ou do código da habilidade, como a busca antiga da tela).
+        # Paginação por cursor com ?limite= (mais recentes primeiro) e só os campos de ?fields= (todos, por padrão);
+        # sem limite/cursor a lista vem inteira, na ordem de antes (por id)
+        try:
+            limite, cursor, contar_total = parametros_paginacao(request.args)
+            campos = PROJECAO_QUESTOES.campos_pedidos(request.args)
+        except (CursorInvalido, CampoInvalido) as e:
+            return jsonify({'error': str(e)}), 400
+        
+        query = Questao.query.filter(Questao.user_id == session['user_id'])
         escola_id = request.args.get('escola_id')
-        ano = request.args.get('ano')
-    
-        if escola_id and ano:
-            # Filtrar por escola e ano específicos
-            questoes = Questao.query.filter_by(escola_id=escola_id, ano=ano, user_id=session['user_id']).all()
-        elif escola_id:
-            # Filtrar apenas por escola
-            questoes = Questao.query.filter_by(escola_id=escola_id, user_id=session['user_id']).all()
+        ano = request.args.get('ano', type=int)
+        componente = request.args.get('componente')
+        habilidade_id = request.args.get('habilidade', type=int)
+        dificuldade = request.args.get('dificuldade')
+        busca = (request.args.get('busca') or '').strip()
+        if escola_id:
+            query = query.filter(Questao.escola_id == escola_id)
+        if ano:
+            query = query.filter(Questao.ano == ano)
+        if componente:
+            query = query.filter(Questao.componente.in_(componente.split(',')))
+        if habilidade_id:
+            query = query.filter(Questao.habilidade_id == habilidade_id)
+        if dificuldade:
+            query = query.filter(Questao.dificuldade == dificuldade)
+        if busca:
+            query = query.filter(db.or_(
+                filtro_contem(Questao.enunciado, busca),
+                Questao.habilidade_id.in_(
+                    db.select(Habilidade.id).where(filtro_contem(Habilidade.codigo, busca))
+                )
+            ))
+        
+        total = query.count() if contar_total else None
+        query = query.options(*PROJECAO_QUESTOES.opcoes(campos))
+        if limite is None and cursor is None:
+            questoes, tem_mais = paginar(query, [Questao.id])
         else:
-            # Buscar todas as questões do usuário
-            questoes = Questao.query.filter_by(user_id=session['user_id']).all()
-        
-        result = []
-        for q in questoes:
-            # Buscar alternativas da tabela Alternativa OU usar campos internos da questão
-            if hasattr(q, 'alternativas') and q.alternativas:
-                # Usar tabela Alternativa (modelo novo)
-                alternativas = [
-                    {'id': alt.id, 'texto': alt.texto, 'correta': alt.correta}
-                    for alt in q.alternativas
-                ]
-                
-                # Converter para formato antigo também
-                alternativa_a = alternativa_b = alternativa_c = alternativa_d = ''
-                resposta_correta = ''
-                
-                for i, alt in enumerate(alternativas):
-                    letra = chr(65 + i)  # A, B, C, D
-                    if letra == 'A': alternativa_a = alt['texto']
-                    elif letra == 'B': alternativa_b = alt['texto']
-                    elif letra == 'C': alternativa_c = alt['texto']
-                    elif letra == 'D': alternativa_d = alt['texto']
-                    
-                    if alt['correta']:
-                        resposta_correta = letra
-            else:
-                # Usar campos diretos da questão (modelo migrado)
-                alternativa_a = q.alternativa_a or ''
-                alternativa_b = q.alternativa_b or ''
-                alternativa_c = q.alternativa_c or ''
-                alternativa_d = q.alternativa_d or ''
-                resposta_correta = q.resposta_correta or ''
-                
-                # Criar lista de alternativas para compatibilidade
-                alternativas = []
-                for i, texto in enumerate([alternativa_a, alternativa_b, alternativa_c, alternativa_d]):
-                    if texto:
-                        letra = chr(65 + i)  # A, B, C, D
-                        alternativas.append({
-                            'id': f"{q.id}_{letra}",
-                            'texto': texto,
-                            'correta': resposta_correta == letra
-                        })
-            
-            result.append({
-                'id': q.id,
-                'enunciado': q.enunciado,
-                'imagem': q.imagem,
-                'habilidade_id': q.habilidade_id,
-                'escola_id': getattr(q, 'escola_id', None),  # Usar getattr para compatibilidade
-                'ano': getattr(q, 'ano', None),
-                'componente': q.componente,
-                'alternativas': alternativas,
-                # Formato antigo para compatibilidade
-                'alternativa_a': alternativa_a,
-                'alternativa_b': alternativa_b,
-                'alternativa_c': alternativa_c,
-                'alternativa_d': alternativa_d,
-                'resposta_correta': resposta_correta,
-                'dificuldade': q.dificuldade
-            })
-        return jsonify({'questoes': result})
+            questoes, tem_mais = paginar(query, [Questao.id], limite, cursor, decrescente=True)
         
+        result = [PROJECAO_QUESTOES.serializar(q, campos) for q in questoes]
+        
+        resposta = {'questoes': result}
+        if limite is not None or total is not None:
+            resposta['paginacao'] = dados_paginacao(
+                limite, tem_mais, [questoes[-1].id] if questoes else None, total
+            )
+        return jsonify(resposta)
+        
+    except CursorInvalido as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f'[LOG] Erro ao listar questões: {str(e)}')
         return jsonify({'error': f'Erro interno: {str(e)}'}), 500
@@ -520,18 +625,22 @@ def excluir_questao(questao_id):
         
         # Excluir blocos de questões relacionados
         from database import BlocoQuestao
+        invalidar_gabaritos_da_questao(questao_id)
         blocos_questoes = BlocoQuestao.query.filter_by(questao_id=questao_id).all()
         for bloco_questao in blocos_questoes:
             db.session.delete(bloco_questao)
         
-        # Excluir respostas de alunos relacionadas
+        # Excluir respostas de alunos relacionadas (nas respostas compactas, a posição fica sem questão)
         from database import RespostaAluno
+        resultados_afetados = resultados_com_questao(questao_id)
         respostas = RespostaAluno.query.filter_by(questao_id=questao_id).all()
         for resposta in respostas:
             db.session.delete(resposta)
+        remover_questao_dos_resultados(questao_id, resultados_afetados)
         
-        # Excluir a questão
+        # Excluir a questão e só então recalcular os agregados, já sem as respostas dela
         db.session.delete(questao)
+        atualizar_agregados_resultados(resultados_afetados)
         db.session.commit()
         
         return jsonify({'success': True, 'message': 'Questão excluída com sucesso!'})
@@ -568,18 +677,18 @@ def editar_questao(questao_id):
             }
             
             # Processar imagem se presente
-            imagem_data = questao.imagem  # Manter imagem atual como padrão
+            imagem_data, imagem_hash = questao.imagem, questao.imagem_hash  # Manter imagem atual como padrão
             if 'imagem' in request.files:
                 imagem_file = request.files['imagem']
                 if imagem_file.filename:
-                    # Converter nova imagem para base64
-                    import base64
-                    imagem_bytes = imagem_file.read()
-                    imagem_data = base64.b64encode(imagem_bytes).decode('utf-8')
+                    imagem_data, imagem_hash = processar_imagem(imagem_file.read())
         else:
             # JSON tradicional
             data = request.json
-            imagem_data = data.get('imagem', questao.imagem)
+            imagem_data, imagem_hash = questao.imagem, questao.imagem_hash
+            # A URL devolvida por GET /api/questoes/<id> mantém a imagem atual
+            if 'imagem' in data and data['imagem'] != url_imagem(questao):
+                imagem_data, imagem_hash = processar_imagem(data['imagem'])
         
         # Buscar informações da habilidade para obter componente se não fornecido
         habilidade = Habilidade.query.get(data['habilidade_id'])
@@ -587,9 +696,13 @@ def editar_questao(questao_id):
             return jsonify({'error': 'Habilidade não encontrada'}), 400
             
         # Atualizar campos da questão
+        # No JSON habilidade_id pode vir como texto ("12"); comparar como inteiro
+        nova_habilidade_id = int(data['habilidade_id']) if data.get('habilidade_id') not in (None, '') else None
+        habilidade_alterada = questao.habilidade_id != nova_habilidade_id
         questao.enunciado = data['enunciado']
         questao.imagem = imagem_data
-        questao.habilidade_id = data['habilidade_id']
+        questao.imagem_hash = imagem_hash
+        questao.habilidade_id = nova_habilidade_id
         questao.componente = data.get('componente') or habilidade.componente
         questao.ano = data.get('ano') or habilidade.ano
         questao.dificuldade = data.get('dificuldade', 'Médio')
@@ -601,9 +714,16 @@ def editar_questao(questao_id):
         questao.alternativa_d = data.get('alternativa_d', '')
         questao.resposta_correta = data.get('resposta_correta', '')
         
+        invalidar_gabaritos_da_questao(questao.id)
+        if habilidade_alterada:
+            # As respostas já gravadas desta questão passam a contar para a nova habilidade
+            atualizar_agregados_resultados(resultados_com_questao(questao.id))
         db.session.commit()
         return jsonify({'success': True, 'message': 'Questão atualizada com sucesso!'})
         
+    except ImagemInvalida as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Erro ao atualizar questão: {str(e)}'}), 500
@@ -639,7 +759,7 @@ def detalhar_questao(questao_id):
         return jsonify({
             'id': questao.id,
             'enunciado': questao.enunciado,
-            'imagem': questao.imagem,
+            'imagem': url_imagem(questao),
             'habilidade_id': questao.habilidade_id,
             'escola_id': getattr(questao, 'escola_id', None),
             'ano': getattr(questao, 'ano', None),
@@ -658,6 +778,39 @@ def detalhar_questao(questao_id):
         print(f'[LOG] Erro ao detalhar questão {questao_id}: {str(e)}')
         return jsonify({'error': f'Erro interno: {str(e)}'}), 500
 
+@app.route('/api/questoes/<int:questao_id>/imagem', methods=['GET'])
+def imagem_questao(questao_id):
+    """
+    Imagem da questão, lida do armazenamento de imagens. O hash do conteúdo é o ETag (If-None-Match
+    responde 304) e a URL entregue pela API leva ?v=<hash>, então o navegador pode guardar a resposta
+    por um ano: quando a imagem muda, muda a URL.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    
+    questao = db.session.query(Questao.user_id, Questao.imagem_hash).filter(Questao.id == questao_id).first()
+    if not questao:
+        return jsonify({'error': 'Questão não encontrada'}), 404
+    if questao.user_id != session['user_id']:
+        return jsonify({'error': 'Acesso negado'}), 403
+    if not questao.imagem_hash:
+        return jsonify({'error': 'Questão sem imagem armazenada'}), 404
+    
+    try:
+        arquivo = armazenamento().abrir(questao.imagem_hash)
+    except FileNotFoundError:
+        print(f'[ERROR] Imagem {questao.imagem_hash} da questão {questao_id} não encontrada no armazenamento')
+        return jsonify({'error': 'Imagem não encontrada'}), 404
+    
+    tipo = tipo_da_imagem(arquivo.read(12))
+    arquivo.seek(0)
+    resposta = send_file(arquivo, mimetype=tipo, etag=questao.imagem_hash, conditional=True, max_age=365 * 24 * 3600)
+    resposta.cache_control.public = False
+    resposta.cache_control.private = True  # Só o navegador do usuário guarda (rota autenticada)
+    resposta.cache_control.immutable = True
+    resposta.headers['X-Content-Type-Options'] = 'nosniff'
+    return resposta
+
 @app.route('/escolas')
 def escolas():
     if 'user_id' not in session:
@@ -753,6 +906,16 @@ def sitemap():
 def robots():
     return send_from_directory(FRONTEND_DIR, 'robots.txt', mimetype='text/plain')
 
+# Campos da listagem de cadernos (?fields=)
+PROJECAO_CADERNOS = Projecao({
+    'id': coluna(Caderno.id),
+    'codigo_caderno': Campo((Caderno.id,), attrgetter('codigo_caderno'), ()),
+    'titulo': coluna(Caderno.titulo),
+    'serie': coluna(Caderno.serie),
+    'qtd_blocos': coluna(Caderno.qtd_blocos),
+    'qtd_questoes_por_bloco': coluna(Caderno.qtd_questoes_por_bloco)
+}, chave=[Caderno.id])
+
 @app.route('/api/cadernos', methods=['GET'])
 def listar_cadernos():
     print(f"[DEBUG] listar_cadernos - user_id na sessão: {session.get('user_id')}")
@@ -766,29 +929,46 @@ def listar_cadernos():
         user_id = session['user_id']
         print(f"[DEBUG] listar_cadernos - Buscando cadernos para user_id: {user_id}")
         
-        cadernos = Caderno.query.filter_by(user_id=user_id).all()
-        print(f"[DEBUG] listar_cadernos - Encontrados {len(cadernos)} cadernos")
+        # Filtros opcionais: serie, componente (de algum bloco) e busca (trecho do título, como a busca antiga da tela).
+        # Paginação por cursor com ?limite= (mais recentes primeiro) e só os campos de ?fields= (todos, por padrão);
+        # sem limite/cursor a lista vem inteira, na ordem de antes (por id)
+        try:
+            limite, cursor, contar_total = parametros_paginacao(request.args)
+            campos = PROJECAO_CADERNOS.campos_pedidos(request.args)
+        except (CursorInvalido, CampoInvalido) as e:
+            return jsonify({'error': str(e)}), 400
         
-        for c in cadernos:
-            print(f"[DEBUG] Caderno: ID={c.id}, titulo={c.titulo}, serie={c.serie}, user_id={c.user_id}")
-        
-        cadernos_json = [
-            {
-                'id': c.id,
-                'codigo_caderno': c.codigo_caderno,
-                'titulo': c.titulo,
-                'serie': c.serie,
-                'qtd_blocos': c.qtd_blocos,
-                'qtd_questoes_por_bloco': c.qtd_questoes_por_bloco
-            } for c in cadernos
-        ]
+        query = Caderno.query.filter(Caderno.user_id == user_id).options(*PROJECAO_CADERNOS.opcoes(campos))
+        serie = request.args.get('serie', type=int)
+        componente = request.args.get('componente')
+        busca = (request.args.get('busca') or '').strip()
+        if serie:
+            query = query.filter(Caderno.serie == serie)
+        if componente:
+            query = query.filter(Caderno.blocos.any(BlocoCaderno.componente == componente))
+        if busca:
+            query = query.filter(filtro_contem(Caderno.titulo, busca))
+        
+        total = query.count() if contar_total else None
+        if limite is None and cursor is None:
+            cadernos, tem_mais = paginar(query, [Caderno.id])
+        else:
+            cadernos, tem_mais = paginar(query, [Caderno.id], limite, cursor, decrescente=True)
+        print(f"[DEBUG] listar_cadernos - Encontrados {len(cadernos)} cadernos")
         
-        print(f"[DEBUG] listar_cadernos - Retornando: {cadernos_json}")
+        cadernos_json = [PROJECAO_CADERNOS.serializar(c, campos) for c in cadernos]
         
-        return jsonify({
+        resposta = {
             'success': True,
             'cadernos': cadernos_json
-        })
+        }
+        if limite is not None or total is not None:
+            resposta['paginacao'] = dados_paginacao(
+                limite, tem_mais, [cadernos[-1].id] if cadernos else None, total
+            )
+        return jsonify(resposta)
+    except CursorInvalido as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"[ERROR] listar_cadernos - Erro: {e}")
         import traceback
@@ -870,9 +1050,10 @@ def excluir_caderno(caderno_id):
         # 1. Buscar todos os resultados relacionados ao caderno
         resultados = ResultadoAluno.query.filter_by(caderno_id=caderno_id).all()
         
-        # 2. Para cada resultado, excluir suas respostas individuais
+        # 2. Para cada resultado, excluir suas respostas individuais e os totais por componente/habilidade
         for resultado in resultados:
             RespostaAluno.query.filter_by(resultado_id=resultado.id).delete()
+        remover_agregados_resultados([resultado.id for resultado in resultados])
         
         # 3. Excluir todos os resultados do caderno
         ResultadoAluno.query.filter_by(caderno_id=caderno_id).delete()
@@ -883,6 +1064,10 @@ def excluir_caderno(caderno_id):
         
         # 5. Agora podemos excluir o caderno seguramente (os blocos serão excluídos pelo cascade)
         db.session.delete(caderno)
+        
+        # 6. Versões do caderno (gabarito e resultados) e gabarito compilado em cache
+        descartar_gabarito(caderno_id)
+        VersaoDados.remover(ESCOPO_RESULTADOS, caderno_id)
         db.session.commit()
         
         print(f"✅ Caderno {caderno_id} excluído com sucesso")
@@ -1177,6 +1362,7 @@ def atribuir_questoes_bloco(bloco_id):
             )
             db.session.add(bloco_questao)
         
+        invalidar_gabarito(caderno.id)
         db.session.commit()
         return jsonify({'success': True, 'message': 'Questões atribuídas com sucesso!'})
     except Exception as e:
@@ -1271,6 +1457,7 @@ def remover_questao_bloco(bloco_id, questao_id):
     questoes_restantes = BlocoQuestao.query.filter_by(bloco_id=bloco_id).order_by(BlocoQuestao.ordem).all()
     for idx, bq in enumerate(questoes_restantes, 1):
         bq.ordem = idx
+    invalidar_gabarito(caderno.id)
     db.session.commit()
     return jsonify({'success': True, 'message': 'Questão removida do bloco com sucesso!'})
 
@@ -1292,11 +1479,107 @@ def reordenar_questoes_bloco(bloco_id):
         bq = questao_id_para_bq.get(questao_id)
         if bq:
             bq.ordem = idx
+    invalidar_gabarito(caderno.id)
     db.session.commit()
     return jsonify({'success': True, 'message': 'Ordem das questões atualizada com sucesso!'})
 
+def _lista_de_ids(valor):
+    """Converte '1,2,3', [1, 2, 3] ou None em lista de inteiros"""
+    if valor is None or valor == '':
+        return []
+    if isinstance(valor, str):
+        valor = valor.split(',')
+    elif not isinstance(valor, (list, tuple)):
+        valor = [valor]
+    return [int(v) for v in valor if str(v).strip()]
+
+def carregar_alunos_cartoes(caderno, user_id, turma_ids=None, escola_ids=None, aluno_ids=None,
+                            pagina_inicio=None, pagina_fim=None):
+    """
+    Carrega em uma única consulta (aluno + turma + escola) os alunos das turmas da série do caderno,
+    ordenados por escola, turma e nome. As páginas (1 por aluno) podem ser limitadas por pagina_inicio/pagina_fim.
+    """
+    query = db.session.query(Aluno.id, Aluno.nome, Turma, Escola).join(
+        Turma, Aluno.turma_id == Turma.id
+    ).outerjoin(
+        Escola, Aluno.escola_id == Escola.id
+    ).filter(
+        Turma.ano == caderno.serie,
+        Turma.user_id == user_id,
+        Aluno.user_id == user_id
+    )
+    if turma_ids:
+        query = query.filter(Turma.id.in_(turma_ids))
+    if escola_ids:
+        query = query.filter(Aluno.escola_id.in_(escola_ids))
+    if aluno_ids:
+        query = query.filter(Aluno.id.in_(aluno_ids))
+
+    query = query.order_by(Turma.escola_id, Turma.nome, Turma.id, Aluno.nome, Aluno.id)
+    if pagina_inicio and pagina_inicio > 1:
+        query = query.offset(pagina_inicio - 1)
+    if pagina_fim:
+        query = query.limit(max(pagina_fim - (pagina_inicio or 1) + 1, 0))
+
+    return [{
+        'id': aluno_id,  # ID do aluno para QR Code
+        'nome': nome,
+        'turma': turma,
+        'escola': escola,
+        'turma_id': turma.id,  # ID da turma para QR Code
+        'escola_id': escola.id if escola else None  # ID da escola para QR Code
+    } for aluno_id, nome, turma, escola in query.all()]
+
+class _FluxoZip:
+    """Destino não pesquisável para o zipfile: acumula os bytes escritos até serem enviados ao cliente"""
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, dados):
+        self.partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def esvaziar(self):
+        dados = b''.join(self.partes)
+        self.partes = []
+        return dados
+
+def gerar_zip_cartoes_por_turma(alunos, caderno, nome_professor, blocos):
+    """Gera um ZIP com um PDF por turma, enviando cada PDF assim que fica pronto"""
+    fluxo = _FluxoZip()
+    # PDFs já são comprimidos: gravar sem recompressão
+    with zipfile.ZipFile(fluxo, 'w', zipfile.ZIP_STORED) as arquivo_zip:
+        for _, grupo in groupby(alunos, key=lambda a: a['turma_id']):
+            grupo = list(grupo)
+            turma = grupo[0]['turma']
+            escola = grupo[0]['escola']
+            nome_pdf = secure_filename(f"{escola.nome if escola else 'escola'}_{turma.nome}_{turma.id}") + '.pdf'
+            pdf_buffer = gerar_pdf_cartoes(grupo, caderno, nome_professor, blocos)
+            arquivo_zip.writestr(nome_pdf, pdf_buffer.getvalue())
+            yield fluxo.esvaziar()
+    yield fluxo.esvaziar()
+
+def enviar_e_remover_arquivo(caminho, tamanho_parte=64 * 1024):
+    """Envia o arquivo em partes e o apaga no fim (também se o cliente desconectar no meio)"""
+    try:
+        with open(caminho, 'rb') as arquivo:
+            for parte in iter(lambda: arquivo.read(tamanho_parte), b''):
+                yield parte
+    finally:
+        os.remove(caminho)
+
 @app.route('/api/cadernos/<int:caderno_id>/cartoes-gabarito', methods=['POST'])
 def gerar_cartoes_gabarito(caderno_id):
+    """
+    Gera os cartões gabarito do caderno para os alunos da série.
+    Filtros opcionais (JSON ou query string): turma_ids, escola_ids, aluno_ids, pagina_inicio, pagina_fim.
+    formato=zip gera um PDF por turma, enviado ao cliente à medida que cada turma fica pronta;
+    o PDF único é gravado em um arquivo temporário e enviado do disco em partes.
+    """
     if 'user_id' not in session:
         return jsonify({'error': 'Usuário não autenticado'}), 401
     
@@ -1310,59 +1593,64 @@ def gerar_cartoes_gabarito(caderno_id):
     if not user:
         return jsonify({'error': 'Usuário não encontrado'}), 404
     
-    # Buscar turmas do ano/série do caderno para o usuário
-    turmas = Turma.query.filter_by(ano=caderno.serie, user_id=session['user_id']).all()
-    
-    if not turmas:
-        return jsonify({'error': f'Nenhuma turma encontrada para o {caderno.serie}º ano'}), 404
-    
-    # Buscar todos os alunos das turmas encontradas
-    alunos = []
-    for turma in turmas:
-        alunos_turma = Aluno.query.filter_by(turma_id=turma.id, user_id=session['user_id']).all()
-        for aluno in alunos_turma:
-            # Buscar dados da escola
-            escola = Escola.query.get(aluno.escola_id)
-            alunos.append({
-                'id': aluno.id,  # ID do aluno para QR Code
-                'nome': aluno.nome,
-                'turma': turma,
-                'escola': escola,
-                'turma_id': turma.id,  # ID da turma para QR Code
-                'escola_id': escola.id if escola else None  # ID da escola para QR Code
-            })
+    dados = request.get_json(silent=True) or {}
+    def parametro(nome):
+        return dados.get(nome, request.args.get(nome))
+    
+    try:
+        turma_ids = _lista_de_ids(parametro('turma_ids'))
+        escola_ids = _lista_de_ids(parametro('escola_ids'))
+        aluno_ids = _lista_de_ids(parametro('aluno_ids'))
+        pagina_inicio = int(parametro('pagina_inicio')) if parametro('pagina_inicio') else None
+        pagina_fim = int(parametro('pagina_fim')) if parametro('pagina_fim') else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Filtros inválidos'}), 400
+    if (pagina_inicio is not None and pagina_inicio < 1) or \
+            (pagina_fim is not None and pagina_fim < (pagina_inicio or 1)):
+        return jsonify({'error': 'Intervalo de páginas inválido'}), 400
+    formato = (parametro('formato') or 'pdf').lower()
+    if formato not in ('pdf', 'zip'):
+        return jsonify({'error': 'Formato inválido (use pdf ou zip)'}), 400
+    
+    # Buscar todos os alunos (com turma e escola) em uma única consulta
+    alunos = carregar_alunos_cartoes(caderno, session['user_id'], turma_ids, escola_ids, aluno_ids,
+                                     pagina_inicio, pagina_fim)
     
     if not alunos:
+        if not (turma_ids or escola_ids or aluno_ids or pagina_inicio or pagina_fim) and \
+                not Turma.query.filter_by(ano=caderno.serie, user_id=session['user_id']).first():
+            return jsonify({'error': f'Nenhuma turma encontrada para o {caderno.serie}º ano'}), 404
         return jsonify({'error': 'Nenhum aluno encontrado nas turmas correspondentes'}), 404
     
     # Buscar blocos do caderno
     blocos = BlocoCaderno.query.filter_by(caderno_id=caderno_id).order_by(BlocoCaderno.ordem).all()
+    nome_arquivo = f'cartoes_gabarito_{caderno.titulo.replace(" ", "_")}'
+    print(f"👥 Gerando cartões ({formato}) para {len(alunos)} aluno(s)")
     
     # Gerar PDF com QR Code usando template existente
     try:
-        import os
-        # Caminho absoluto baseado na localização deste arquivo
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        template_path = os.path.join(current_dir, "modelo padrão.pdf")
-        
-        print(f"🔍 Procurando template em: {template_path}")
-        print(f"📁 Diretório atual: {current_dir}")
-        print(f"📋 Arquivos no diretório: {[f for f in os.listdir(current_dir) if f.endswith('.pdf')]}")
-        
-        # Verificar se existe o template
-        if os.path.exists(template_path):
-            print("✅ Template PDF padrão encontrado!")
-            print(f"📏 Tamanho do arquivo: {os.path.getsize(template_path)} bytes")
-            pdf_buffer = gerar_gabarito_com_template_e_qr(template_path, alunos, caderno, user.name, blocos)
-        else:
-            print("❌ Template não encontrado, usando geração padrão")
-            pdf_buffer = gerar_pdf_cartoes_gabarito_com_qr(caderno, blocos, alunos, user.name)
+        if formato == 'zip':
+            return Response(
+                stream_with_context(gerar_zip_cartoes_por_turma(alunos, caderno, user.name, blocos)),
+                mimetype='application/zip',
+                headers={'Content-Disposition': f'attachment; filename="cartoes_gabarito_caderno_{caderno.id}.zip"'}
+            )
         
-        return send_file(
-            pdf_buffer,
-            as_attachment=True,
-            download_name=f'cartoes_gabarito_{caderno.titulo.replace(" ", "_")}.pdf',
-            mimetype='application/pdf'
+        descritor, caminho_pdf = tempfile.mkstemp(prefix='cartoes_', suffix='.pdf')
+        os.close(descritor)
+        try:
+            gravar_pdf_cartoes(alunos, caderno, user.name, blocos, caminho_pdf)
+            tamanho = os.path.getsize(caminho_pdf)
+        except Exception:
+            os.remove(caminho_pdf)
+            raise
+        return Response(
+            enviar_e_remover_arquivo(caminho_pdf),
+            mimetype='application/pdf',
+            headers={
+                'Content-Disposition': f'attachment; filename="{nome_arquivo}.pdf"',
+                'Content-Length': str(tamanho)
+            }
         )
     except Exception as e:
         print(f"Erro detalhado ao gerar PDF: {str(e)}")
@@ -1370,390 +1658,84 @@ def gerar_cartoes_gabarito(caderno_id):
         traceback.print_exc()
         return jsonify({'error': f'Erro ao gerar PDF: {str(e)}'}), 500
 
-def gerar_gabarito_com_template_e_qr(template_path, alunos, caderno, nome_professor, blocos):
-    """Gera gabarito usando template PDF existente + QR Code - Layout Organizado"""
-    try:
-        from reportlab.pdfgen import canvas
-        from reportlab.lib.pagesizes import A4
-        from reportlab.lib.units import cm, mm
-        from reportlab.lib import colors
-        import qrcode
-        import json
-        import uuid
-        from io import BytesIO
-        
-        print(f"📄 Iniciando geração com template: {template_path}")
-        print(f"👥 Gerando para {len(alunos)} aluno(s)")
-        print(f"📚 Caderno: {caderno.titulo} (ID: {caderno.id})")
-        
-        buffer = BytesIO()
-        c = canvas.Canvas(buffer, pagesize=A4)
-        
-        # Dimensões da página A4
-        width, height = A4
-        print(f"📐 Dimensões da página: {width} x {height}")
-        
-        def gerar_qr_code(dados_qr):
-            """Gera QR Code com dados do aluno"""
-            try:
-                qr = qrcode.QRCode(
-                    version=1,
-                    error_correction=qrcode.constants.ERROR_CORRECT_M,
-                    box_size=8,
-                    border=2,
-                )
-                
-                qr_data = json.dumps(dados_qr, separators=(',', ':'))
-                qr.add_data(qr_data)
-                qr.make(fit=True)
-                
-                qr_img = qr.make_image(fill_color="black", back_color="white")
-                
-                qr_buffer = BytesIO()
-                qr_img.save(qr_buffer, format='PNG')
-                qr_buffer.seek(0)
-                
-                return qr_buffer
-            except Exception as qr_error:
-                print(f"❌ Erro ao gerar QR Code: {qr_error}")
-                raise qr_error
-        
-        # Gerar uma página para cada aluno
-        for i, aluno_data in enumerate(alunos):
-            aluno = aluno_data
-            turma = aluno['turma']
-            escola = aluno['escola']
-            
-            # ID único para o gabarito
-            gabarito_id = str(uuid.uuid4())[:8].upper()
-            
-            # Dados para o QR Code incluindo matrícula e código do caderno
-            qr_dados = {
-                "aluno_id": aluno['id'],
-                "aluno_matricula": f"{aluno['id']:05d}",  # Matrícula de 5 dígitos
-                "aluno_nome": aluno['nome'],
-                "caderno_id": caderno.id,
-                "caderno_codigo": f"{caderno.id:03d}",  # Código do caderno de 3 dígitos
-                "caderno_titulo": caderno.titulo,
-                "turma_id": aluno['turma_id'],
-                "turma_nome": turma.nome,
-                "escola_id": aluno['escola_id'],
-                "escola_nome": escola.nome if escola else "N/A",
-                "gabarito_id": gabarito_id,
-                "serie": caderno.serie,
-                "total_questoes": sum(b.total_questoes for b in blocos),
-                "tipo": "edu_gabarito_qr",
-                "versao": "2.0"
-            }
-            
-            # Carregar template base como imagem de fundo
-            try:
-                from reportlab.lib.utils import ImageReader
-                from PIL import Image as PILImage
-                import fitz  # PyMuPDF para converter PDF em imagem
-                
-                # Converter primeira página do PDF template para imagem
-                pdf_doc = fitz.open(template_path)
-                page = pdf_doc[0]
-                pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # Resolução 2x
-                img_data = pix.tobytes("png")
-                pdf_doc.close()
-                
-                # Criar imagem a partir dos bytes
-                template_img = PILImage.open(BytesIO(img_data))
-                template_reader = ImageReader(BytesIO(img_data))
-                
-                # Desenhar template como fundo
-                c.drawImage(template_reader, 0, 0, width=width, height=height)
-                
-            except Exception as template_error:
-                print(f"⚠️ Erro ao carregar template como imagem: {template_error}")
-                
-                # Se não conseguir carregar template, criar layout básico
-                c.setFont("Helvetica-Bold", 16)
-                c.drawString(50, height - 50, "FOLHA DE RESPOSTA - GABARITO EDU PLATAFORMA")
-            
-            # ============= POSICIONAMENTO ORGANIZADO DOS CAMPOS =============
-            
-            # 1. QR CODE NO CANTO SUPERIOR ESQUERDO
-            qr_buffer = gerar_qr_code(qr_dados)
-            qr_reader = ImageReader(qr_buffer)
-            
-            qr_size = 70  # Tamanho do QR Code em pontos
-            qr_x = 30  # Margem esquerda
-            qr_y = height - qr_size - 30  # 30 pontos do topo
-            
-            c.drawImage(qr_reader, qr_x, qr_y, width=qr_size, height=qr_size)
-            
-            # Texto do QR Code
-            c.setFont("Helvetica-Bold", 7)
-            c.drawString(qr_x, qr_y - 10, "ESCANEIE NO APP")
-            
-            # 2. CÓDIGO DO CADERNO NO CANTO SUPERIOR DIREITO
-            c.setFont("Helvetica-Bold", 12)
-            c.setFillColor(colors.black)
-            codigo_caderno_text = f"{caderno.id:03d}"  # Apenas os números
-            cod_width = c.stringWidth(codigo_caderno_text, "Helvetica-Bold", 12)
-            c.drawString(width - cod_width - 97, height - 46, codigo_caderno_text)  # Mais à direita
-            
-            # 3. MATRÍCULA ABAIXO DO CÓDIGO DO CADERNO
-            c.setFont("Helvetica-Bold",12)
-            c.setFillColor(colors.black)
-            matricula_text = f"{aluno['id']:05d}"  # Apenas os números
-            mat_width = c.stringWidth(matricula_text, "Helvetica-Bold", 12)
-            c.drawString(width - mat_width - 87, height - 73, matricula_text)  # Mais à direita
-            
-            # 4. PREENCHIMENTO DOS CAMPOS DO TEMPLATE (baseado no layout padrão)
-            c.setFillColor(colors.black)  # Voltar cor padrão
-            
-            # Baseado na análise do template, as posições aproximadas dos campos são:
-            # As coordenadas são baseadas no template padrão do gabarito
-            
-            # Campo Professor (retângulo superior esquerdo do cabeçalho)
-            c.setFont("Helvetica-Bold", 11)
-            c.drawString(25, height - 170, nome_professor[:30])  # Limitar tamanho
-            
-            # Campo Escola (campo escola no cabeçalho)
-            c.setFont("Helvetica-Bold", 10)
-            c.drawString(25, height - 210, escola.nome[:35] if escola else "N/A")
-            
-            # Campo Turno (campo à direita)
-            c.setFont("Helvetica-Bold", 10)
-            turno_text = turma.turno if (turma and hasattr(turma, 'turno') and turma.turno) else "Tarde"
-            c.drawString(384, height - 212, turno_text)
-            
-            # Campo Nome do Aluno (campo principal - maior)
-            c.setFont("Helvetica-Bold", 12)
-            c.drawString(25, height - 255, aluno['nome'][:45])  # Nome do aluno
-            
-            # Campo Série/Turma (campo à direita do nome)
-            c.setFont("Helvetica-Bold", 10)
-            if turma and hasattr(turma, 'nome') and turma.nome:
-                # Limpar formatação redundante da turma
-                turma_nome = turma.nome.replace('º ANO - ', '').replace('ANO - ', '')
-                serie_turma_text = f"{caderno.serie}º ano - {turma_nome}"
-            else:
-                serie_turma_text = f"{caderno.serie}º ano - A"
-            c.drawString(380, height - 250, serie_turma_text[:25])
-       
-            # Quebra de página (exceto no último aluno)
-            if i < len(alunos) - 1:
-                c.showPage()
-        
-        # Finalizar PDF
-        c.save()
-        buffer.seek(0)
-        
-        print(f"✅ PDF gerado com template organizado + QR Code para {len(alunos)} aluno(s)")
-        return buffer
-        
-    except Exception as e:
-        print(f"❌ Erro ao gerar PDF com template: {str(e)}")
-        # Fallback para função simples sem template
-        return gerar_pdf_cartoes_gabarito_simples(caderno, blocos, alunos, nome_professor)
-
-def gerar_pdf_cartoes_gabarito_com_qr(caderno, blocos, alunos, nome_professor):
-    """Função de fallback - gera PDF simples com QR Code sem template"""
-    return gerar_pdf_cartoes_gabarito_simples(caderno, blocos, alunos, nome_professor)
-
-def gerar_pdf_cartoes_gabarito_simples(caderno, blocos, alunos, nome_professor):
-    """Gera PDF simples com layout básico + QR Code"""
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib import colors
-    from reportlab.lib.units import cm, mm
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Image
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-    from reportlab.platypus.flowables import Flowable
-    from reportlab.graphics.shapes import Drawing, Circle
-    import qrcode
-    import json
-    import uuid
-    from io import BytesIO
-    
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, 
-                          rightMargin=1.5*cm, leftMargin=1.5*cm,
-                          topMargin=1*cm, bottomMargin=1*cm)
-    
-    styles = getSampleStyleSheet()
-    
-    # Estilos profissionais
-    title_style = ParagraphStyle(
-        'TitleStyle',
-        parent=styles['Heading1'],
-        fontSize=16,
-        spaceAfter=10,
-        alignment=TA_CENTER,
-        textColor=colors.black,
-        fontName='Helvetica-Bold'
-    )
+# =================== DOMÍNIO DE HABILIDADES ===================
+
+def _escopos_dominio(user_id, filtros):
+    """Domínio por turma depende só da turma; os demais níveis, de todos os resultados do usuário"""
+    filtros = dict(filtros)
+    if filtros.get('nivel') == 'turma' and filtros.get('id'):
+        return escopos_pelos_filtros(user_id, [('turma', filtros['id'])])
+    return escopos_pelos_filtros(user_id, [])
+
+@app.route('/api/habilidades/dominio', methods=['GET'])
+@cache_relatorio(escopos=_escopos_dominio)
+def dominio_habilidades():
+    """
+    Percentual de acerto por habilidade no nível escolhido.
+    nivel=aluno|turma|escola (id obrigatório) ou nivel=rede|zona (id = nome da rede/zona, opcional);
+    filtros opcionais: ano, periodo, componente.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
     
-    def gerar_qr_code(dados_qr):
-        """Gera QR Code com dados do aluno e retorna como imagem"""
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_M,
-            box_size=10,
-            border=4,
-        )
-        
-        # Dados para o QR Code
-        qr_data = json.dumps(dados_qr, separators=(',', ':'))
-        qr.add_data(qr_data)
-        qr.make(fit=True)
-        
-        # Criar imagem do QR Code
-        qr_img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Converter para bytes
-        qr_buffer = BytesIO()
-        qr_img.save(qr_buffer, format='PNG')
-        qr_buffer.seek(0)
-        
-        return qr_buffer
-    
-    story = []
-    
-    for i, aluno_data in enumerate(alunos):
-        aluno = aluno_data
-        turma = aluno['turma']
-        escola = aluno['escola']
-        
-        # ID único para o gabarito
-        gabarito_id = str(uuid.uuid4())[:8].upper()
-        
-        # Dados para o QR Code incluindo matrícula e código do caderno
-        qr_dados = {
-            "aluno_id": aluno['id'],
-            "aluno_matricula": f"{aluno['id']:05d}",  # Matrícula de 5 dígitos
-            "aluno_nome": aluno['nome'],
-            "caderno_id": caderno.id,
-            "caderno_codigo": f"{caderno.id:03d}",  # Código do caderno de 3 dígitos
-            "caderno_titulo": caderno.titulo,
-            "turma_id": aluno['turma_id'],
-            "turma_nome": turma.nome,
-            "escola_id": aluno['escola_id'],
-            "escola_nome": escola.nome if escola else "N/A",
-            "gabarito_id": gabarito_id,
-            "serie": caderno.serie,
-            "total_questoes": sum(b.total_questoes for b in blocos),
-            "tipo": "edu_gabarito_qr",
-            "versao": "2.0"
-        }
-        
-        # Gerar QR Code
-        qr_buffer = gerar_qr_code(qr_dados)
-        
-        # Título principal
-        story.append(Paragraph("FOLHA DE RESPOSTA - GABARITO EDU PLATAFORMA", title_style))
-        story.append(Spacer(1, 0.3*cm))
-        
-        # Layout organizado com QR Code real na primeira coluna
-        qr_image = Image(qr_buffer, width=2.5*cm, height=2.5*cm)
-        
-        layout_data = [
-            [qr_image, 'DADOS DO ALUNO E AVALIAÇÃO', f'{caderno.id:03d}'],  # Apenas números
-            ['ESCANEIE\nNO APP', f'Professor(a): {nome_professor}', f'{aluno["id"]:05d}'],  # Apenas números
-            ['', f'Escola: {escola.nome if escola else "N/A"}', f'ID: {gabarito_id}'],
-            ['', f'Aluno(a): {aluno["nome"]}', f'Data: ___/___/______'],
-            ['', f'Turma: {turma.nome}', f'{caderno.serie}º ano'],
-            ['', f'Turno: {turma.turno if turma else "N/A"}', f'Total: {sum(b.total_questoes for b in blocos)} questões']
-        ]
-        
-        # Criar tabela principal com layout organizado
-        layout_table = Table(layout_data, colWidths=[3*cm, 9*cm, 4*cm])
-        layout_table.setStyle(TableStyle([
-            # Alinhamentos
-            ('ALIGN', (0, 0), (0, -1), 'CENTER'),  # QR Code centralizado
-            ('ALIGN', (1, 0), (1, -1), 'LEFT'),    # Dados alinhados à esquerda
-            ('ALIGN', (2, 0), (2, -1), 'CENTER'),  # Códigos centralizados
-            ('VALIGN', (0, 0), (0, -1), 'MIDDLE'), # QR Code centralizado verticalmente
-            
-            # Fontes
-            ('FONTNAME', (1, 0), (1, 0), 'Helvetica-Bold'),   # Cabeçalho dados
-            ('FONTSIZE', (1, 0), (1, 0), 11),
-            ('FONTNAME', (0, 1), (0, 1), 'Helvetica-Bold'),   # Texto "ESCANEIE"
-            ('FONTSIZE', (0, 1), (0, 1), 7),
-            ('FONTNAME', (1, 1), (1, -1), 'Helvetica'),       # Dados do aluno
-            ('FONTSIZE', (1, 1), (1, -1), 10),
-            ('FONTNAME', (2, 0), (2, -1), 'Times-Bold'),      # Códigos em Times New Roman
-            ('FONTSIZE', (2, 0), (2, -1), 14),                # Aumentar tamanho
-            ('FONTNAME', (2, 1), (2, 1), 'Times-Bold'),       # Matrícula em Times New Roman
-            ('FONTSIZE', (2, 1), (2, 1), 13),                 # Tamanho específico para matrícula
-            
-            # Bordas
-            ('GRID', (0, 0), (-1, -1), 1.5, colors.black),
-            
-            # Cores de fundo
-            ('BACKGROUND', (0, 0), (0, 1), colors.yellow),     # Área QR Code
-            ('BACKGROUND', (1, 0), (1, 0), colors.lightgrey), # Cabeçalho dados
-            ('BACKGROUND', (2, 0), (2, 0), colors.lightcoral), # Código caderno
-            ('BACKGROUND', (2, 1), (2, 1), colors.lightblue),  # Matrícula
-            
-            # Padding
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('LEFTPADDING', (0, 0), (-1, -1), 6),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 6),
-            
-            # Destaque especial para código e matrícula
-            ('TEXTCOLOR', (2, 0), (2, 0), colors.darkred),   # Código em vermelho
-            ('TEXTCOLOR', (2, 1), (2, 1), colors.darkblue),  # Matrícula em azul
-            
-            # Fazer o QR Code ocupar duas linhas
-            ('SPAN', (0, 0), (0, 1)),  # QR Code ocupa primeira e segunda linha
-        ]))
-        
-        story.append(layout_table)
-        story.append(Spacer(1, 0.2*cm))
-        
-        # Adicionar QR Code na coluna da esquerda (já está na tabela principal)
-        # Criar rodapé com informações de identificação
-        footer_data = [
-            [f'🔍 QR CODE PARA ESCANEAMENTO', f'IDENTIFICAÇÃO ÚNICA'],
-            ['ESCANEIE NO APP', f'ID: {gabarito_id} | {aluno["id"]:05d} | {caderno.id:03d}'],  # Apenas números
-            ['', f'Aluno: {aluno["nome"][:30]}']
-        ]
-        
-        footer_table = Table(footer_data, colWidths=[8*cm, 8*cm])
-        footer_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 9),
-            ('FONTNAME', (0, 1), (-1, -1), 'Courier'),
-            ('FONTSIZE', (0, 1), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-            ('BACKGROUND', (0, 0), (-1, 0), colors.lightyellow),
-            ('BACKGROUND', (1, 0), (1, 0), colors.lightcoral),
-            ('TEXTCOLOR', (1, 1), (1, 1), colors.darkred),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-            ('TOPPADDING', (0, 0), (-1, -1), 4),
-        ]))
-        
-        story.append(footer_table)
-        story.append(Spacer(1, 0.4*cm))
-        
-        # Adicionar break de página para o próximo aluno
-        if i < len(alunos) - 1:
-            story.append(PageBreak())
+    nivel = request.args.get('nivel', 'turma')
+    if nivel not in NIVEIS_DOMINIO:
+        return jsonify({'error': f'Nível inválido (use {", ".join(NIVEIS_DOMINIO)})'}), 400
     
-    # Construir o PDF
-    doc.build(story)
-    buffer.seek(0)
+    referencia = request.args.get('id') or None
+    if nivel in ('aluno', 'turma', 'escola'):
+        if not referencia or not referencia.isdigit():
+            return jsonify({'error': f'Informe o id do(a) {nivel}'}), 400
+        referencia = int(referencia)
     
-    print(f"✅ PDF simples gerado com QR Code para {len(alunos)} aluno(s)")
-    return buffer
+    try:
+        habilidades = consultar_dominio(
+            session['user_id'],
+            nivel,
+            referencia,
+            ano=request.args.get('ano', type=int),
+            periodo=request.args.get('periodo') or None,
+            componente=request.args.get('componente') or None
+        )
+        return jsonify({
+            'success': True,
+            'nivel': nivel,
+            'referencia': referencia,
+            'habilidades': habilidades
+        })
+    except Exception as e:
+        print(f"[ERROR] Erro ao consultar domínio de habilidades: {str(e)}")
+        return jsonify({'error': f'Erro ao consultar domínio de habilidades: {str(e)}'}), 500
 
 # =================== API PARA HABILIDADES FILTRADAS ===================
 
+# Campos da listagem de habilidades (?fields=); etapa e objetos_conhecimento só quando pedidos
+PROJECAO_HABILIDADES = Projecao({
+    'id': coluna(Habilidade.id),
+    'codigo': coluna(Habilidade.codigo),
+    'componente': coluna(Habilidade.componente),
+    'ano': coluna(Habilidade.ano),
+    'descricao': coluna(Habilidade.descricao),
+    'etapa': coluna(Habilidade.etapa),
+    'objetos_conhecimento': coluna(Habilidade.objetos_conhecimento)
+}, padrao=['id', 'codigo', 'componente', 'ano', 'descricao'], chave=[Habilidade.codigo, Habilidade.id])
+
 @app.route('/api/habilidades', methods=['GET'])
 def listar_habilidades_filtradas():
-    """API para listar habilidades filtradas por componente e ano - usada no frontend"""
+    """
+    API para listar habilidades filtradas por componente, ano e busca (início do código) - usada no frontend.
+    Paginação por cursor com ?limite= (ordem por código); ?fields=id,codigo,... limita os campos
+    """
     componente = request.args.get('componente')
     ano = request.args.get('ano')
+    busca = (request.args.get('busca') or '').strip()
+    try:
+        limite, cursor, contar_total = parametros_paginacao(request.args)
+        campos = PROJECAO_HABILIDADES.campos_pedidos(request.args)
+    except (CursorInvalido, CampoInvalido) as e:
+        return jsonify({'error': str(e)}), 400
     
-    query = Habilidade.query
+    query = Habilidade.query.options(*PROJECAO_HABILIDADES.opcoes(campos))
     
     if componente:
         # Mapear "Português" para "Língua Portuguesa" se necessário
@@ -1764,21 +1746,29 @@ def listar_habilidades_filtradas():
     if ano:
         query = query.filter(Habilidade.ano == int(ano))
     
-    habilidades = query.order_by(Habilidade.codigo).all()
+    if busca:
+        query = query.filter(filtro_prefixo(Habilidade.codigo, busca))
     
-    return jsonify({
-        'habilidades': [{
-            'id': h.id,
-            'codigo': h.codigo,
-            'componente': h.componente,
-            'ano': h.ano,
-            'descricao': h.descricao
-        } for h in habilidades]
-    })
+    total = query.count() if contar_total else None
+    try:
+        habilidades, tem_mais = paginar(query, [Habilidade.codigo, Habilidade.id], limite, cursor)
+    except CursorInvalido as e:
+        return jsonify({'error': str(e)}), 400
+    
+    resposta = {
+        'habilidades': [PROJECAO_HABILIDADES.serializar(h, campos) for h in habilidades]
+    }
+    if limite is not None or total is not None:
+        ultima = habilidades[-1] if habilidades else None
+        resposta['paginacao'] = dados_paginacao(
+            limite, tem_mais, [ultima.codigo, ultima.id] if ultima else None, total
+        )
+    return jsonify(resposta)
 
 # =================== APIS PARA LANÇA RESULTADO ===================
 
 @app.route('/api/resultados', methods=['GET'])
+@cache_relatorio()
 def listar_resultados():
     """API para listar resultados dos alunos com base nos filtros aplicados"""
     if 'user_id' not in session:
@@ -1800,6 +1790,12 @@ def listar_resultados():
         if not all([ano, periodo, serie, escola_id, turma_id, caderno_id, componente]):
             return jsonify({'error': 'Todos os filtros são obrigatórios'}), 400
         
+        # Paginação opcional por cursor (?limite=, ordem por aluno)
+        try:
+            limite, cursor, contar_total = parametros_paginacao(request.args)
+        except CursorInvalido as e:
+            return jsonify({'error': str(e)}), 400
+        
         # Buscar o caderno e seus blocos
         caderno = Caderno.query.get_or_404(caderno_id)
         if caderno.user_id != session['user_id']:
@@ -1830,68 +1826,79 @@ def listar_resultados():
             print(f"[ERROR] Nenhum bloco encontrado para o componente '{componente}'")
             return jsonify({'error': f'Nenhum bloco encontrado para o componente {componente}'}), 400
         
-        # Buscar alunos da turma com filtro de série
-        alunos = Aluno.query.join(Turma).filter(
+        # Buscar alunos da turma (com filtro de série), seus resultados e os acertos do componente em uma única consulta
+        if componente != 'Ambos':
+            # Acertos do componente pré-calculados em ResultadoComponente; resultados sem nenhuma linha
+            # (anteriores à tabela, até `flask recalcular-resultados`) são contados nas respostas
+            acertos_coluna = ResultadoComponente.acertos
+            qualquer_componente = db.aliased(ResultadoComponente)  # Fora da junção externa abaixo
+            sem_componentes = ~db.exists().where(qualquer_componente.resultado_id == ResultadoAluno.id)
+        else:
+            acertos_coluna = ResultadoAluno.total_acertos
+            sem_componentes = db.literal(False)
+        
+        # Só o primeiro resultado de cada aluno no caderno/ano/período conta
+        primeiro_resultado = db.session.query(
+            db.func.min(ResultadoAluno.id).label('id')
+        ).filter(
+            ResultadoAluno.caderno_id == caderno_id,
+            ResultadoAluno.user_id == session['user_id'],
+            ResultadoAluno.ano_avaliacao == ano,
+            ResultadoAluno.periodo_avaliacao == periodo,
+            ResultadoAluno.aluno_id.in_(db.select(Aluno.id).where(Aluno.turma_id == turma_id))
+        ).group_by(ResultadoAluno.aluno_id).subquery()
+        
+        query = db.session.query(
+            Aluno.id,
+            Aluno.nome,
+            Turma.nome,
+            acertos_coluna,
+            ResultadoAluno.id,
+            sem_componentes
+        ).join(
+            Turma, Aluno.turma_id == Turma.id
+        ).join(
+            ResultadoAluno, ResultadoAluno.aluno_id == Aluno.id
+        ).join(
+            primeiro_resultado, primeiro_resultado.c.id == ResultadoAluno.id
+        ).filter(
             Aluno.turma_id == turma_id,
             Aluno.user_id == session['user_id'],
-            Turma.ano == int(serie)
-        ).all()
+            Turma.ano == int(serie),
+            ResultadoAluno.fez_prova == True
+        )
+        if componente != 'Ambos':
+            query = query.outerjoin(
+                ResultadoComponente, db.and_(
+                    ResultadoComponente.resultado_id == ResultadoAluno.id,
+                    ResultadoComponente.componente == componente
+                )
+            )
+        total_alunos = query.count() if contar_total else None
+        linhas, tem_mais = paginar(query, [Aluno.id], limite, cursor)
         
-        print(f"[DEBUG] Buscando alunos da turma {turma_id}, série {serie}")
-        print(f"[DEBUG] Encontrados {len(alunos)} alunos")
-        for aluno in alunos:
-            turma_aluno = Turma.query.get(aluno.turma_id)
-            print(f"[DEBUG] Aluno: {aluno.nome}, Turma: {turma_aluno.nome if turma_aluno else 'N/A'}, Série: {turma_aluno.ano if turma_aluno else 'N/A'}")
+        print(f"[DEBUG] Buscando alunos da turma {turma_id}, série {serie}: {len(linhas)} resultado(s) encontrados")
         
-        # Buscar resultados existentes para cada aluno
+        # Montar a lista de resultados
         resultados_alunos = []
         alunos_com_resultado = 0
         
-        for aluno in alunos:
-            # Buscar resultado existente com filtros de ano e período
-            resultado = ResultadoAluno.query.filter_by(
-                aluno_id=aluno.id,
-                caderno_id=caderno_id,
-                user_id=session['user_id'],
-                ano_avaliacao=ano,
-                periodo_avaliacao=periodo
-            ).first()
-            
-            # Buscar dados da turma
-            turma = Turma.query.get(aluno.turma_id)
-            
-            if resultado and resultado.fez_prova:
-                print(f"[DEBUG] Aluno {aluno.nome} - Resultado encontrado: fez_prova={resultado.fez_prova}")
-                print(f"[DEBUG] Total acertos no banco: {resultado.total_acertos}, Total questões: {resultado.total_questoes}")
-                
-                # Recalcular acertos baseado no componente filtrado
-                if componente != 'Ambos':
-                    # Buscar respostas do resultado específico filtradas por componente
-                    respostas = db.session.query(RespostaAluno).join(
-                        BlocoCaderno, RespostaAluno.bloco_id == BlocoCaderno.id
-                    ).filter(
-                        RespostaAluno.resultado_id == resultado.id,
-                        BlocoCaderno.componente == componente
-                    ).all()
-                    acertos_filtrado = sum(1 for r in respostas if r.acertou)
-                    print(f"[DEBUG] Componente filtrado: {componente}, Acertos: {acertos_filtrado}/{len(respostas)}")
-                else:
-                    acertos_filtrado = resultado.total_acertos
-                    print(f"[DEBUG] Usando total_acertos do resultado: {acertos_filtrado}")
-                
-                resultados_alunos.append({
-                    'id': aluno.id,
-                    'nome': aluno.nome,
-                    'turma_nome': turma.nome if turma else 'N/A',
-                    'status': 'concluido',
-                    'acertos': acertos_filtrado,
-                    'total_questoes': total_questoes,
-                    'percentual': round((acertos_filtrado / total_questoes) * 100, 1) if total_questoes > 0 else 0
-                })
-                alunos_com_resultado += 1
-            else:
-                print(f"[DEBUG] Aluno {aluno.nome} - Nenhum resultado para ano={ano}, periodo={periodo} - NÃO INCLUÍDO")
-                # NÃO adicionar alunos sem resultado para o período específico
+        contados = acertos_pelas_respostas(
+            [resultado_id for *_, resultado_id, sem_agregados in linhas if sem_agregados], componente
+        )
+        
+        for aluno_id, aluno_nome, turma_nome, acertos_filtrado, resultado_id, _ in linhas:
+            acertos_filtrado = int(contados.get(resultado_id, acertos_filtrado) or 0)
+            resultados_alunos.append({
+                'id': aluno_id,
+                'nome': aluno_nome,
+                'turma_nome': turma_nome or 'N/A',
+                'status': 'concluido',
+                'acertos': acertos_filtrado,
+                'total_questoes': total_questoes,
+                'percentual': round((acertos_filtrado / total_questoes) * 100, 1) if total_questoes > 0 else 0
+            })
+            alunos_com_resultado += 1
         
         print(f"[DEBUG] Total de alunos com resultado para ano={ano}, periodo={periodo}: {alunos_com_resultado}")
         
@@ -1908,8 +1915,12 @@ def listar_resultados():
             } for bloco in blocos]
         }
         
+        paginacao = None
+        if limite is not None or total_alunos is not None:
+            paginacao = dados_paginacao(limite, tem_mais, [linhas[-1][0]] if linhas else None, total_alunos)
+        
         # Se não há nenhum resultado para o período, retornar lista vazia
-        if len(resultados_alunos) == 0:
+        if len(resultados_alunos) == 0 and cursor is None:
             print(f"[DEBUG] Nenhum resultado encontrado para ano={ano}, periodo={periodo} - Retornando lista vazia")
             return jsonify({
                 'success': True,
@@ -1920,18 +1931,204 @@ def listar_resultados():
         
         print(f"[DEBUG] Retornando {len(resultados_alunos)} alunos, total_questoes para frontend: {total_questoes}")
         
-        return jsonify({
+        resposta = {
             'success': True,
             'caderno': caderno_data,
             'alunos': resultados_alunos
-        })
+        }
+        if paginacao:
+            resposta['paginacao'] = paginacao
+        return jsonify(resposta)
                 
+    except CursorInvalido as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"[ERROR] Erro em listar_resultados: {str(e)}")
         import traceback
         traceback.print_exc()
         return jsonify({'error': f'Erro interno: {str(e)}'}), 500
 
+@app.route('/api/cadernos/<int:caderno_id>/analise-itens', methods=['GET'])
+def analise_itens_caderno(caderno_id):
+    """
+    Análise de itens do caderno: p-valor, discriminação (ponto-bisserial) e frequência de cada alternativa.
+    Sem filtro de turma, considera todas as turmas da série. Filtros opcionais: ano, periodo, turma (lista), escola.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    
+    try:
+        caderno = Caderno.query.get_or_404(caderno_id)
+        if caderno.user_id != session['user_id']:
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        try:
+            ano = request.args.get('ano', type=int)
+            periodo = request.args.get('periodo') or None
+            turma_ids = _lista_de_ids(request.args.get('turma'))
+            escola_id = request.args.get('escola', type=int)
+        except ValueError:
+            return jsonify({'error': 'Filtros inválidos'}), 400
+        
+        analise = obter_analise_itens(caderno.id, ano, periodo, turma_ids, escola_id)
+        return jsonify({
+            'success': True,
+            'caderno': {
+                'id': caderno.id,
+                'titulo': caderno.titulo,
+                'serie': caderno.serie
+            },
+            **analise
+        })
+    except Exception as e:
+        print(f"[ERROR] Erro na análise de itens: {str(e)}")
+        return jsonify({'error': f'Erro ao calcular análise de itens: {str(e)}'}), 500
+
+@app.route('/api/resultados/exportar', methods=['GET'])
+def exportar_resultados():
+    """
+    Exporta os resultados em CSV ou XLSX, lendo e enviando as linhas aos poucos (sem carregar tudo em memória).
+    Parâmetros: tipo=resultados|respostas, formato=csv|xlsx e filtros opcionais ano, periodo, caderno, escola, turma.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+
+    try:
+        tipo = request.args.get('tipo', 'resultados')
+        formato = request.args.get('formato', 'csv')
+        if tipo not in TIPOS_EXPORTACAO or formato not in FORMATOS_EXPORTACAO:
+            return jsonify({'error': 'Tipo ou formato de exportação inválido'}), 400
+
+        try:
+            ano = request.args.get('ano', type=int)
+            periodo = request.args.get('periodo') or None
+            caderno_id = request.args.get('caderno', type=int)
+            escola_id = request.args.get('escola', type=int)
+            turma_id = request.args.get('turma', type=int)
+        except ValueError:
+            return jsonify({'error': 'Filtros inválidos'}), 400
+
+        consulta = consulta_exportacao(session['user_id'], tipo, ano, periodo, caderno_id, escola_id, turma_id)
+        linhas = iterar_linhas(consulta, tipo)
+        cabecalho = cabecalho_exportacao(tipo)
+        nome_arquivo = '_'.join(str(parte) for parte in (tipo, ano, periodo, caderno_id and f'caderno_{caderno_id}') if parte)
+
+        print(f"[DEBUG] Exportando {tipo} em {formato}: ano={ano}, periodo={periodo}, caderno={caderno_id}, escola={escola_id}, turma={turma_id}")
+        if formato == 'xlsx':
+            conteudo = gerar_xlsx(cabecalho, linhas, titulo=tipo.capitalize())
+            mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        else:
+            conteudo = gerar_csv(cabecalho, linhas)
+            mimetype = 'text/csv; charset=utf-8'
+
+        return Response(
+            stream_with_context(conteudo),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename={secure_filename(nome_arquivo)}.{formato}'}
+        )
+    except Exception as e:
+        print(f"[ERROR] Erro ao exportar resultados: {str(e)}")
+        return jsonify({'error': f'Erro ao exportar resultados: {str(e)}'}), 500
+
+@app.route('/api/resultados/comparar-periodos', methods=['GET'])
+@cache_relatorio()
+def comparar_periodos_resultados():
+    """
+    Compara o desempenho de alunos e turmas entre períodos de um ano (ex.: periodos=diagnostica,1,final).
+    Filtros opcionais: componente (padrão: todos), serie, turma, escola; alunos=0 retorna só as turmas.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+
+    try:
+        ano = request.args.get('ano', type=int)
+        periodos = [p.strip() for p in request.args.get('periodos', '').split(',') if p.strip()]
+        periodos = list(dict.fromkeys(periodos))  # Sem repetições, mantendo a ordem pedida
+        if not ano or len(periodos) < 2:
+            return jsonify({'error': 'Informe o ano e ao menos dois períodos'}), 400
+
+        comparacao = comparar_periodos(
+            session['user_id'],
+            ano,
+            periodos,
+            componente=request.args.get('componente') or None,
+            serie=request.args.get('serie', type=int),
+            turma_id=request.args.get('turma', type=int),
+            escola_id=request.args.get('escola', type=int),
+            incluir_alunos=request.args.get('alunos', '1').lower() not in ('0', 'false')
+        )
+        return jsonify({'success': True, 'ano': ano, **comparacao})
+    except Exception as e:
+        print(f"[ERROR] Erro ao comparar períodos: {str(e)}")
+        return jsonify({'error': f'Erro ao comparar períodos: {str(e)}'}), 500
+
+def _filtros_ranking():
+    """Lê ano, período, série, escopo e componente do ranking (ValueError se faltar algum obrigatório)"""
+    ano = request.args.get('ano', type=int)
+    periodo = request.args.get('periodo') or None
+    serie = request.args.get('serie', type=int) or request.args.get('etapa', type=int)
+    escopo = request.args.get('escopo') or request.args.get('tipo') or 'escola'
+    if not ano or not periodo or not serie:
+        raise ValueError('Informe ano, período e série')
+    if escopo not in ESCOPOS_RANKING:
+        raise ValueError(f"Escopo inválido. Use: {', '.join(ESCOPOS_RANKING)}")
+    componente = request.args.get('componente') or None
+    if componente == 'Ambos':
+        componente = None
+    return ano, periodo, serie, escopo, componente
+
+@app.route('/api/ranking', methods=['GET'])
+def ranking_resultados():
+    """Ranking pré-calculado de escolas, turmas ou alunos (top-N com limite/pagina)"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+
+    try:
+        try:
+            ano, periodo, serie, escopo, componente = _filtros_ranking()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        limite = min(max(request.args.get('limite', 10, type=int), 1), 500)
+        pagina = max(request.args.get('pagina', 1, type=int), 1)
+
+        ranking = consultar_ranking(
+            session['user_id'], ano, periodo, serie, escopo, componente,
+            limite=limite, deslocamento=(pagina - 1) * limite
+        )
+        return jsonify({
+            'success': True,
+            'filtros': {'ano': ano, 'periodo': periodo, 'serie': serie, 'escopo': escopo, 'componente': componente or 'Geral'},
+            'pagina': pagina,
+            'limite': limite,
+            **ranking
+        })
+    except Exception as e:
+        print(f"[ERROR] Erro ao consultar ranking: {str(e)}")
+        return jsonify({'error': f'Erro ao consultar ranking: {str(e)}'}), 500
+
+@app.route('/api/ranking/posicao', methods=['GET'])
+def posicao_ranking_resultados():
+    """Posição de uma escola, turma ou aluno (parâmetro id) no ranking pré-calculado"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+
+    try:
+        try:
+            ano, periodo, serie, escopo, componente = _filtros_ranking()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        referencia_id = request.args.get('id', type=int)
+        if not referencia_id:
+            return jsonify({'error': f'Informe o id do(a) {escopo}'}), 400
+
+        posicao = posicao_no_ranking(session['user_id'], ano, periodo, serie, escopo, referencia_id, componente)
+        if posicao is None:
+            return jsonify({'error': f'{escopo.capitalize()} sem resultados neste ranking'}), 404
+        return jsonify({'success': True, 'escopo': escopo, **posicao})
+    except Exception as e:
+        print(f"[ERROR] Erro ao consultar posição no ranking: {str(e)}")
+        return jsonify({'error': f'Erro ao consultar posição no ranking: {str(e)}'}), 500
+
 @app.route('/api/resultados', methods=['POST'])
 def salvar_resultado():
     """API para salvar resultado de um aluno"""
@@ -1961,157 +2158,59 @@ def salvar_resultado():
         if caderno.user_id != session['user_id']:
             return jsonify({'error': 'Acesso negado'}), 403
         
-        # Buscar ou criar resultado do aluno com filtros de ano e período
-        resultado = ResultadoAluno.query.filter_by(
-            aluno_id=aluno_id,
-            caderno_id=caderno_id,
-            user_id=session['user_id'],
-            ano_avaliacao=ano_avaliacao,
-            periodo_avaliacao=periodo_avaliacao
-        ).first()
-        
-        if not resultado:
-            resultado = ResultadoAluno(
-                aluno_id=aluno_id,
-                caderno_id=caderno_id,
-                user_id=session['user_id'],
-                ano_avaliacao=ano_avaliacao,
-                periodo_avaliacao=periodo_avaliacao
-            )
-            db.session.add(resultado)
-            db.session.flush()  # Gerar ID antes de usar
-        
-        # Atualizar status da prova
-        resultado.fez_prova = fez_prova
+        # Corrigir antes de gravar: o resultado e as respostas compactas são inseridos ou atualizados em uma única instrução (upsert)
+        respostas_compactas = SEM_RESPOSTAS
+        total_questoes = 0
+        total_acertos = 0
         
         if fez_prova and respostas:
-            # Limpar respostas anteriores
-            if resultado.id:
-                RespostaAluno.query.filter_by(resultado_id=resultado.id).delete()
+            # Gabarito compilado do caderno (blocos, questões e letras corretas já resolvidos)
+            gabarito = obter_gabarito_compilado(caderno.id)
             
-            # Buscar blocos do caderno
-            blocos = BlocoCaderno.query.filter_by(caderno_id=caderno_id).order_by(BlocoCaderno.ordem).all()
+            # Corrigir as respostas do aluno com o motor vetorizado
+            correcao = corrigir_matriz(gabarito, matriz_de_respostas(gabarito, [respostas]))
+            total_questoes = int(correcao.total_questoes[0])
+            total_acertos = int(correcao.acertos[0])
+            respostas_compactas = compactar_correcao(correcao, 0)
             
-            total_questoes = 0
-            total_acertos = 0
+            sem_gabarito = int((correcao.respondidas[0] & (gabarito.chave == CODIGO_SEM_GABARITO)).sum())
+            if sem_gabarito:
+                print(f"[DEBUG] ❌ PROBLEMA: {sem_gabarito} questão(ões) respondida(s) sem gabarito definido - caderno_id={caderno.id}")
             
-            # Processar respostas por bloco
-            for bloco_index, bloco in enumerate(blocos):
-                for questao_num in range(1, bloco.total_questoes + 1):
-                    questao_key = f"{bloco_index}-{questao_num}"
-                    
-                    if questao_key in respostas:
-                        resposta_marcada = respostas[questao_key]
-                        
-                        # Buscar questão real do bloco para verificar resposta correta
-                        questao_bloco = BlocoQuestao.query.filter_by(
-                            bloco_id=bloco.id,
-                            ordem=questao_num
-                        ).first()
-                        
-                        resposta_correta = None
-                        acertou = False
-                        
-                        print(f"[DEBUG] Processando questão {questao_key}: resposta={resposta_marcada}")
-                        
-                        if questao_bloco and questao_bloco.questao_id:
-                            print(f"[DEBUG] Questão encontrada ID: {questao_bloco.questao_id}")
-                            
-                            # Buscar a questão para verificar se usa modelo novo ou antigo
-                            questao_obj = Questao.query.get(questao_bloco.questao_id)
-                            
-                            if questao_obj and hasattr(questao_obj, 'resposta_correta') and questao_obj.resposta_correta:
-                                # MODELO NOVO: Usar resposta_correta direta da questão
-                                resposta_correta = questao_obj.resposta_correta
-                                acertou = (resposta_marcada == resposta_correta)
-                                print(f"[DEBUG] ✅ Modelo novo - Resposta correta: {resposta_correta}")
-                                print(f"[DEBUG] Comparação: '{resposta_marcada}' == '{resposta_correta}' = {acertou}")
-                                
-                            else:
-                                # MODELO ANTIGO: Usar tabela Alternativa
-                                alternativas = Alternativa.query.filter_by(
-                                    questao_id=questao_bloco.questao_id
-                                ).order_by(Alternativa.id).all()
-                                
-                                print(f"[DEBUG] Modelo antigo - Encontradas {len(alternativas)} alternativas para questão {questao_bloco.questao_id}")
-                                
-                                if alternativas:
-                                    # Debug: mostrar todas as alternativas
-                                    for i, alt in enumerate(alternativas):
-                                        letra = chr(65 + i)
-                                        print(f"[DEBUG] Alt {i}: {letra} - correta={alt.correta} - texto='{alt.texto[:30]}...'")
-                                    
-                                    # Encontrar qual alternativa é a correta e mapear para letra
-                                    resposta_correta = None
-                                    for i, alt in enumerate(alternativas):
-                                        if alt.correta:
-                                            resposta_correta = chr(65 + i)  # A, B, C, D
-                                            print(f"[DEBUG] ✅ Resposta correta encontrada: {resposta_correta}")
-                                            break
-                                    
-                                    if resposta_correta:
-                                        acertou = (resposta_marcada == resposta_correta)
-                                        print(f"[DEBUG] Comparação: '{resposta_marcada}' == '{resposta_correta}' = {acertou}")
-                                    else:
-                                        resposta_correta = 'N/A'
-                                        acertou = False
-                                        print(f"[DEBUG] ❌ PROBLEMA: Nenhuma alternativa correta encontrada!")
-                                else:
-                                    # Questão sem alternativas e sem resposta_correta - erro
-                                    resposta_correta = 'N/A'
-                                    acertou = False
-                                    print(f"[DEBUG] ❌ ERRO: Questão {questao_bloco.questao_id} não tem alternativas nem resposta_correta definida")
-                        else:
-                            resposta_correta = 'N/A'
-                            acertou = False
-                            print(f"[DEBUG] ❌ PROBLEMA: Questão do bloco não encontrada - bloco_id={bloco.id}, ordem={questao_num}")
-                        
-                        # Salvar resposta
-                        resposta_aluno = RespostaAluno(
-                            resultado_id=resultado.id,
-                            bloco_id=bloco.id,
-                            questao_ordem=questao_num,
-                            resposta_marcada=resposta_marcada,
-                            questao_id=questao_bloco.questao_id if questao_bloco else None,
-                            resposta_correta=resposta_correta,
-                            acertou=acertou
-                        )
-                        db.session.add(resposta_aluno)
-                        
-                        total_questoes += 1
-                        if acertou:
-                            total_acertos += 1
-            
-            # Atualizar totais no resultado
-            resultado.total_questoes = total_questoes
-            resultado.total_acertos = total_acertos
-            resultado.percentual_acertos = (total_acertos / total_questoes * 100) if total_questoes > 0 else 0
-            
-            print(f"[DEBUG] Salvando resultado: {total_acertos}/{total_questoes} acertos ({resultado.percentual_acertos:.1f}%)")
-        
+            print(f"[DEBUG] Salvando resultado: {total_acertos}/{total_questoes} acertos")
         else:
             # Se não fez prova, zerar contadores
-            resultado.total_questoes = 0
-            resultado.total_acertos = 0
-            resultado.percentual_acertos = 0
-            
             print(f"[DEBUG] Zerando contadores - não fez prova ou sem respostas")
-            
-            # Limpar respostas
-            if resultado.id:
-                RespostaAluno.query.filter_by(resultado_id=resultado.id).delete()
         
+        percentual_acertos = (total_acertos / total_questoes * 100) if total_questoes > 0 else 0
+        resultado_id = upsert_resultado(
+            aluno_id=aluno_id,
+            caderno_id=caderno_id,
+            user_id=session['user_id'],
+            ano_avaliacao=ano_avaliacao,
+            periodo_avaliacao=periodo_avaliacao,
+            fez_prova=fez_prova,
+            total_questoes=total_questoes,
+            total_acertos=total_acertos,
+            percentual_acertos=percentual_acertos,
+            **respostas_compactas
+        )
+        
+        # Respostas do formato anterior (uma linha por questão), se o resultado já existia
+        RespostaAluno.query.filter_by(resultado_id=resultado_id).delete(synchronize_session=False)
+        
+        atualizar_agregados_resultados([resultado_id])
         db.session.commit()
-        print(f"[DEBUG] Resultado salvo no banco - ID: {resultado.id}")
+        print(f"[DEBUG] Resultado salvo no banco - ID: {resultado_id}")
         
         return jsonify({
             'success': True,
             'message': 'Resultado salvo com sucesso!',
             'resultado': {
-                'fez_prova': resultado.fez_prova,
-                'total_acertos': resultado.total_acertos,
-                'total_questoes': resultado.total_questoes,
-                'percentual_acertos': resultado.percentual_acertos
+                'fez_prova': fez_prova,
+                'total_acertos': total_acertos,
+                'total_questoes': total_questoes,
+                'percentual_acertos': percentual_acertos
             }
         })
         
@@ -2119,6 +2218,134 @@ def salvar_resultado():
         db.session.rollback()
         return jsonify({'error': f'Erro ao salvar resultado: {str(e)}'}), 500
 
+def gravar_resultados_corrigidos(caderno, correcao, alunos_ids, ano_avaliacao, periodo_avaliacao, fez_prova=None):
+    """
+    Grava, na sessão corrente, os resultados de uma correção em lote: linha i da correção = alunos_ids[i].
+    Os ResultadoAluno e suas respostas compactas (linhas da própria matriz da correção) são gravados
+    com um upsert em lote; as linhas de RespostaAluno do formato anterior são apagadas com um único DELETE.
+    Retorna {aluno_id: {'id', 'fez_prova', 'total_questoes', 'total_acertos', 'percentual_acertos'}}.
+    """
+    fez_prova = fez_prova or {}
+    
+    resultados = {}
+    compactas = {}
+    for linha, aluno_id in enumerate(alunos_ids):
+        fez = fez_prova.get(aluno_id, True)
+        resultados[aluno_id] = {
+            'fez_prova': fez,
+            'total_questoes': int(correcao.total_questoes[linha]) if fez else 0,
+            'total_acertos': int(correcao.acertos[linha]) if fez else 0,
+            'percentual_acertos': float(correcao.percentuais[linha]) if fez else 0
+        }
+        compactas[aluno_id] = compactar_correcao(correcao, linha) if fez else SEM_RESPOSTAS
+    
+    ids = upsert_resultados([dict(
+        aluno_id=aluno_id,
+        caderno_id=caderno.id,
+        user_id=caderno.user_id,
+        data_lancamento=datetime.now(),
+        ano_avaliacao=ano_avaliacao,
+        periodo_avaliacao=periodo_avaliacao,
+        **valores,
+        **compactas[aluno_id]
+    ) for aluno_id, valores in resultados.items()])
+    for aluno_id, valores in resultados.items():
+        valores['id'] = ids[chave_resultado({
+            'aluno_id': aluno_id, 'caderno_id': caderno.id,
+            'ano_avaliacao': ano_avaliacao, 'periodo_avaliacao': periodo_avaliacao
+        })]
+    
+    # Limpar respostas do formato anterior de todos os resultados de uma vez
+    RespostaAluno.query.filter(
+        RespostaAluno.resultado_id.in_([r['id'] for r in resultados.values()])
+    ).delete(synchronize_session=False)
+    
+    atualizar_agregados_resultados([r['id'] for r in resultados.values()])
+    return resultados
+
+@app.route('/api/resultados/lote', methods=['POST'])
+def salvar_resultados_lote():
+    """
+    API para corrigir e salvar de uma vez os resultados de vários alunos de um caderno.
+    Espera payload:
+    {
+        "caderno_id": int, "ano_avaliacao": int, "periodo_avaliacao": str,
+        "alunos": [ {"aluno_id": int, "status": "concluido", "respostas": {"0-1": "A", ...} ou [["A", ...], ...]}, ... ]
+    }
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    
+    try:
+        data = request.json or {}
+        caderno_id = data.get('caderno_id')
+        ano_avaliacao = data.get('ano_avaliacao')
+        periodo_avaliacao = data.get('periodo_avaliacao')
+        alunos_payload = data.get('alunos')
+        
+        if not caderno_id or not isinstance(alunos_payload, list) or not alunos_payload:
+            return jsonify({'error': 'caderno_id e a lista de alunos são obrigatórios'}), 400
+        
+        caderno = Caderno.query.get_or_404(caderno_id)
+        if caderno.user_id != session['user_id']:
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        # Uma entrada por aluno (a última enviada prevalece)
+        entradas = {}
+        ignorados = []
+        for entrada in alunos_payload:
+            try:
+                entradas[int(entrada.get('aluno_id'))] = entrada
+            except (AttributeError, TypeError, ValueError):
+                ignorados.append({'aluno_id': None, 'erro': 'aluno_id inválido'})
+        
+        # Validar todos os alunos com uma única consulta
+        permitidos = {aluno_id for (aluno_id,) in db.session.query(Aluno.id).filter(
+            Aluno.id.in_(list(entradas)),
+            Aluno.user_id == session['user_id']
+        ).all()}
+        for aluno_id in [a for a in entradas if a not in permitidos]:
+            ignorados.append({'aluno_id': aluno_id, 'erro': 'Aluno não encontrado ou acesso negado'})
+            del entradas[aluno_id]
+        
+        if not entradas:
+            return jsonify({'error': 'Nenhum aluno válido para lançar', 'ignorados': ignorados}), 400
+        
+        alunos_ids = list(entradas)
+        fez_prova = {aluno_id: entradas[aluno_id].get('status', 'concluido') == 'concluido' for aluno_id in alunos_ids}
+        
+        # Correção de todos os alunos em uma única operação
+        gabarito = obter_gabarito_compilado(caderno.id)
+        correcao = corrigir_matriz(gabarito, matriz_de_respostas(
+            gabarito, [entradas[aluno_id].get('respostas') if fez_prova[aluno_id] else None for aluno_id in alunos_ids]
+        ))
+        
+        gravar_resultados_corrigidos(caderno, correcao, alunos_ids, ano_avaliacao, periodo_avaliacao, fez_prova=fez_prova)
+        db.session.commit()
+        
+        resultados = []
+        for linha, aluno_id in enumerate(alunos_ids):
+            resumo = correcao.resumo_do_aluno(linha)
+            resumo.update({'aluno_id': aluno_id, 'fez_prova': fez_prova[aluno_id]})
+            resultados.append(resumo)
+        
+        print(f"[DEBUG] Lote salvo: caderno={caderno.id}, alunos={len(alunos_ids)}, ignorados={len(ignorados)}")
+        
+        return jsonify({
+            'success': True,
+            'message': f'{len(resultados)} resultado(s) salvo(s) com sucesso!',
+            'componentes': correcao.componentes,
+            'resultados': resultados,
+            'ignorados': ignorados
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        print(f"[ERROR] Erro em salvar_resultados_lote: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': f'Erro ao salvar resultados: {str(e)}'}), 500
+
 @app.route('/api/resultados/<int:aluno_id>/<int:caderno_id>', methods=['GET'])
 def buscar_respostas_aluno(aluno_id, caderno_id):
     """API para buscar respostas salvas de um aluno específico"""
@@ -2147,8 +2374,8 @@ def buscar_respostas_aluno(aluno_id, caderno_id):
             fez_prova = resultado.fez_prova
             
             if fez_prova:
-                # Buscar respostas do aluno
-                respostas = RespostaAluno.query.filter_by(resultado_id=resultado.id).all()
+                # Buscar respostas do aluno (compactas ou, em resultados antigos, de RespostaAluno)
+                respostas = respostas_dos_resultados([resultado.id]).get(resultado.id, [])
                 
                 # Buscar blocos do caderno para mapear ordem
                 blocos = BlocoCaderno.query.filter_by(caderno_id=caderno_id).order_by(BlocoCaderno.ordem).all()
@@ -2230,6 +2457,7 @@ def lancar_resultado_scan(user_id):
         "caderno_id": int,
         "bloco_id": int,
         "respostas": [ {"questao_id": int, "alternativa": "A"}, ... ],
+        "ano_avaliacao": int (opcional), "periodo_avaliacao": str (opcional),
         "origem": "apk"
     }
     """
@@ -2244,6 +2472,8 @@ def lancar_resultado_scan(user_id):
         caderno_id = data.get('caderno_id')
         bloco_id = data.get('bloco_id')
         respostas = data.get('respostas')
+        ano_avaliacao = data.get('ano_avaliacao')
+        periodo_avaliacao = data.get('periodo_avaliacao')
         origem = data.get('origem', 'apk')
 
         # Validação básica dos campos obrigatórios
@@ -2261,78 +2491,38 @@ def lancar_resultado_scan(user_id):
         if hasattr(caderno, 'user_id') and caderno.user_id != user_id:
             return jsonify({'error': 'Acesso negado ao caderno'}), 403
 
-        # Buscar ou criar ResultadoAluno
-        resultado = ResultadoAluno.query.filter_by(
-            aluno_id=aluno_id,
-            caderno_id=caderno_id,
-            user_id=user_id
-        ).first()
-        if not resultado:
-            resultado = ResultadoAluno(
-                aluno_id=aluno_id,
-                caderno_id=caderno_id,
-                user_id=user_id
-            )
-            db.session.add(resultado)
-            db.session.flush()  # Gera o ID
-
-        # Limpar respostas anteriores
-        RespostaAluno.query.filter_by(resultado_id=resultado.id).delete()
-
         total_questoes = 0
         total_acertos = 0
         questoes_salvas = []
+        linhas_respostas = []
 
-        # Mapear ordem das questões no bloco
-        questoes_bloco = BlocoQuestao.query.filter_by(bloco_id=bloco_id).order_by(BlocoQuestao.ordem).all()
-        questao_id_to_ordem = {q.questao_id: q.ordem for q in questoes_bloco if q.questao_id}
+        # Gabarito compilado do caderno: ordem e letra correta de cada questão do bloco
+        gabarito = obter_gabarito_compilado(caderno.id)
 
         for resposta in respostas:
             questao_id = resposta.get('questao_id')
             alternativa_marcada = resposta.get('alternativa')
             if not questao_id or not alternativa_marcada:
                 continue  # Ignorar respostas incompletas
-            ordem = questao_id_to_ordem.get(questao_id)
+            ordem = gabarito.ordem_da_questao(bloco_id, questao_id)
             if not ordem:
                 print(f"[WARN] Questão {questao_id} não encontrada no bloco {bloco_id}")
                 continue
-            # Buscar gabarito da questão usando modelo híbrido
-            questao_obj = Questao.query.get(questao_id)
-            resposta_correta = None
-            acertou = False
-            
-            if questao_obj and hasattr(questao_obj, 'resposta_correta') and questao_obj.resposta_correta:
-                # MODELO NOVO: Usar resposta_correta direta da questão
-                resposta_correta = questao_obj.resposta_correta
+            item = gabarito.item(bloco.ordem, ordem)
+            if item and item.resposta_correta:
+                resposta_correta = item.resposta_correta
                 acertou = (alternativa_marcada == resposta_correta)
             else:
-                # MODELO ANTIGO: Usar tabela Alternativa
-                alternativas = Alternativa.query.filter_by(questao_id=questao_id).order_by(Alternativa.id).all()
-                if alternativas:
-                    for i, alt in enumerate(alternativas):
-                        letra = chr(65 + i)
-                        if alt.correta:
-                            resposta_correta = letra
-                            break
-                    if resposta_correta:
-                        acertou = (alternativa_marcada == resposta_correta)
-                    else:
-                        resposta_correta = 'N/A'
-                        acertou = False
-                else:
-                    resposta_correta = 'N/A'
-                    acertou = False
-            # Salvar resposta
-            resposta_aluno = RespostaAluno(
-                resultado_id=resultado.id,
-                bloco_id=bloco_id,
-                questao_ordem=ordem,
-                resposta_marcada=alternativa_marcada,
-                questao_id=questao_id,
-                resposta_correta=resposta_correta,
-                acertou=acertou
-            )
-            db.session.add(resposta_aluno)
+                resposta_correta = 'N/A'
+                acertou = False
+            linhas_respostas.append({
+                'bloco_id': bloco_id,
+                'questao_ordem': ordem,
+                'resposta_marcada': alternativa_marcada,
+                'questao_id': questao_id,
+                'resposta_correta': resposta_correta,
+                'acertou': acertou
+            })
             total_questoes += 1
             if acertou:
                 total_acertos += 1
@@ -2344,14 +2534,27 @@ def lancar_resultado_scan(user_id):
                 'acertou': acertou
             })
 
-        # Atualizar totais no resultado
-        resultado.fez_prova = True
-        resultado.total_questoes = total_questoes
-        resultado.total_acertos = total_acertos
-        resultado.percentual_acertos = (total_acertos / total_questoes * 100) if total_questoes > 0 else 0
+        # Gravar (inserir ou atualizar) o resultado com os totais e as respostas compactas em uma única instrução
+        percentual_acertos = (total_acertos / total_questoes * 100) if total_questoes > 0 else 0
+        resultado_id = upsert_resultado(
+            aluno_id=aluno_id,
+            caderno_id=caderno_id,
+            user_id=user_id,
+            ano_avaliacao=ano_avaliacao,
+            periodo_avaliacao=periodo_avaliacao,
+            fez_prova=True,
+            total_questoes=total_questoes,
+            total_acertos=total_acertos,
+            percentual_acertos=percentual_acertos,
+            **compactar_linhas(gabarito, linhas_respostas)
+        )
         # Registrar origem (pode ser um campo extra, log ou tabela de auditoria)
         # Exemplo: resultado.origem = origem  # Se existir o campo
 
+        # Respostas do formato anterior (uma linha por questão), se o resultado já existia
+        RespostaAluno.query.filter_by(resultado_id=resultado_id).delete(synchronize_session=False)
+
+        atualizar_agregados_resultados([resultado_id])
         db.session.commit()
         print(f"[LOG] Resultado salvo via APK: aluno={aluno_id}, caderno={caderno_id}, bloco={bloco_id}, acertos={total_acertos}/{total_questoes}, user_id={user_id}, origem={origem}")
 
@@ -2360,7 +2563,7 @@ def lancar_resultado_scan(user_id):
             'message': 'Resultados lançados com sucesso.',
             'acertos': total_acertos,
             'total_questoes': total_questoes,
-            'percentual': resultado.percentual_acertos,
+            'percentual': percentual_acertos,
             'respostas': questoes_salvas
         })
     except Exception as e:
@@ -2437,33 +2640,23 @@ def lancar_resultado_scan_qr():
             if alternativa not in ['A', 'B', 'C', 'D']:
                 return jsonify({'error': f'Alternativa inválida: {alternativa}. Deve ser A, B, C ou D'}), 400
         
-        # Verificar se já existe resultado para este aluno e caderno
-        resultado_existente = ResultadoAluno.query.filter_by(
+        # Gravar (inserir ou reaproveitar) o resultado do aluno neste caderno com um upsert
+        resultado_id = upsert_resultado(
             aluno_id=qr_data['aluno_id'],
-            caderno_id=qr_data['caderno_id']
-        ).first()
+            caderno_id=qr_data['caderno_id'],
+            user_id=session['user_id'],
+            ano_avaliacao=qr_data.get('ano_avaliacao'),
+            periodo_avaliacao=qr_data.get('periodo_avaliacao'),
+            fez_prova=True,
+            **dict.fromkeys(COLUNAS_COMPACTAS)  # Este fluxo grava RespostaAluno: o resultado volta a ser lido das linhas
+        )
+        resultado = db.session.get(ResultadoAluno, resultado_id)
+        resultado.data_aplicacao = datetime.now()
+        resultado.gabarito_id = qr_data['gabarito_id']
         
-        if resultado_existente:
-            # Atualizar resultado existente
-            resultado_existente.data_aplicacao = datetime.now()
-            resultado_existente.gabarito_id = qr_data['gabarito_id']
-            
-            # Remover respostas antigas
-            RespostaAluno.query.filter_by(resultado_id=resultado_existente.id).delete()
-            
-            resultado = resultado_existente
-            action = "atualizado"
-        else:
-            # Criar novo resultado
-            resultado = ResultadoAluno(
-                aluno_id=qr_data['aluno_id'],
-                caderno_id=qr_data['caderno_id'],
-                data_aplicacao=datetime.now(),
-                gabarito_id=qr_data['gabarito_id']
-            )
-            db.session.add(resultado)
-            db.session.flush()  # Para obter o ID
-            action = "criado"
+        # Remover respostas antigas (se havia, o resultado já existia)
+        removidas = RespostaAluno.query.filter_by(resultado_id=resultado_id).delete(synchronize_session=False)
+        action = "atualizado" if removidas else "criado"
         
         # Mapear questões para blocos
         questao_para_bloco = {}
@@ -2524,6 +2717,7 @@ def lancar_resultado_scan_qr():
         resultado.percentual_acerto = percentual_acerto
         
         # Salvar no banco
+        atualizar_agregados_resultados([resultado.id])
         db.session.commit()
         
         return jsonify({
@@ -2650,60 +2844,42 @@ def processar_gabarito_automatico():
         # Importar o sistema de correção integrado
         try:
             from correcao_gabarito_integrado import processar_gabarito_pdf
+            from correcao_paralela import processar_arquivos, formatar_resultado, uploads_em_disco
             print("✅ Sistema EduCorreção integrado importado com sucesso")
         except ImportError as e:
             print(f"❌ Erro ao importar sistema de correção: {e}")
             return jsonify({'error': f'Erro na importação do sistema de correção: {str(e)}'}), 500
 
+        # Modo assíncrono: salvar os PDFs na fila local e devolver o ID da tarefa para acompanhamento
+        if request.form.get('assincrono', '').lower() in ('1', 'true'):
+            if 'user_id' not in session:
+                return jsonify({'error': 'Usuário não autenticado'}), 401
+            pdfs = [file for file in files if file.filename and file.filename.lower().endswith('.pdf')]
+            if not pdfs:
+                return jsonify({'error': 'Nenhum arquivo válido encontrado'}), 400
+            tarefa = enfileirar_tarefa(session['user_id'], pdfs, num_quadrilateros, num_questoes, num_alternativas)
+            print(f"📥 Tarefa de correção {tarefa.id} enfileirada com {len(pdfs)} arquivo(s)")
+            return jsonify({
+                'tarefa_id': tarefa.id,
+                'status': tarefa.status,
+                'total_arquivos': len(pdfs),
+                'url_status': url_for('status_tarefa_correcao', tarefa_id=tarefa.id)
+            }), 202
+
+        # Gravar os PDFs válidos em disco e processar página a página entre os núcleos (ordem preservada)
+        pdfs = [file for file in files if file.filename and file.filename.lower().endswith('.pdf')]
+        
         resultados = []
         
-        for file in files:
-            if file.filename == '':
-                continue
-                
-            if not file.filename.lower().endswith('.pdf'):
-                continue
-            
-            try:
-                print(f"📄 Processando arquivo: {file.filename}")
-                
-                # Processar usando o sistema EduCorreção integrado
-                resultado = processar_gabarito_pdf(
-                    file, 
-                    num_quadrilateros, 
-                    num_questoes, 
-                    num_alternativas
-                )
-                
-                if resultado['success']:
-                    resultados.append({
-                        'arquivo': file.filename,
-                        'sucesso': True,
-                        'lote': resultado.get('lote'),
-                        'registration': resultado.get('registration'),
-                        'answers': resultado.get('answers'),
-                        'info': resultado.get('info', '')
-                    })
-                    print(f"✅ {file.filename} processado com sucesso")
+        with uploads_em_disco(pdfs) as arquivos:
+            for nome_arquivo, resultado in processar_arquivos(arquivos, num_quadrilateros, num_questoes, num_alternativas):
+                resultados.append(formatar_resultado(nome_arquivo, resultado))
+                if resultado.get('success'):
+                    print(f"✅ {nome_arquivo} processado com sucesso")
                     if resultado.get('info'):
                         print(f"ℹ️ {resultado['info']}")
-                        
                 else:
-                    # Erro específico retornado pela função
-                    resultados.append({
-                        'arquivo': file.filename,
-                        'sucesso': False,
-                        'erro': resultado.get('error', 'Erro desconhecido')
-                    })
-                    print(f"❌ Falha ao processar {file.filename}: {resultado.get('error')}")
-                    
-            except Exception as e:
-                print(f"❌ Erro ao processar {file.filename}: {str(e)}")
-                resultados.append({
-                    'arquivo': file.filename,
-                    'sucesso': False,
-                    'erro': str(e)
-                })
+                    print(f"❌ Falha ao processar {nome_arquivo}: {resultado.get('error')}")
 
         # Se apenas um arquivo foi processado, retornar resultado direto
         if len(files) == 1 and len(resultados) == 1:
@@ -2738,6 +2914,60 @@ def processar_gabarito_automatico():
         traceback.print_exc()
         return jsonify({'error': f'Erro interno do servidor: {str(e)}'}), 500
 
+def _obter_tarefa_do_usuario(tarefa_id):
+    """Retorna a tarefa de correção se pertencer ao usuário logado"""
+    tarefa = TarefaCorrecao.query.get(tarefa_id)
+    if not tarefa or tarefa.user_id != session.get('user_id'):
+        return None
+    return tarefa
+
+@app.route('/api/correcao-automatica/tarefas/<int:tarefa_id>', methods=['GET'])
+def status_tarefa_correcao(tarefa_id):
+    """Progresso e resultados (por arquivo) de uma tarefa de correção em segundo plano"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    tarefa = _obter_tarefa_do_usuario(tarefa_id)
+    if not tarefa:
+        return jsonify({'error': 'Tarefa não encontrada'}), 404
+    incluir_resultados = request.args.get('resultados', '1') != '0'
+    return jsonify(serializar_tarefa(tarefa, incluir_resultados=incluir_resultados))
+
+@app.route('/api/correcao-automatica/tarefas/<int:tarefa_id>/cancelar', methods=['POST'])
+def cancelar_tarefa_correcao(tarefa_id):
+    """Cancela uma tarefa de correção pendente ou em andamento"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    try:
+        tarefa = _obter_tarefa_do_usuario(tarefa_id)
+        if not tarefa:
+            return jsonify({'error': 'Tarefa não encontrada'}), 404
+        if tarefa.status in STATUS_FINALIZADOS:
+            return jsonify({'error': 'A tarefa já foi finalizada'}), 400
+        solicitar_cancelamento(tarefa)
+        return jsonify(serializar_tarefa(tarefa, incluir_resultados=False))
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/correcao-automatica/tarefas/<int:tarefa_id>/reprocessar', methods=['POST'])
+def reprocessar_tarefa_correcao(tarefa_id):
+    """Reenfileira os arquivos que falharam (ou foram cancelados) em uma tarefa finalizada"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    try:
+        tarefa = _obter_tarefa_do_usuario(tarefa_id)
+        if not tarefa:
+            return jsonify({'error': 'Tarefa não encontrada'}), 404
+        if tarefa.status not in STATUS_FINALIZADOS:
+            return jsonify({'error': 'A tarefa ainda está em andamento'}), 400
+        reenfileirados = reenfileirar_falhas(tarefa)
+        dados = serializar_tarefa(tarefa, incluir_resultados=False)
+        dados['arquivos_reenfileirados'] = reenfileirados
+        return jsonify(dados)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/correcao-automatica/importar-resultado', methods=['POST'])
 def importar_resultado_correcao():
     """
@@ -2770,137 +3000,36 @@ def importar_resultado_correcao():
         if not aluno:
             return jsonify({'erro': f'Aluno não encontrado: {matricula}'}), 404
 
-        # Buscar ou criar ResultadoAluno usando SQLAlchemy com filtros de ano e período
-        resultado_aluno = ResultadoAluno.query.filter_by(
-            aluno_id=aluno.id, 
-            caderno_id=caderno.id,
-            ano_avaliacao=ano_avaliacao,
-            periodo_avaliacao=periodo_avaliacao
-        ).first()
+        # Gabarito compilado do caderno (blocos, questões e letras corretas já resolvidos)
+        gabarito = obter_gabarito_compilado(caderno.id)
         
-        if resultado_aluno:
-            # Atualizar resultado existente
-            resultado_aluno.fez_prova = True
-            
-            # Limpar respostas anteriores
-            RespostaAluno.query.filter_by(resultado_id=resultado_aluno.id).delete()
-        else:
-            # Criar novo resultado
-            resultado_aluno = ResultadoAluno(
-                aluno_id=aluno.id,
-                caderno_id=caderno.id,
-                user_id=caderno.user_id,
-                fez_prova=True,
-                data_lancamento=datetime.now(),
-                ano_avaliacao=ano_avaliacao,
-                periodo_avaliacao=periodo_avaliacao
-            )
-            db.session.add(resultado_aluno)
-            db.session.flush()  # Para obter o ID
-
-        # Buscar blocos do caderno usando SQLAlchemy
-        blocos = BlocoCaderno.query.filter_by(caderno_id=caderno.id).order_by(BlocoCaderno.ordem).all()
-        
-        if not blocos:
+        if not gabarito.blocos:
             return jsonify({'erro': f'Nenhum bloco encontrado para o caderno {caderno_codigo}'}), 404
 
-        total_questoes = 0
-        total_acertos = 0
-
-        # Processar respostas por bloco
-        for i, bloco in enumerate(blocos):
-            if i >= len(respostas_blocos):
-                break
-                
-            respostas_bloco = respostas_blocos[i]
-            
-            # Buscar questões do bloco usando SQLAlchemy
-            questoes_bloco = BlocoQuestao.query.filter_by(bloco_id=bloco.id).order_by(BlocoQuestao.ordem).all()
-            
-            # Salvar respostas do bloco
-            for j, resposta_str in enumerate(respostas_bloco):
-                if j >= bloco.total_questoes:
-                    break
-                    
-                questao_ordem = j + 1
-                questao_id = None
-                resposta_correta = None
-                acertou = False
-                
-                # Encontrar questão correspondente
-                for questao_bloco in questoes_bloco:
-                    if questao_bloco.ordem == questao_ordem:
-                        questao_id = questao_bloco.questao_id
-                        break
-                
-                # Converter resposta para formato adequado
-                if resposta_str in ['A', 'B', 'C', 'D', 'E']:
-                    resposta_processada = resposta_str
-                elif resposta_str == 'Blank':
-                    resposta_processada = None
-                elif resposta_str and resposta_str.startswith('Multiple:'):
-                    # Marcações múltiplas são consideradas erro e marcadas com 'X'
-                    resposta_processada = 'X'  # Formato compatível com VARCHAR(1)
-                    print(f"⚠️ Marcação múltipla detectada na questão {questao_ordem}: {resposta_str} → convertida para 'X'")
-                else:
-                    resposta_processada = resposta_str if resposta_str and len(resposta_str) == 1 else 'X'
-                
-                # Buscar gabarito se questão foi identificada
-                if questao_id and resposta_processada and resposta_processada not in [None, 'X']:
-                    # Buscar questão para verificar se usa modelo direto ou tabela Alternativa
-                    questao_obj = Questao.query.get(questao_id)
-                    
-                    if questao_obj and questao_obj.resposta_correta:
-                        # Usar campo direto da questão (modelo migrado)
-                        resposta_correta = questao_obj.resposta_correta  # ✅ Já é apenas 1 letra
-                        acertou = (resposta_processada == resposta_correta)
-                    else:
-                        # Usar tabela Alternativa (modelo antigo)
-                        alternativas = Alternativa.query.filter_by(
-                            questao_id=questao_id
-                        ).order_by(Alternativa.id).all()
-                        
-                        if alternativas:
-                            # Encontrar letra correspondente à alternativa correta
-                            resposta_correta = None
-                            for i, alt in enumerate(alternativas):
-                                if alt.correta:
-                                    resposta_correta = chr(65 + i)  # A, B, C, D
-                                    break
-                            
-                            acertou = (resposta_processada == resposta_correta) if resposta_correta else False
-                        else:
-                            resposta_correta = None
-                            acertou = False
-                elif resposta_processada == 'X':
-                    # Marcações múltiplas são sempre incorretas
-                    resposta_correta = None
-                    acertou = False
-                
-                # Criar resposta usando SQLAlchemy
-                # Garantir que resposta_marcada não seja None (campo NOT NULL)
-                resposta_final = resposta_processada if resposta_processada is not None else ''
-                
-                resposta_aluno_obj = RespostaAluno(
-                    resultado_id=resultado_aluno.id,
-                    bloco_id=bloco.id,
-                    questao_ordem=questao_ordem,
-                    resposta_marcada=resposta_final,
-                    questao_id=questao_id,
-                    resposta_correta=resposta_correta,
-                    acertou=acertou
-                )
-                db.session.add(resposta_aluno_obj)
-                
-                total_questoes += 1
-                if acertou:
-                    total_acertos += 1
+        # Corrigir as respostas do aluno com o motor vetorizado
+        correcao = corrigir_matriz(gabarito, matriz_de_respostas(gabarito, [respostas_blocos]))
+        total_questoes = int(correcao.total_questoes[0])
+        total_acertos = int(correcao.acertos[0])
 
-        # Atualizar totais no resultado
+        # Gravar (inserir ou atualizar) o resultado com os totais e as respostas compactas em uma única instrução
         percentual = (total_acertos / total_questoes * 100) if total_questoes > 0 else 0
-        resultado_aluno.total_questoes = total_questoes
-        resultado_aluno.total_acertos = total_acertos
-        resultado_aluno.percentual_acertos = percentual
+        resultado_id = upsert_resultado(
+            aluno_id=aluno.id,
+            caderno_id=caderno.id,
+            user_id=caderno.user_id,
+            data_lancamento=datetime.now(),
+            ano_avaliacao=ano_avaliacao,
+            periodo_avaliacao=periodo_avaliacao,
+            fez_prova=True,
+            total_questoes=total_questoes,
+            total_acertos=total_acertos,
+            percentual_acertos=percentual,
+            **compactar_correcao(correcao, 0)
+        )
+
+        # Respostas do formato anterior (uma linha por questão), se o resultado já existia
+        RespostaAluno.query.filter_by(resultado_id=resultado_id).delete(synchronize_session=False)
+        atualizar_agregados_resultados([resultado_id])
 
         # Confirmar transação usando SQLAlchemy
         db.session.commit()
@@ -2909,7 +3038,7 @@ def importar_resultado_correcao():
 
         return jsonify({
             'sucesso': True,
-            'resultado_id': resultado_aluno.id,
+            'resultado_id': resultado_id,
             'aluno_nome': aluno.nome,
             'total_questoes': total_questoes,
             'total_acertos': total_acertos,
@@ -2930,6 +3059,124 @@ def importar_resultado_correcao():
             'erro': f'Erro interno do servidor: {str(e)}'
         }), 500
 
+@app.route('/api/correcao-automatica/importar-resultados', methods=['POST'])
+def importar_resultados_correcao_lote():
+    """
+    Importa em lote os resultados da correção automática (uma única transação).
+    Espera payload:
+    {
+        "ano_avaliacao": int, "periodo_avaliacao": str,
+        "resultados": [ {"lote": "101", "registration": "00042", "answers": [["A", ...], ...]}, ... ]
+    }
+    Retorna o status de cada item na mesma ordem do envio.
+    """
+    if 'user_id' not in session:
+        return jsonify({'sucesso': False, 'erro': 'Usuário não autenticado'}), 401
+    
+    try:
+        dados = request.get_json() or {}
+        itens = dados.get('resultados')
+        if not isinstance(itens, list) or not itens:
+            return jsonify({'sucesso': False, 'erro': 'Lista de resultados não fornecida'}), 400
+        
+        ano_padrao = dados.get('ano_avaliacao')
+        periodo_padrao = dados.get('periodo_avaliacao')
+        
+        def para_id(codigo):
+            try:
+                return int(codigo)
+            except (TypeError, ValueError):
+                return None
+        
+        # Resolver todos os cadernos e matrículas com uma consulta IN cada
+        cadernos_ids = {para_id(item.get('lote')) for item in itens if isinstance(item, dict)} - {None}
+        alunos_ids = {para_id(item.get('registration')) for item in itens if isinstance(item, dict)} - {None}
+        cadernos = {c.id: c for c in Caderno.query.filter(
+            Caderno.id.in_(cadernos_ids), Caderno.user_id == session['user_id']
+        ).all()} if cadernos_ids else {}
+        alunos = {a.id: a for a in Aluno.query.filter(
+            Aluno.id.in_(alunos_ids), Aluno.user_id == session['user_id']
+        ).all()} if alunos_ids else {}
+        
+        status = []
+        grupos = {}  # {(caderno_id, ano, periodo): {aluno_id: indice do item}}
+        for indice, item in enumerate(itens):
+            item = item if isinstance(item, dict) else {}
+            caderno = cadernos.get(para_id(item.get('lote')))
+            aluno = alunos.get(para_id(item.get('registration')))
+            status.append({
+                'indice': indice,
+                'lote': item.get('lote'),
+                'registration': item.get('registration'),
+                'sucesso': False
+            })
+            if not caderno:
+                status[indice]['erro'] = f"Caderno não encontrado: {item.get('lote')}"
+                continue
+            if not aluno:
+                status[indice]['erro'] = f"Aluno não encontrado: {item.get('registration')}"
+                continue
+            
+            chave = (caderno.id, item.get('ano_avaliacao', ano_padrao), item.get('periodo_avaliacao', periodo_padrao))
+            grupo = grupos.setdefault(chave, {})
+            if aluno.id in grupo:
+                # A folha escaneada por último prevalece
+                status[grupo[aluno.id]]['erro'] = 'Substituído por outra folha do mesmo aluno neste lote'
+            grupo[aluno.id] = indice
+        
+        for (caderno_id, ano_avaliacao, periodo_avaliacao), grupo in grupos.items():
+            caderno = cadernos[caderno_id]
+            gabarito = obter_gabarito_compilado(caderno_id)
+            if not gabarito.blocos:
+                for indice in grupo.values():
+                    status[indice]['erro'] = f'Nenhum bloco encontrado para o caderno {caderno.codigo_caderno}'
+                continue
+            
+            grupo_alunos = list(grupo)
+            correcao = corrigir_matriz(gabarito, matriz_de_respostas(
+                gabarito, [itens[grupo[aluno_id]].get('answers') or [] for aluno_id in grupo_alunos]
+            ))
+            resultados = gravar_resultados_corrigidos(
+                caderno, correcao, grupo_alunos, ano_avaliacao, periodo_avaliacao
+            )
+            
+            for linha, aluno_id in enumerate(grupo_alunos):
+                resultado = resultados[aluno_id]
+                status[grupo[aluno_id]].update({
+                    'sucesso': True,
+                    'resultado_id': resultado['id'],
+                    'aluno_nome': alunos[aluno_id].nome,
+                    'total_questoes': resultado['total_questoes'],
+                    'total_acertos': resultado['total_acertos'],
+                    'percentual_acertos': round(resultado['percentual_acertos'], 1)
+                })
+        
+        db.session.commit()
+        
+        total_sucesso = len([s for s in status if s['sucesso']])
+        print(f"✅ Importação em lote: {total_sucesso}/{len(status)} resultado(s) importado(s)")
+        
+        return jsonify({
+            'sucesso': True,
+            'resultados': status,
+            'total_itens': len(status),
+            'total_sucesso': total_sucesso,
+            'total_erros': len(status) - total_sucesso
+        })
+    
+    except Exception as e:
+        print(f"❌ Erro crítico na importação em lote: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        
+        # Rollback da transação em caso de erro
+        db.session.rollback()
+        
+        return jsonify({
+            'sucesso': False,
+            'erro': f'Erro interno do servidor: {str(e)}'
+        }), 500
+
 @app.route('/api/cadernos/teste-modelo-padrao')
 def teste_modelo_padrao():
     """Rota de teste para verificar se o modelo padrão está acessível"""
@@ -3528,8 +3775,102 @@ def download_kanban_pdf():
         traceback.print_exc()
         return jsonify({'error': f'Erro ao gerar PDF: {str(e)}'}), 500
 
+# =================== SNAPSHOT ANALÍTICO (PARQUET) ===================
+
+@app.route('/api/analitico/snapshot', methods=['POST'])
+def atualizar_snapshot_analitico():
+    """Atualiza o snapshot Parquet do usuário (incremental; completo=1 reescreve todas as partições)"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+
+    try:
+        completo = request.args.get('completo', '').lower() in ('1', 'true')
+        inicio = time.time()
+        manifesto = atualizar_snapshot(session['user_id'], completo=completo)
+        print(f"📦 Snapshot analítico do usuário {session['user_id']} atualizado em {time.time() - inicio:.2f}s "
+              f"({manifesto['particoes_reescritas']} partição(ões) reescrita(s))")
+        return jsonify({'success': True, 'url_download': url_for('baixar_snapshot_analitico'), **manifesto})
+    except Exception as e:
+        print(f"[ERROR] Erro ao atualizar snapshot analítico: {str(e)}")
+        return jsonify({'error': f'Erro ao atualizar snapshot analítico: {str(e)}'}), 500
+
+def gerar_zip_snapshot(arquivos, tamanho_pedaco=1024 * 1024):
+    """ZIP do snapshot enviado em pedaços (arquivos Parquet já são comprimidos: sem recompressão)"""
+    fluxo = _FluxoZip()
+    with zipfile.ZipFile(fluxo, 'w', zipfile.ZIP_STORED) as arquivo_zip:
+        for caminho, nome in arquivos:
+            with open(caminho, 'rb') as origem, arquivo_zip.open(nome, 'w', force_zip64=True) as destino:
+                while True:
+                    pedaco = origem.read(tamanho_pedaco)
+                    if not pedaco:
+                        break
+                    destino.write(pedaco)
+                    yield fluxo.esvaziar()
+            yield fluxo.esvaziar()
+    yield fluxo.esvaziar()
+
+@app.route('/api/analitico/snapshot', methods=['GET'])
+def baixar_snapshot_analitico():
+    """Baixa o último snapshot Parquet do usuário em um ZIP (manifesto=1 retorna apenas o manifesto)"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+
+    manifesto = carregar_manifesto(session['user_id'])
+    if manifesto is None:
+        return jsonify({'error': 'Snapshot ainda não gerado. Use POST /api/analitico/snapshot'}), 404
+    if request.args.get('manifesto', '').lower() in ('1', 'true'):
+        return jsonify({'success': True, **manifesto})
 
+    return Response(
+        stream_with_context(gerar_zip_snapshot(list(arquivos_snapshot(session['user_id'])))),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f"attachment; filename=snapshot_analitico_{manifesto['atualizado_em'][:10]}.zip"}
+    )
+
+# =================== COMANDOS DE MANUTENÇÃO (flask <comando>) ===================
+
+@app.cli.command('recalcular-resultados')
+@click.option('--caderno', 'caderno_id', type=int, default=None, help='Recalcular apenas os resultados deste caderno')
+def recalcular_resultados_comando(caderno_id):
+    """Preenche/recalcula os totais por componente, por habilidade e por período a partir das respostas gravadas"""
+    db.create_all()  # Garantir que as tabelas existam em bancos antigos
+    total = reconstruir_agregados_resultados(caderno_id)
+    print(f"✅ Totais por componente, habilidade e período recalculados para {total} resultado(s)")
+
+@app.cli.command('compactar-respostas')
+@click.option('--remover-linhas', is_flag=True, help='Apagar as linhas de RespostaAluno dos resultados já compactados')
+def compactar_respostas_comando(remover_linhas):
+    """Converte as respostas gravadas em RespostaAluno para as respostas compactas do ResultadoAluno"""
+    compactados, removidas = compactar_resultados_antigos(remover_linhas)
+    print(f"✅ {compactados} resultado(s) compactado(s)"
+          + (f", {removidas} linha(s) de RespostaAluno apagada(s)" if remover_linhas else ''))
+
+@app.cli.command('recalcular-rankings')
+@click.option('--usuario', 'user_id', type=int, default=None, help='Recalcular apenas os rankings deste usuário')
+def recalcular_rankings_comando(user_id):
+    """Recalcula os rankings com resultados alterados desde o último cálculo"""
+    db.create_all()
+    total = recalcular_rankings_pendentes(user_id)
+    print(f"✅ {total} grupo(s) de ranking recalculado(s)")
+
+@app.cli.command('snapshot-analitico')
+@click.option('--usuario', 'user_id', type=int, default=None, help='Gerar apenas os dados deste usuário (padrão: toda a base)')
+@click.option('--completo', is_flag=True, help='Reescrever todas as partições, ignorando o manifesto')
+def snapshot_analitico_comando(user_id, completo):
+    """Gera/atualiza o snapshot Parquet (particionado por ano/período) para análises em pandas"""
+    inicio = time.time()
+    manifesto = atualizar_snapshot(user_id, completo=completo)
+    print(f"✅ Snapshot em {diretorio_snapshot(user_id)}: {len(manifesto['particoes'])} partição(ões), "
+          f"{manifesto['particoes_reescritas']} reescrita(s), {manifesto['particoes_removidas']} removida(s) "
+          f"em {time.time() - inicio:.1f}s")
+
+@app.cli.command('limpar-imagens')
+@click.option('--idade-minima', type=int, default=3600, help='Manter imagens gravadas há menos destes segundos')
+def limpar_imagens_comando(idade_minima):
+    """Apaga do armazenamento as imagens que nenhuma questão referencia"""
+    em_uso = {chave for (chave,) in db.session.query(Questao.imagem_hash).filter(Questao.imagem_hash.isnot(None)).distinct()}
+    removidas = limpar_imagens_orfas(em_uso, idade_minima)
+    print(f"✅ {removidas} imagem(ns) órfã(s) removida(s); {len(em_uso)} em uso")
 
 if __name__ == '__main__':
     app.run(debug=False, host='0.0.0.0', port=5000, threaded=True, processes=1)
-
@@ -0,0 +1,169 @@
+"""
+Imagens das questões guardadas fora do banco, endereçadas pelo conteúdo.
+
+Cada imagem é gravada uma única vez, com o SHA-256 dos bytes como chave (duas questões com a mesma
+imagem apontam para o mesmo arquivo); a Questao guarda só a chave em `imagem_hash`. O armazenamento
+padrão é o disco local (IMAGENS_DIRETORIO, em pastas ab/cd/<hash>); outro (ex.: bucket) pode ser
+usado com definir_armazenamento(), implementando existe/tocar/gravar/abrir/remover/chaves.
+Só formatos de imagem rasterizada são aceitos (PNG, JPEG, GIF, BMP, WebP).
+Como o conteúdo de uma chave nunca muda, a rota da imagem usa o hash como ETag e cache longo.
+Arquivos sem questão que os referencie são apagados por `flask limpar-imagens`.
+"""
+import os
+import time
+import base64
+import hashlib
+import binascii
+import tempfile
+
+DIRETORIO_IMAGENS = os.getenv(
+    'IMAGENS_DIRETORIO',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads', 'imagens')
+)
+TAMANHO_MAXIMO = int(os.getenv('IMAGENS_TAMANHO_MAXIMO', 10 * 1024 * 1024))
+
+# Assinaturas dos formatos aceitos pelo navegador: (prefixo, tipo)
+_ASSINATURAS = [
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'BM', 'image/bmp'),
+]
+
+
+class ImagemInvalida(ValueError):
+    pass
+
+
+class ArmazenamentoLocal:
+    """Arquivos em disco, em subpastas pelos primeiros caracteres do hash"""
+
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+
+    def _caminho(self, chave):
+        return os.path.join(self.diretorio, chave[:2], chave[2:4], chave)
+
+    def existe(self, chave):
+        return os.path.exists(self._caminho(chave))
+
+    def tocar(self, chave):
+        os.utime(self._caminho(chave))
+
+    def gravar(self, chave, conteudo):
+        caminho = self._caminho(chave)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        descritor, temporario = tempfile.mkstemp(dir=os.path.dirname(caminho), prefix='.tmp')
+        with os.fdopen(descritor, 'wb') as arquivo:
+            arquivo.write(conteudo)
+        os.replace(temporario, caminho)  # Leitores nunca veem um arquivo pela metade
+
+    def abrir(self, chave):
+        return open(self._caminho(chave), 'rb')
+
+    def remover(self, chave):
+        try:
+            os.remove(self._caminho(chave))
+        except FileNotFoundError:
+            pass
+
+    def chaves(self, anteriores_a=None):
+        """Chaves gravadas (só as gravadas antes do timestamp `anteriores_a`, se informado)"""
+        for raiz, _, arquivos in os.walk(self.diretorio):
+            for nome in arquivos:
+                if nome.startswith('.'):
+                    continue
+                if anteriores_a is None or os.path.getmtime(os.path.join(raiz, nome)) < anteriores_a:
+                    yield nome
+
+
+_armazenamento = ArmazenamentoLocal(DIRETORIO_IMAGENS)
+
+
+def definir_armazenamento(armazenamento):
+    global _armazenamento
+    _armazenamento = armazenamento
+
+
+def armazenamento():
+    return _armazenamento
+
+
+def tipo_da_imagem(conteudo):
+    """Content-Type pelo início do arquivo (None se não for um formato de imagem conhecido)"""
+    for prefixo, tipo in _ASSINATURAS:
+        if conteudo.startswith(prefixo):
+            return tipo
+    if conteudo[:4] == b'RIFF' and conteudo[8:12] == b'WEBP':
+        return 'image/webp'
+    return None  # SVG não é aceito: servido do mesmo domínio, poderia executar scripts
+
+
+def guardar_imagem(conteudo):
+    """Grava os bytes (se a imagem ainda não existe) e retorna a chave"""
+    if not conteudo:
+        raise ImagemInvalida('Imagem vazia')
+    if len(conteudo) > TAMANHO_MAXIMO:
+        raise ImagemInvalida(f'Imagem maior que {TAMANHO_MAXIMO // (1024 * 1024)} MB')
+    if tipo_da_imagem(conteudo) is None:
+        raise ImagemInvalida('Formato de imagem não suportado')
+    chave = hashlib.sha256(conteudo).hexdigest()
+    if _armazenamento.existe(chave):
+        _armazenamento.tocar(chave)  # Renova a data: a limpeza não apaga uma imagem órfã que voltou a ser usada
+    else:
+        _armazenamento.gravar(chave, conteudo)
+    return chave
+
+
+def decodificar_base64(texto):
+    """Bytes de uma imagem em base64, com ou sem o prefixo 'data:image/...;base64,'"""
+    if texto.startswith('data:'):
+        texto = texto.split(',', 1)[-1]
+    try:
+        return base64.b64decode(''.join(texto.split()), validate=True)
+    except (binascii.Error, ValueError):
+        raise ImagemInvalida('Imagem em base64 inválida')
+
+
+def eh_url(texto):
+    return texto.startswith(('http://', 'https://', '/'))
+
+
+def processar_imagem(valor):
+    """
+    (imagem, imagem_hash) a gravar na Questao a partir do valor recebido: bytes de upload ou base64
+    vão para o armazenamento; URL externa fica em `imagem`; valor vazio remove a imagem.
+    """
+    if not valor:
+        return None, None
+    if isinstance(valor, bytes):
+        return None, guardar_imagem(valor)
+    if eh_url(valor):
+        return valor, None
+    return None, guardar_imagem(decodificar_base64(valor))
+
+
+def ler_imagem(chave):
+    with _armazenamento.abrir(chave) as arquivo:
+        return arquivo.read()
+
+
+def url_imagem(questao):
+    """Valor de 'imagem' nas respostas da API: rota da imagem guardada (versionada pelo hash) ou URL externa"""
+    if questao.imagem_hash:
+        return f"/api/questoes/{questao.id}/imagem?v={questao.imagem_hash[:16]}"
+    return questao.imagem or None
+
+
+def limpar_imagens_orfas(chaves_em_uso, idade_minima=3600):
+    """
+    Remove do armazenamento as imagens sem questão; retorna quantas foram removidas.
+    Imagens gravadas há menos de `idade_minima` segundos são mantidas (upload de uma questão ainda não salva).
+    """
+    removidas = 0
+    for chave in list(_armazenamento.chaves(anteriores_a=time.time() - idade_minima)):
+        if chave not in chaves_em_uso:
+            _armazenamento.remover(chave)
+            removidas += 1
+    return removidas
@@ -0,0 +1,141 @@
+"""
+Cache das respostas de relatórios, por (usuário, endpoint, filtros normalizados).
+
+Cada entrada guarda as versões (VersaoDados) dos dados de que o relatório depende, escolhidas pelos
+filtros: turma -> 'resultados_turma'; caderno -> 'resultados' e 'gabarito' do caderno; sem turma nem
+caderno -> 'resultados_usuario' do dono dos dados (o usuário do filtro, se houver; para um administrador
+sem esse filtro, a soma das versões de todos os usuários; senão, o usuário da sessão). As versões são incrementadas na mesma transação das gravações de
+resultados (atualizar_agregados_resultados), então um acerto no cache custa só a consulta das
+versões. O cache é por processo, limitado (LRU) e com validade máxima (RELATORIOS_CACHE_TTL) para
+alterações que não passam pelos resultados (nome de aluno, turma de aluno...).
+"""
+import time
+import threading
+from functools import wraps
+from collections import OrderedDict
+
+from flask import request, session, current_app
+
+from ambiente import inteiro_do_ambiente
+from database import db, VersaoDados
+from gabarito_compilado import ESCOPO_GABARITO
+from resultados_componente import ESCOPO_RESULTADOS, ESCOPO_RESULTADOS_TURMA, ESCOPO_RESULTADOS_USUARIO
+
+LIMITE_CACHE = inteiro_do_ambiente('RELATORIOS_CACHE_LIMITE', 512)
+VALIDADE_SEGUNDOS = inteiro_do_ambiente('RELATORIOS_CACHE_TTL', 600)
+TAMANHO_MAXIMO = 2 * 1024 * 1024  # Respostas maiores não entram no cache
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def filtros_normalizados(view_args=None):
+    """Filtros da requisição (query string, JSON de um POST de consulta e argumentos da rota) sem valores vazios, em ordem estável"""
+    filtros = {}
+    for nome in request.args:
+        valores = [valor.strip() for valor in request.args.getlist(nome) if valor.strip()]
+        if valores:
+            filtros[nome] = ','.join(valores)
+    if request.method == 'POST' and request.is_json:
+        for nome, valor in (request.get_json(silent=True) or {}).items():
+            if valor not in (None, '', [], {}):
+                filtros[nome] = ','.join(map(str, valor)) if isinstance(valor, list) else str(valor)
+    for nome, valor in (view_args or {}).items():
+        filtros[nome] = str(valor)
+    return tuple(sorted(filtros.items()))
+
+
+def _ids(valor):
+    try:
+        return [int(parte) for parte in str(valor).split(',') if parte.strip()]
+    except ValueError:
+        return []
+
+
+def escopos_pelos_filtros(user_id, filtros):
+    """
+    Versões de que o relatório depende, deduzidas dos filtros (turma, caderno ou os resultados do dono dos dados).
+    Referência None: todas as referências do escopo (administrador vendo os dados de todos os usuários).
+    """
+    filtros = dict(filtros)
+    turmas = _ids(filtros.get('turma') or filtros.get('turma_id') or '')
+    cadernos = _ids(filtros.get('caderno') or filtros.get('caderno_id') or '')
+    escopos = [(ESCOPO_RESULTADOS_TURMA, turma_id) for turma_id in turmas]
+    for caderno_id in cadernos:
+        if not turmas:
+            escopos.append((ESCOPO_RESULTADOS, caderno_id))
+        escopos.append((ESCOPO_GABARITO, caderno_id))  # Blocos/gabarito do caderno
+    if not turmas and not cadernos:
+        usuarios = _ids(filtros.get('usuario') or filtros.get('usuario_id') or filtros.get('user_id') or '')
+        if not usuarios:
+            usuarios = [None] if session.get('tipo_usuario') == 'admin' else [user_id]
+        escopos += [(ESCOPO_RESULTADOS_USUARIO, usuario_id) for usuario_id in usuarios]
+    return escopos
+
+
+def versoes_atuais(escopos):
+    """Versões atuais dos escopos, em uma única consulta (referência None: soma das versões do escopo)"""
+    if not escopos:
+        return ()
+    consultas = []
+    especificos = [chave for chave in escopos if chave[1] is not None]
+    if especificos:
+        consultas.append(db.select(
+            VersaoDados.escopo, VersaoDados.referencia_id, VersaoDados.versao
+        ).where(db.tuple_(VersaoDados.escopo, VersaoDados.referencia_id).in_(especificos)))
+    # As versões só crescem, então a soma muda a cada gravação de qualquer referência do escopo
+    consultas += [db.select(
+        VersaoDados.escopo, db.null(), db.func.sum(VersaoDados.versao)
+    ).where(VersaoDados.escopo == escopo) for escopo, referencia_id in escopos if referencia_id is None]
+    consulta = consultas[0] if len(consultas) == 1 else db.union_all(*consultas)
+    encontradas = {(escopo, referencia_id): versao for escopo, referencia_id, versao in db.session.execute(consulta)}
+    return tuple(encontradas.get(chave) or 0 for chave in escopos)
+
+
+def cache_relatorio(escopos=None, metodos=('GET', 'HEAD')):
+    """
+    Decorator de views de relatório (JSON): responde do cache enquanto as versões não mudarem.
+    `escopos(user_id, filtros)` permite informar as versões quando os filtros não usam turma/caderno.
+    Só as requisições com os `metodos` informados usam o cache; as demais (POST que grava, gera
+    arquivo etc.) vão direto para a view. Um POST só de consulta pode ser incluído explicitamente.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if 'user_id' not in session or request.method not in metodos:
+                return view(*args, **kwargs)
+
+            user_id = session['user_id']
+            filtros = filtros_normalizados(kwargs)
+            chave = (user_id, request.endpoint, filtros)
+            dependencias = (escopos or escopos_pelos_filtros)(user_id, filtros)
+            versao = versoes_atuais(dependencias)
+
+            agora = time.time()
+            with _lock:
+                entrada = _cache.get(chave)
+                if entrada is not None and entrada[0] == versao and entrada[1] > agora:
+                    _cache.move_to_end(chave)
+                    _, _, corpo, status, mimetype = entrada
+                    resposta = current_app.response_class(corpo, status=status, mimetype=mimetype)
+                    resposta.headers['X-Cache'] = 'HIT'
+                    return resposta
+
+            resposta = current_app.make_response(view(*args, **kwargs))
+            if (resposta.status_code == 200 and resposta.mimetype == 'application/json'
+                    and not resposta.is_streamed and resposta.content_length is not None
+                    and resposta.content_length <= TAMANHO_MAXIMO):
+                with _lock:
+                    _cache[chave] = (versao, agora + VALIDADE_SEGUNDOS, resposta.get_data(), 200, resposta.mimetype)
+                    _cache.move_to_end(chave)
+                    while len(_cache) > LIMITE_CACHE:
+                        _cache.popitem(last=False)
+            resposta.headers['X-Cache'] = 'MISS'
+            return resposta
+        return wrapper
+    return decorator
+
+
+def limpar_cache():
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,482 @@
+"""
+Geração dos cartões gabarito (folhas de resposta com QR Code).
+
+Turmas grandes são divididas em lotes renderizados em paralelo por um pool de processos;
+os PDFs dos lotes são unidos na ordem original sem recodificar o conteúdo das páginas.
+gravar_pdf_cartoes grava o resultado em um arquivo (para ser enviado do disco em partes), com os lotes
+passando por arquivos temporários em vez de ficarem todos na memória.
+Variáveis de ambiente: CARTOES_PROCESSOS (1 = sem paralelismo; padrão: os núcleos divididos entre os
+processos do gunicorn, ver ambiente.py), CARTOES_TAMANHO_LOTE e CARTOES_MINIMO_PARALELO (abaixo desse
+número de alunos a renderização é feita no próprio processo).
+"""
+import os
+import tempfile
+import threading
+import multiprocessing
+from io import BytesIO
+from types import SimpleNamespace
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from ambiente import inteiro_do_ambiente, processos_por_worker_web
+from qrcode_gabarito import desenhar_qr, identificador_gabarito, matriz_qr, QRCodeVetorial
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "modelo padrão.pdf")
+NUM_PROCESSOS = inteiro_do_ambiente('CARTOES_PROCESSOS', processos_por_worker_web())
+TAMANHO_LOTE = inteiro_do_ambiente('CARTOES_TAMANHO_LOTE', 100)
+MINIMO_PARALELO = inteiro_do_ambiente('CARTOES_MINIMO_PARALELO', 200, minimo=0)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def gerar_gabarito_com_template_e_qr(template_path, alunos, caderno, nome_professor, blocos):
+    """Gera gabarito usando template PDF existente + QR Code - Layout Organizado"""
+    try:
+        from reportlab.pdfgen import canvas
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib import colors
+        from io import BytesIO
+        
+        print(f"📄 Iniciando geração com template: {template_path}")
+        print(f"👥 Gerando para {len(alunos)} aluno(s)")
+        print(f"📚 Caderno: {caderno.titulo} (ID: {caderno.id})")
+        
+        buffer = BytesIO()
+        c = canvas.Canvas(buffer, pagesize=A4)
+        
+        # Dimensões da página A4
+        width, height = A4
+        print(f"📐 Dimensões da página: {width} x {height}")
+        
+        # Abrir o template uma única vez: ele é aplicado como fundo vetorial compartilhado por todas as páginas
+        import fitz  # PyMuPDF
+        try:
+            template_doc = fitz.open(template_path)
+        except Exception as template_error:
+            print(f"⚠️ Erro ao carregar template: {template_error}")
+            template_doc = None
+        
+        # Gerar uma página para cada aluno
+        for i, aluno_data in enumerate(alunos):
+            aluno = aluno_data
+            turma = aluno['turma']
+            escola = aluno['escola']
+            
+            # ID único para o gabarito
+            gabarito_id = identificador_gabarito(caderno.id, aluno['id'])
+            
+            # Dados para o QR Code incluindo matrícula e código do caderno
+            qr_dados = {
+                "aluno_id": aluno['id'],
+                "aluno_matricula": f"{aluno['id']:05d}",  # Matrícula de 5 dígitos
+                "aluno_nome": aluno['nome'],
+                "caderno_id": caderno.id,
+                "caderno_codigo": f"{caderno.id:03d}",  # Código do caderno de 3 dígitos
+                "caderno_titulo": caderno.titulo,
+                "turma_id": aluno['turma_id'],
+                "turma_nome": turma.nome,
+                "escola_id": aluno['escola_id'],
+                "escola_nome": escola.nome if escola else "N/A",
+                "gabarito_id": gabarito_id,
+                "serie": caderno.serie,
+                "total_questoes": sum(b.total_questoes for b in blocos),
+                "tipo": "edu_gabarito_qr",
+                "versao": "2.0"
+            }
+            
+            # Sem template: cabeçalho básico (com template, o fundo é aplicado no final, uma vez para o PDF inteiro)
+            if template_doc is None:
+                c.setFont("Helvetica-Bold", 16)
+                c.drawString(50, height - 50, "FOLHA DE RESPOSTA - GABARITO EDU PLATAFORMA")
+            
+            # ============= POSICIONAMENTO ORGANIZADO DOS CAMPOS =============
+            
+            # 1. QR CODE NO CANTO SUPERIOR ESQUERDO
+            qr_size = 70  # Tamanho do QR Code em pontos
+            qr_x = 30  # Margem esquerda
+            qr_y = height - qr_size - 30  # 30 pontos do topo
+            
+            desenhar_qr(c, qr_dados, qr_x, qr_y, qr_size)
+            
+            # Texto do QR Code
+            c.setFont("Helvetica-Bold", 7)
+            c.drawString(qr_x, qr_y - 10, "ESCANEIE NO APP")
+            
+            # 2. CÓDIGO DO CADERNO NO CANTO SUPERIOR DIREITO
+            c.setFont("Helvetica-Bold", 12)
+            c.setFillColor(colors.black)
+            codigo_caderno_text = f"{caderno.id:03d}"  # Apenas os números
+            cod_width = c.stringWidth(codigo_caderno_text, "Helvetica-Bold", 12)
+            c.drawString(width - cod_width - 97, height - 46, codigo_caderno_text)  # Mais à direita
+            
+            # 3. MATRÍCULA ABAIXO DO CÓDIGO DO CADERNO
+            c.setFont("Helvetica-Bold",12)
+            c.setFillColor(colors.black)
+            matricula_text = f"{aluno['id']:05d}"  # Apenas os números
+            mat_width = c.stringWidth(matricula_text, "Helvetica-Bold", 12)
+            c.drawString(width - mat_width - 87, height - 73, matricula_text)  # Mais à direita
+            
+            # 4. PREENCHIMENTO DOS CAMPOS DO TEMPLATE (baseado no layout padrão)
+            c.setFillColor(colors.black)  # Voltar cor padrão
+            
+            # Baseado na análise do template, as posições aproximadas dos campos são:
+            # As coordenadas são baseadas no template padrão do gabarito
+            
+            # Campo Professor (retângulo superior esquerdo do cabeçalho)
+            c.setFont("Helvetica-Bold", 11)
+            c.drawString(25, height - 170, nome_professor[:30])  # Limitar tamanho
+            
+            # Campo Escola (campo escola no cabeçalho)
+            c.setFont("Helvetica-Bold", 10)
+            c.drawString(25, height - 210, escola.nome[:35] if escola else "N/A")
+            
+            # Campo Turno (campo à direita)
+            c.setFont("Helvetica-Bold", 10)
+            turno_text = turma.turno if (turma and hasattr(turma, 'turno') and turma.turno) else "Tarde"
+            c.drawString(384, height - 212, turno_text)
+            
+            # Campo Nome do Aluno (campo principal - maior)
+            c.setFont("Helvetica-Bold", 12)
+            c.drawString(25, height - 255, aluno['nome'][:45])  # Nome do aluno
+            
+            # Campo Série/Turma (campo à direita do nome)
+            c.setFont("Helvetica-Bold", 10)
+            if turma and hasattr(turma, 'nome') and turma.nome:
+                # Limpar formatação redundante da turma
+                turma_nome = turma.nome.replace('º ANO - ', '').replace('ANO - ', '')
+                serie_turma_text = f"{caderno.serie}º ano - {turma_nome}"
+            else:
+                serie_turma_text = f"{caderno.serie}º ano - A"
+            c.drawString(380, height - 250, serie_turma_text[:25])
+       
+            # Quebra de página (exceto no último aluno)
+            if i < len(alunos) - 1:
+                c.showPage()
+        
+        # Finalizar PDF
+        c.save()
+        
+        # Aplicar o template por baixo dos campos: a página do modelo entra no PDF uma única vez
+        # (XObject reaproveitado), em vez de uma imagem rasterizada por aluno
+        if template_doc is not None:
+            with fitz.open("pdf", buffer.getvalue()) as documento:
+                for pagina in documento:
+                    pagina.show_pdf_page(pagina.rect, template_doc, 0, overlay=False, keep_proportion=False)
+                buffer = BytesIO(documento.tobytes(garbage=3, deflate=True))
+            template_doc.close()
+        buffer.seek(0)
+        
+        print(f"✅ PDF gerado com template organizado + QR Code para {len(alunos)} aluno(s)")
+        return buffer
+        
+    except Exception as e:
+        print(f"❌ Erro ao gerar PDF com template: {str(e)}")
+        # Fallback para função simples sem template
+        return gerar_pdf_cartoes_gabarito_simples(caderno, blocos, alunos, nome_professor)
+
+def gerar_pdf_cartoes_gabarito_com_qr(caderno, blocos, alunos, nome_professor):
+    """Função de fallback - gera PDF simples com QR Code sem template"""
+    return gerar_pdf_cartoes_gabarito_simples(caderno, blocos, alunos, nome_professor)
+
+def gerar_pdf_cartoes_gabarito_simples(caderno, blocos, alunos, nome_professor):
+    """Gera PDF simples com layout básico + QR Code"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib import colors
+    from reportlab.lib.units import cm
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.enums import TA_CENTER
+    from io import BytesIO
+    
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, 
+                          rightMargin=1.5*cm, leftMargin=1.5*cm,
+                          topMargin=1*cm, bottomMargin=1*cm)
+    
+    styles = getSampleStyleSheet()
+    
+    # Estilos profissionais
+    title_style = ParagraphStyle(
+        'TitleStyle',
+        parent=styles['Heading1'],
+        fontSize=16,
+        spaceAfter=10,
+        alignment=TA_CENTER,
+        textColor=colors.black,
+        fontName='Helvetica-Bold'
+    )
+    
+    story = []
+    
+    for i, aluno_data in enumerate(alunos):
+        aluno = aluno_data
+        turma = aluno['turma']
+        escola = aluno['escola']
+        
+        # ID único para o gabarito
+        gabarito_id = identificador_gabarito(caderno.id, aluno['id'])
+        
+        # Dados para o QR Code incluindo matrícula e código do caderno
+        qr_dados = {
+            "aluno_id": aluno['id'],
+            "aluno_matricula": f"{aluno['id']:05d}",  # Matrícula de 5 dígitos
+            "aluno_nome": aluno['nome'],
+            "caderno_id": caderno.id,
+            "caderno_codigo": f"{caderno.id:03d}",  # Código do caderno de 3 dígitos
+            "caderno_titulo": caderno.titulo,
+            "turma_id": aluno['turma_id'],
+            "turma_nome": turma.nome,
+            "escola_id": aluno['escola_id'],
+            "escola_nome": escola.nome if escola else "N/A",
+            "gabarito_id": gabarito_id,
+            "serie": caderno.serie,
+            "total_questoes": sum(b.total_questoes for b in blocos),
+            "tipo": "edu_gabarito_qr",
+            "versao": "2.0"
+        }
+        
+        # Título principal
+        story.append(Paragraph("FOLHA DE RESPOSTA - GABARITO EDU PLATAFORMA", title_style))
+        story.append(Spacer(1, 0.3*cm))
+        
+        # Layout organizado com QR Code real na primeira coluna
+        qr_image = QRCodeVetorial(qr_dados, 2.5*cm)
+        
+        layout_data = [
+            [qr_image, 'DADOS DO ALUNO E AVALIAÇÃO', f'{caderno.id:03d}'],  # Apenas números
+            ['ESCANEIE\nNO APP', f'Professor(a): {nome_professor}', f'{aluno["id"]:05d}'],  # Apenas números
+            ['', f'Escola: {escola.nome if escola else "N/A"}', f'ID: {gabarito_id}'],
+            ['', f'Aluno(a): {aluno["nome"]}', 'Data: ___/___/______'],
+            ['', f'Turma: {turma.nome}', f'{caderno.serie}º ano'],
+            ['', f'Turno: {turma.turno if turma else "N/A"}', f'Total: {sum(b.total_questoes for b in blocos)} questões']
+        ]
+        
+        # Criar tabela principal com layout organizado
+        layout_table = Table(layout_data, colWidths=[3*cm, 9*cm, 4*cm])
+        layout_table.setStyle(TableStyle([
+            # Alinhamentos
+            ('ALIGN', (0, 0), (0, -1), 'CENTER'),  # QR Code centralizado
+            ('ALIGN', (1, 0), (1, -1), 'LEFT'),    # Dados alinhados à esquerda
+            ('ALIGN', (2, 0), (2, -1), 'CENTER'),  # Códigos centralizados
+            ('VALIGN', (0, 0), (0, -1), 'MIDDLE'), # QR Code centralizado verticalmente
+            
+            # Fontes
+            ('FONTNAME', (1, 0), (1, 0), 'Helvetica-Bold'),   # Cabeçalho dados
+            ('FONTSIZE', (1, 0), (1, 0), 11),
+            ('FONTNAME', (0, 1), (0, 1), 'Helvetica-Bold'),   # Texto "ESCANEIE"
+            ('FONTSIZE', (0, 1), (0, 1), 7),
+            ('FONTNAME', (1, 1), (1, -1), 'Helvetica'),       # Dados do aluno
+            ('FONTSIZE', (1, 1), (1, -1), 10),
+            ('FONTNAME', (2, 0), (2, -1), 'Times-Bold'),      # Códigos em Times New Roman
+            ('FONTSIZE', (2, 0), (2, -1), 14),                # Aumentar tamanho
+            ('FONTNAME', (2, 1), (2, 1), 'Times-Bold'),       # Matrícula em Times New Roman
+            ('FONTSIZE', (2, 1), (2, 1), 13),                 # Tamanho específico para matrícula
+            
+            # Bordas
+            ('GRID', (0, 0), (-1, -1), 1.5, colors.black),
+            
+            # Cores de fundo
+            ('BACKGROUND', (0, 0), (0, 1), colors.yellow),     # Área QR Code
+            ('BACKGROUND', (1, 0), (1, 0), colors.lightgrey), # Cabeçalho dados
+            ('BACKGROUND', (2, 0), (2, 0), colors.lightcoral), # Código caderno
+            ('BACKGROUND', (2, 1), (2, 1), colors.lightblue),  # Matrícula
+            
+            # Padding
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+            ('LEFTPADDING', (0, 0), (-1, -1), 6),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 6),
+            
+            # Destaque especial para código e matrícula
+            ('TEXTCOLOR', (2, 0), (2, 0), colors.darkred),   # Código em vermelho
+            ('TEXTCOLOR', (2, 1), (2, 1), colors.darkblue),  # Matrícula em azul
+            
+            # Fazer o QR Code ocupar duas linhas
+            ('SPAN', (0, 0), (0, 1)),  # QR Code ocupa primeira e segunda linha
+        ]))
+        
+        story.append(layout_table)
+        story.append(Spacer(1, 0.2*cm))
+        
+        # Adicionar QR Code na coluna da esquerda (já está na tabela principal)
+        # Criar rodapé com informações de identificação
+        footer_data = [
+            ['🔍 QR CODE PARA ESCANEAMENTO', 'IDENTIFICAÇÃO ÚNICA'],
+            ['ESCANEIE NO APP', f'ID: {gabarito_id} | {aluno["id"]:05d} | {caderno.id:03d}'],  # Apenas números
+            ['', f'Aluno: {aluno["nome"][:30]}']
+        ]
+        
+        footer_table = Table(footer_data, colWidths=[8*cm, 8*cm])
+        footer_table.setStyle(TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 9),
+            ('FONTNAME', (0, 1), (-1, -1), 'Courier'),
+            ('FONTSIZE', (0, 1), (-1, -1), 8),
+            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.lightyellow),
+            ('BACKGROUND', (1, 0), (1, 0), colors.lightcoral),
+            ('TEXTCOLOR', (1, 1), (1, 1), colors.darkred),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+            ('TOPPADDING', (0, 0), (-1, -1), 4),
+        ]))
+        
+        story.append(footer_table)
+        story.append(Spacer(1, 0.4*cm))
+        
+        # Adicionar break de página para o próximo aluno
+        if i < len(alunos) - 1:
+            story.append(PageBreak())
+    
+    # Construir o PDF
+    doc.build(story)
+    buffer.seek(0)
+    
+    print(f"✅ PDF simples gerado com QR Code para {len(alunos)} aluno(s)")
+    return buffer
+
+
+def gerar_pdf_cartoes_sequencial(alunos, caderno, nome_professor, blocos):
+    """Gera o PDF dos cartões no próprio processo, com o modelo padrão (ou layout simples, se o modelo não existir)"""
+    if os.path.exists(TEMPLATE_PATH):
+        return gerar_gabarito_com_template_e_qr(TEMPLATE_PATH, alunos, caderno, nome_professor, blocos)
+    print("❌ Template não encontrado, usando geração padrão")
+    return gerar_pdf_cartoes_gabarito_com_qr(caderno, blocos, alunos, nome_professor)
+
+
+def _copia_simples(objeto, campos):
+    """Cópia dos campos usados na renderização (objetos do SQLAlchemy não são enviados aos processos)"""
+    if objeto is None:
+        return None
+    return SimpleNamespace(**{campo: getattr(objeto, campo, None) for campo in campos})
+
+
+def _renderizar_lote(alunos, caderno, nome_professor, blocos):
+    """Executada no processo filho: devolve os bytes do PDF de um lote de alunos"""
+    return gerar_pdf_cartoes_sequencial(alunos, caderno, nome_professor, blocos).getvalue()
+
+
+def _obter_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # 'spawn' evita herdar conexões do banco e threads do worker do gunicorn
+            _pool = ProcessPoolExecutor(max_workers=NUM_PROCESSOS, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _descartar_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def unir_pdfs(partes):
+    """Une PDFs (bytes) na ordem recebida; os streams são copiados sem recodificação"""
+    import fitz  # PyMuPDF
+    with fitz.open() as documento:
+        for parte in partes:
+            with fitz.open(stream=parte, filetype='pdf') as lote:
+                documento.insert_pdf(lote)
+        # garbage=3 junta objetos idênticos (ex.: o fundo do modelo repetido em cada lote)
+        return BytesIO(documento.tobytes(garbage=3, deflate=True))
+
+
+def _usar_pool(alunos):
+    return NUM_PROCESSOS > 1 and len(alunos) >= MINIMO_PARALELO and len(alunos) > TAMANHO_LOTE
+
+
+def _renderizar_em_lotes(alunos, caderno, nome_professor, blocos):
+    """PDFs (bytes) dos lotes de TAMANHO_LOTE alunos renderizados pelo pool, na ordem dos alunos"""
+    caderno_simples = _copia_simples(caderno, ('id', 'titulo', 'serie'))
+    blocos_simples = [_copia_simples(bloco, ('id', 'ordem', 'total_questoes')) for bloco in blocos]
+    alunos_simples = [dict(
+        aluno,
+        turma=_copia_simples(aluno['turma'], ('id', 'nome', 'turno')),
+        escola=_copia_simples(aluno['escola'], ('id', 'nome'))
+    ) for aluno in alunos]
+    lotes = [alunos_simples[i:i + TAMANHO_LOTE] for i in range(0, len(alunos_simples), TAMANHO_LOTE)]
+    argumentos = (
+        lotes,
+        [caderno_simples] * len(lotes),
+        [nome_professor] * len(lotes),
+        [blocos_simples] * len(lotes)
+    )
+
+    print(f"⚙️ Renderizando {len(alunos)} cartões em {len(lotes)} lote(s) com {NUM_PROCESSOS} processo(s)")
+    prontos = 0
+    try:
+        for parte in _obter_pool().map(_renderizar_lote, *argumentos):
+            yield parte
+            prontos += 1
+    except BrokenProcessPool as e:
+        # Um processo filho morreu (ex.: falta de memória): recriar o pool na próxima chamada e seguir sem ele
+        print(f"⚠️ Pool de processos dos cartões falhou ({e}), renderizando os lotes restantes no próprio processo")
+        _descartar_pool()
+        for lote in lotes[prontos:]:
+            yield _renderizar_lote(lote, caderno_simples, nome_professor, blocos_simples)
+
+
+def gerar_pdf_cartoes(alunos, caderno, nome_professor, blocos):
+    """
+    Gera o PDF dos cartões. Com muitos alunos, divide a lista em lotes de TAMANHO_LOTE renderizados
+    em paralelo e une os PDFs na ordem dos alunos; turmas pequenas são renderizadas no próprio processo.
+    """
+    if not _usar_pool(alunos):
+        return gerar_pdf_cartoes_sequencial(alunos, caderno, nome_professor, blocos)
+    return unir_pdfs(list(_renderizar_em_lotes(alunos, caderno, nome_professor, blocos)))
+
+
+def gravar_pdf_cartoes(alunos, caderno, nome_professor, blocos, caminho):
+    """
+    Grava o PDF dos cartões em `caminho`, como gerar_pdf_cartoes. Cada lote do pool vai para um arquivo
+    temporário assim que fica pronto, e os arquivos são unidos direto no arquivo final.
+    """
+    if not _usar_pool(alunos):
+        with open(caminho, 'wb') as arquivo:
+            arquivo.write(gerar_pdf_cartoes_sequencial(alunos, caderno, nome_professor, blocos).getbuffer())
+        return
+
+    import fitz  # PyMuPDF
+    with tempfile.TemporaryDirectory(prefix='cartoes_') as diretorio:
+        arquivos = []
+        for ordem, parte in enumerate(_renderizar_em_lotes(alunos, caderno, nome_professor, blocos)):
+            arquivos.append(os.path.join(diretorio, f'{ordem:05d}.pdf'))
+            with open(arquivos[-1], 'wb') as arquivo:
+                arquivo.write(parte)
+        with fitz.open() as documento:
+            for arquivo in arquivos:
+                with fitz.open(arquivo) as lote:
+                    documento.insert_pdf(lote)
+            documento.save(caminho, garbage=3, deflate=True)
+
+
+def comparar_desempenho(total_alunos=600):
+    """Mede a geração sequencial e a paralela com uma turma sintética (python cartoes_gabarito.py [total_alunos])"""
+    import time
+    turma = SimpleNamespace(id=1, nome='5º ANO - A', turno='Manhã')
+    escola = SimpleNamespace(id=1, nome='Escola Teste')
+    alunos = [{
+        'id': i, 'nome': f'Aluno {i}', 'turma': turma, 'escola': escola, 'turma_id': 1, 'escola_id': 1
+    } for i in range(1, total_alunos + 1)]
+    caderno = SimpleNamespace(id=1, titulo='Caderno Teste', serie=5)
+    blocos = [SimpleNamespace(id=1, ordem=1, total_questoes=22)]
+
+    tempos = {}
+    for nome, funcao in (('sequencial', gerar_pdf_cartoes_sequencial), ('paralelo', gerar_pdf_cartoes)):
+        matriz_qr.cache_clear()  # Medir as duas gerações com o cache de QR Codes vazio
+        inicio = time.perf_counter()
+        tamanho = len(funcao(alunos, caderno, 'Professor Teste', blocos).getvalue())
+        tempos[nome] = time.perf_counter() - inicio
+        print(f"⏱️ {nome}: {tempos[nome]:.2f}s ({tamanho} bytes)")
+    print(f"📊 {total_alunos} alunos, {NUM_PROCESSOS} processo(s), lotes de {TAMANHO_LOTE}: "
+          f"aceleração {tempos['sequencial'] / tempos['paralelo']:.2f}x")
+    _descartar_pool()
+
+
+if __name__ == '__main__':
+    import sys
+    comparar_desempenho(int(sys.argv[1]) if len(sys.argv) > 1 else 600)
@@ -0,0 +1,215 @@
+"""
+Processamento paralelo da correção automática (OMR).
+
+Cada página de cada PDF enviado vira uma tarefa independente, distribuída em um pool de processos
+para usar todos os núcleos da máquina. A ordem dos resultados é a mesma dos arquivos/páginas enviados.
+Os PDFs são lidos do disco e as páginas extraídas uma a uma, então um lote com a turma inteira
+(dezenas de páginas escaneadas) não fica todo na memória.
+O número de processos é configurado pela variável de ambiente OMR_PROCESSOS (1 = processamento sequencial).
+Cada processo do servidor web (e o worker da fila) abre o próprio pool, então o padrão divide os núcleos
+entre os processos do gunicorn (WEB_CONCURRENCY, 2 como no Procfile) para não disputar a CPU.
+"""
+import os
+import shutil
+import tempfile
+import threading
+import multiprocessing
+from io import BytesIO
+from collections import deque
+from contextlib import contextmanager
+from itertools import chain, islice
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from ambiente import inteiro_do_ambiente, processos_por_worker_web
+
+
+NUM_PROCESSOS = inteiro_do_ambiente('OMR_PROCESSOS', processos_por_worker_web())
+JANELA_PAGINAS = NUM_PROCESSOS * 2  # Páginas extraídas aguardando o pool (limita a memória por lote)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class ArquivoEmMemoria(BytesIO):
+    """Arquivo em memória com nome, compatível com o FileStorage recebido pelo Flask"""
+
+    def __init__(self, conteudo, filename):
+        super().__init__(conteudo)
+        self.filename = filename
+        self.name = filename
+
+
+def _processar_tarefa(filename, conteudo, num_quadrilateros, num_questoes, num_alternativas):
+    """Executada no processo filho: roda o EduCorreção sobre um PDF (uma página)"""
+    try:
+        from correcao_gabarito_integrado import processar_gabarito_pdf
+        return processar_gabarito_pdf(
+            ArquivoEmMemoria(conteudo, filename),
+            num_quadrilateros,
+            num_questoes,
+            num_alternativas
+        )
+    except Exception as e:
+        return {'success': False, 'error': str(e)}
+
+
+def _ler_fonte(fonte):
+    """Conteúdo de um PDF recebido como bytes ou como caminho de arquivo"""
+    if isinstance(fonte, (bytes, bytearray)):
+        return bytes(fonte)
+    with open(fonte, 'rb') as f:
+        return f.read()
+
+
+def iterar_paginas(fonte):
+    """
+    Gera (numero_pagina, total_paginas, pdf_da_pagina) um de cada vez, sem carregar o documento inteiro.
+    A fonte pode ser o caminho do PDF (preferível: o PyMuPDF lê as páginas do disco sob demanda) ou os bytes.
+    PDFs de uma página (ou ilegíveis) são devolvidos inteiros.
+    """
+    try:
+        import fitz  # PyMuPDF
+        if isinstance(fonte, (bytes, bytearray)):
+            documento = fitz.open(stream=fonte, filetype='pdf')
+        else:
+            documento = fitz.open(fonte, filetype='pdf')
+    except Exception as e:
+        print(f"⚠️ Não foi possível dividir o PDF em páginas: {e}")
+        yield 1, 1, _ler_fonte(fonte)
+        return
+
+    with documento:
+        total = documento.page_count
+        if total <= 1:
+            yield 1, 1, _ler_fonte(fonte)
+            return
+        for numero in range(total):
+            with fitz.open() as pagina:
+                pagina.insert_pdf(documento, from_page=numero, to_page=numero)
+                conteudo = pagina.tobytes(garbage=3, deflate=True)
+            yield numero + 1, total, conteudo
+
+
+def dividir_paginas(conteudo):
+    """Divide um PDF em PDFs de uma página cada; PDFs de uma página (ou ilegíveis) são devolvidos inteiros"""
+    return [pagina for _, _, pagina in iterar_paginas(conteudo)]
+
+
+@contextmanager
+def uploads_em_disco(files):
+    """
+    Grava os uploads (FileStorage) em arquivos temporários e devolve [(nome, caminho), ...].
+    Evita manter os PDFs inteiros na memória do worker web; os arquivos são apagados na saída.
+    """
+    diretorio = tempfile.mkdtemp(prefix='correcao_')
+    try:
+        arquivos = []
+        for ordem, file in enumerate(files, 1):
+            caminho = os.path.join(diretorio, f"{ordem:04d}.pdf")
+            file.save(caminho)
+            arquivos.append((file.filename, caminho))
+        yield arquivos
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+
+def _obter_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # 'spawn' evita herdar conexões do banco e threads do worker do gunicorn
+            _pool = ProcessPoolExecutor(max_workers=NUM_PROCESSOS, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _descartar_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _gerar_tarefas(arquivos):
+    """Gera (indice_arquivo, nome_exibicao, nome_arquivo, pdf_da_pagina) página a página"""
+    for indice, (filename, fonte) in enumerate(arquivos):
+        for numero, total, pagina in iterar_paginas(fonte):
+            nome = filename if total == 1 else f"{filename} (página {numero})"
+            yield indice, nome, filename, pagina
+
+
+def processar_paginas(arquivos, num_quadrilateros, num_questoes, num_alternativas):
+    """
+    Processa uma lista de (nome_arquivo, caminho_ou_conteudo_pdf) e gera (indice_arquivo, nome_exibicao, resultado)
+    para cada página, na ordem de envio. As páginas são extraídas sob demanda e no máximo JANELA_PAGINAS
+    ficam em memória aguardando o pool, qualquer que seja o tamanho do lote.
+    """
+    configuracao = (num_quadrilateros, num_questoes, num_alternativas)
+    tarefas = _gerar_tarefas(arquivos)
+
+    # Sem paralelismo (ou uma única página): processar no próprio processo
+    primeiras = list(islice(tarefas, 2))
+    if NUM_PROCESSOS <= 1 or len(primeiras) <= 1:
+        for indice, nome, filename, pagina in chain(primeiras, tarefas):
+            yield indice, nome, _processar_tarefa(filename, pagina, *configuracao)
+        return
+
+    print(f"⚙️ Distribuindo páginas em {NUM_PROCESSOS} processo(s)")
+    pool = _obter_pool()
+    pendentes = deque()  # (tarefa, futuro) na ordem de envio
+    atual = None  # Tarefa sendo enviada ao pool
+    tarefas = chain(primeiras, tarefas)
+    try:
+        for atual in tarefas:
+            pendentes.append((atual, pool.submit(_processar_tarefa, *atual[2:], *configuracao)))
+            atual = None
+            while len(pendentes) >= JANELA_PAGINAS:
+                (indice, nome, _, _), futuro = pendentes[0]
+                resultado = futuro.result()
+                pendentes.popleft()
+                yield indice, nome, resultado
+        while pendentes:
+            (indice, nome, _, _), futuro = pendentes[0]
+            resultado = futuro.result()
+            pendentes.popleft()
+            yield indice, nome, resultado
+    except BrokenProcessPool as e:
+        # Um processo filho morreu (ex.: falta de memória): recriar o pool na próxima chamada e seguir sem ele
+        print(f"⚠️ Pool de processos da correção falhou ({e}), processando sequencialmente")
+        _descartar_pool()
+        restantes = [tarefa for tarefa, _ in pendentes] + ([atual] if atual else [])
+        for indice, nome, filename, pagina in chain(restantes, tarefas):
+            yield indice, nome, _processar_tarefa(filename, pagina, *configuracao)
+
+
+def processar_por_arquivo(arquivos, num_quadrilateros, num_questoes, num_alternativas):
+    """Como processar_paginas, mas agrupa: para cada arquivo, a lista [(nome_exibicao, resultado), ...]"""
+    por_arquivo = [[] for _ in arquivos]
+    for indice, nome, resultado in processar_paginas(arquivos, num_quadrilateros, num_questoes, num_alternativas):
+        por_arquivo[indice].append((nome, resultado))
+    return por_arquivo
+
+
+def processar_arquivos(arquivos, num_quadrilateros, num_questoes, num_alternativas):
+    """Como processar_paginas, mas gera apenas (nome_exibicao, resultado), na ordem de envio"""
+    for _, nome, resultado in processar_paginas(arquivos, num_quadrilateros, num_questoes, num_alternativas):
+        yield nome, resultado
+
+
+def formatar_resultado(nome_arquivo, resultado):
+    """Converte o retorno do EduCorreção no item de resultado devolvido pela API"""
+    if resultado.get('success'):
+        return {
+            'arquivo': nome_arquivo,
+            'sucesso': True,
+            'lote': resultado.get('lote'),
+            'registration': resultado.get('registration'),
+            'answers': resultado.get('answers'),
+            'info': resultado.get('info', '')
+        }
+    return {
+        'arquivo': nome_arquivo,
+        'sucesso': False,
+        'erro': resultado.get('error', 'Erro desconhecido')
+    }
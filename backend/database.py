@@ -1,6 +1,8 @@
 import os
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
 
 db = SQLAlchemy()
 DB_PATH = os.path.join(os.path.dirname(__file__), 'eduplataforma.db')
@@ -26,6 +28,10 @@ class User(db.Model):
         return self.tipo_usuario == 'admin'
 
 class Habilidade(db.Model):
+    __table_args__ = (
+        db.Index('ix_habilidade_componente_ano', 'componente', 'ano'),
+        db.Index('ix_habilidade_codigo_id', 'codigo', 'id'),  # Ordem da listagem paginada
+    )
     id = db.Column(db.Integer, primary_key=True)
     codigo = db.Column(db.String(20), nullable=False)
     componente = db.Column(db.String(50), nullable=False)
@@ -47,8 +53,8 @@ class Turma(db.Model):
     nome = db.Column(db.String(50), nullable=False)
     ano = db.Column(db.Integer, nullable=False)
     turno = db.Column(db.String(20), nullable=False)
-    escola_id = db.Column(db.Integer, db.ForeignKey('escola.id'), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    escola_id = db.Column(db.Integer, db.ForeignKey('escola.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     
     # Relacionamento com alunos
     alunos = db.relationship('Aluno', backref='turma', lazy=True)
@@ -57,9 +63,9 @@ class Aluno(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(100), nullable=False)
     sexo = db.Column(db.String(10), nullable=False)
-    turma_id = db.Column(db.Integer, db.ForeignKey('turma.id'), nullable=False)
-    escola_id = db.Column(db.Integer, db.ForeignKey('escola.id'), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    turma_id = db.Column(db.Integer, db.ForeignKey('turma.id'), nullable=False, index=True)
+    escola_id = db.Column(db.Integer, db.ForeignKey('escola.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
 
     @property
     def matricula(self):
@@ -109,9 +115,15 @@ class PlanoAula(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
 class Questao(db.Model):
+    __table_args__ = (
+        db.Index('ix_questao_user_habilidade', 'user_id', 'habilidade_id'),
+        db.Index('ix_questao_user_paginacao', 'user_id', 'id'),  # Listagem paginada do banco de questões
+        db.Index('ix_questao_escola_ano', 'escola_id', 'ano'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     enunciado = db.Column(db.Text, nullable=False)
-    imagem = db.Column(db.Text)  # Base64 da imagem ou URL
+    imagem = db.Column(db.Text)  # URL externa da imagem (base64 só em questões ainda não migradas)
+    imagem_hash = db.Column(db.String(64), nullable=True, index=True)  # Chave da imagem guardada (armazenamento_imagens.py)
     habilidade_id = db.Column(db.Integer, db.ForeignKey('habilidade.id'), nullable=False)
     ano = db.Column(db.Integer, nullable=False)  # Ano escolar (1, 2, 3, 4, 5, 6, 7, 8, 9)
     escola_id = db.Column(db.Integer, db.ForeignKey('escola.id'), nullable=True)  # Opcional - questões compartilhadas nacionalmente
@@ -135,10 +147,13 @@ class Questao(db.Model):
 class Alternativa(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     texto = db.Column(db.Text, nullable=False)
-    questao_id = db.Column(db.Integer, db.ForeignKey('questao.id'), nullable=False)
+    questao_id = db.Column(db.Integer, db.ForeignKey('questao.id'), nullable=False, index=True)
     correta = db.Column(db.Boolean, default=False)
 
 class Caderno(db.Model):
+    __table_args__ = (
+        db.Index('ix_caderno_user_paginacao', 'user_id', 'id'),  # Listagem paginada dos cadernos
+    )
     id = db.Column(db.Integer, primary_key=True)
     titulo = db.Column(db.String(200), nullable=False)
     serie = db.Column(db.Integer, nullable=False)
@@ -188,6 +203,9 @@ class Caderno(db.Model):
         }
 
 class BlocoCaderno(db.Model):
+    __table_args__ = (
+        db.Index('ix_bloco_caderno_caderno_ordem', 'caderno_id', 'ordem'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     caderno_id = db.Column(db.Integer, db.ForeignKey('caderno.id'), nullable=False)
     ordem = db.Column(db.Integer, nullable=False)
@@ -196,14 +214,23 @@ class BlocoCaderno(db.Model):
     questoes = db.relationship('BlocoQuestao', backref='bloco', lazy=True, cascade='all, delete-orphan')
 
 class BlocoQuestao(db.Model):
+    __table_args__ = (
+        db.Index('ix_bloco_questao_bloco_ordem', 'bloco_id', 'ordem'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     bloco_id = db.Column(db.Integer, db.ForeignKey('bloco_caderno.id'), nullable=False)
-    questao_id = db.Column(db.Integer, db.ForeignKey('questao.id'), nullable=False)
+    questao_id = db.Column(db.Integer, db.ForeignKey('questao.id'), nullable=False, index=True)
     ordem = db.Column(db.Integer, nullable=False)  # Ordem da questão no bloco
     questao = db.relationship('Questao', backref='blocos')
 
 class ResultadoAluno(db.Model):
     """Tabela para armazenar os resultados dos alunos nas provas"""
+    __table_args__ = (
+        # Resultados de um caderno em um período (listagens, análise de itens, exclusão do caderno)
+        db.Index('ix_resultado_aluno_caderno_periodo', 'caderno_id', 'ano_avaliacao', 'periodo_avaliacao'),
+        # Todos os resultados do usuário em um período (exportação, snapshot)
+        db.Index('ix_resultado_aluno_user_periodo', 'user_id', 'ano_avaliacao', 'periodo_avaliacao'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     aluno_id = db.Column(db.Integer, db.ForeignKey('aluno.id'), nullable=False)
     caderno_id = db.Column(db.Integer, db.ForeignKey('caderno.id'), nullable=False)
@@ -216,20 +243,41 @@ class ResultadoAluno(db.Model):
     # Campos para filtro temporal
     ano_avaliacao = db.Column(db.Integer, nullable=True)  # Ano da avaliação (2024, 2025, etc.)
     periodo_avaliacao = db.Column(db.String(50), nullable=True)  # Período (1, 2, 3, 4, diagnostica, recuperacao, final)
-    
+    # Respostas compactas (ver respostas_compactas.py); NULL nos resultados ainda gravados só em RespostaAluno
+    respostas_compactas = db.Column(db.Text, nullable=True)  # Um caractere por questão, na ordem bloco/questão
+    acertos_compactos = db.Column(db.LargeBinary, nullable=True)  # Bitmap de acertos na mesma ordem
+    layout_respostas = db.Column(db.Text, nullable=True)  # Questão e letra de cada posição na correção: "bloco_id=57A.58B,..."
+
     # Relacionamentos
     aluno = db.relationship('Aluno', backref='resultados')
-    # Relacionamento com respostas individuais
+    # Relacionamento com respostas individuais (resultados anteriores às respostas compactas)
     respostas = db.relationship('RespostaAluno', backref='resultado_ref', lazy=True, cascade='all, delete-orphan')
+    # Totais por componente (mantidos a cada gravação de respostas)
+    componentes = db.relationship('ResultadoComponente', backref='resultado', lazy=True, cascade='all, delete-orphan')
+    habilidades = db.relationship('ResultadoHabilidade', backref='resultado', lazy=True, cascade='all, delete-orphan')
+
+# Chave natural: um resultado por aluno, caderno, ano e período (alvo do upsert dos lançamentos; também atende
+# alunos.in_(...) nos agregados). Ano e período entram com COALESCE: sem isso resultados sem ano/período (NULL,
+# como os dos lançamentos por scan) nunca conflitariam, porque NULLs são distintos em índices únicos
+CHAVE_RESULTADO_ALUNO = (
+    ResultadoAluno.aluno_id,
+    ResultadoAluno.caderno_id,
+    db.func.coalesce(ResultadoAluno.ano_avaliacao, db.literal_column('0')),
+    db.func.coalesce(ResultadoAluno.periodo_avaliacao, db.literal_column("''")),
+)
+db.Index('uq_resultado_aluno_chave_periodo', *CHAVE_RESULTADO_ALUNO, unique=True)
 
 class RespostaAluno(db.Model):
-    """Tabela para armazenar as respostas individuais dos alunos"""
+    """Respostas individuais dos alunos (formato anterior; os lançamentos novos gravam as respostas compactas em ResultadoAluno)"""
+    __table_args__ = (
+        db.Index('ix_resposta_aluno_resultado_bloco_questao', 'resultado_id', 'bloco_id', 'questao_ordem'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     resultado_id = db.Column(db.Integer, db.ForeignKey('resultado_aluno.id'), nullable=False)
     bloco_id = db.Column(db.Integer, db.ForeignKey('bloco_caderno.id'), nullable=False)
     questao_ordem = db.Column(db.Integer, nullable=False)  # Ordem da questão no bloco (1, 2, 3...)
     resposta_marcada = db.Column(db.String(1), nullable=True)  # A, B, C, D, X (múltipla), '' (em branco)
-    questao_id = db.Column(db.Integer, db.ForeignKey('questao.id'), nullable=True)  # Referência à questão real
+    questao_id = db.Column(db.Integer, db.ForeignKey('questao.id'), nullable=True, index=True)  # Referência à questão real
     resposta_correta = db.Column(db.String(1), nullable=True)  # A alternativa correta
     acertou = db.Column(db.Boolean, default=False)
     
@@ -237,6 +285,269 @@ class RespostaAluno(db.Model):
     bloco = db.relationship('BlocoCaderno')
     questao = db.relationship('Questao')
 
+class ResultadoComponente(db.Model):
+    """Acertos de um resultado por componente curricular (pré-calculados a partir das respostas do resultado)"""
+    __tablename__ = 'resultado_componente'
+    __table_args__ = (
+        db.UniqueConstraint('resultado_id', 'componente', name='uq_resultado_componente'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    resultado_id = db.Column(db.Integer, db.ForeignKey('resultado_aluno.id', ondelete='CASCADE'), nullable=False, index=True)
+    componente = db.Column(db.String(50), nullable=False)
+    total_questoes = db.Column(db.Integer, default=0)  # Questões respondidas do componente
+    acertos = db.Column(db.Integer, default=0)
+    percentual = db.Column(db.Float, default=0.0)
+
+class ResultadoHabilidade(db.Model):
+    """Tentativas e acertos de um resultado por habilidade (pré-calculados a partir das respostas do resultado)"""
+    __tablename__ = 'resultado_habilidade'
+    __table_args__ = (
+        db.UniqueConstraint('resultado_id', 'habilidade_id', name='uq_resultado_habilidade'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    resultado_id = db.Column(db.Integer, db.ForeignKey('resultado_aluno.id', ondelete='CASCADE'), nullable=False, index=True)
+    habilidade_id = db.Column(db.Integer, db.ForeignKey('habilidade.id'), nullable=False, index=True)
+    tentativas = db.Column(db.Integer, default=0)
+    acertos = db.Column(db.Integer, default=0)
+
+class DominioHabilidadeTurma(db.Model):
+    """Consolidado de tentativas e acertos por habilidade, turma, ano e período (base dos relatórios de domínio)"""
+    __tablename__ = 'dominio_habilidade_turma'
+    __table_args__ = (
+        db.Index('ix_dominio_habilidade_turma_periodo', 'turma_id', 'ano_avaliacao', 'periodo_avaliacao'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    turma_id = db.Column(db.Integer, db.ForeignKey('turma.id', ondelete='CASCADE'), nullable=False)
+    habilidade_id = db.Column(db.Integer, db.ForeignKey('habilidade.id'), nullable=False, index=True)
+    ano_avaliacao = db.Column(db.Integer, nullable=True)
+    periodo_avaliacao = db.Column(db.String(50), nullable=True)
+    tentativas = db.Column(db.Integer, default=0)
+    acertos = db.Column(db.Integer, default=0)
+
+    @classmethod
+    def somar(cls, linhas):
+        """
+        Soma tentativas/acertos (diferenças, podem ser negativas) às linhas de cada chave, na transação corrente.
+        Uma única instrução de upsert na chave única: duas primeiras gravações simultâneas da mesma chave
+        não criam linhas duplicadas; em outros bancos, a inserção que perder a corrida vira UPDATE.
+        linhas: dicts com turma_id, habilidade_id, ano_avaliacao, periodo_avaliacao, tentativas e acertos.
+        """
+        if not linhas:
+            return
+        dialeto = db.session.get_bind().dialect.name
+        if dialeto in ('postgresql', 'sqlite'):
+            insert = postgresql.insert if dialeto == 'postgresql' else sqlite.insert
+            stmt = insert(cls).values(linhas)
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=list(CHAVE_DOMINIO_TURMA),
+                set_={
+                    'tentativas': cls.tentativas + stmt.excluded.tentativas,
+                    'acertos': cls.acertos + stmt.excluded.acertos
+                }
+            ))
+        elif dialeto in ('mysql', 'mariadb'):
+            stmt = mysql.insert(cls).values(linhas)
+            db.session.execute(stmt.on_duplicate_key_update(
+                tentativas=cls.tentativas + stmt.inserted.tentativas,
+                acertos=cls.acertos + stmt.inserted.acertos
+            ))
+        else:
+            for linha in linhas:
+                if not cls._somar_linha(linha):
+                    try:
+                        with db.session.begin_nested():
+                            db.session.add(cls(**linha))
+                    except IntegrityError:
+                        cls._somar_linha(linha)
+
+    @classmethod
+    def _somar_linha(cls, linha):
+        filtros = [cls.turma_id == linha['turma_id'], cls.habilidade_id == linha['habilidade_id']] + [
+            getattr(cls, coluna).is_(None) if linha[coluna] is None else getattr(cls, coluna) == linha[coluna]
+            for coluna in ('ano_avaliacao', 'periodo_avaliacao')
+        ]
+        return cls.query.filter(*filtros).update({
+            cls.tentativas: cls.tentativas + linha['tentativas'],
+            cls.acertos: cls.acertos + linha['acertos']
+        }, synchronize_session=False)
+
+# Uma linha por turma, habilidade, ano e período (ano/período nulos com COALESCE, como em CHAVE_RESULTADO_ALUNO)
+CHAVE_DOMINIO_TURMA = (
+    DominioHabilidadeTurma.turma_id,
+    DominioHabilidadeTurma.habilidade_id,
+    db.func.coalesce(DominioHabilidadeTurma.ano_avaliacao, db.literal_column('0')),
+    db.func.coalesce(DominioHabilidadeTurma.periodo_avaliacao, db.literal_column("''")),
+)
+db.Index('uq_dominio_habilidade_turma_chave', *CHAVE_DOMINIO_TURMA, unique=True)
+
+class DesempenhoAlunoPeriodo(db.Model):
+    """Acertos do aluno por série do caderno, componente, ano e período (base da comparação entre períodos)"""
+    __tablename__ = 'desempenho_aluno_periodo'
+    __table_args__ = (
+        db.UniqueConstraint('aluno_id', 'serie', 'componente', 'ano_avaliacao', 'periodo_avaliacao',
+                            name='uq_desempenho_aluno_periodo'),
+        db.Index('ix_desempenho_aluno_periodo_ano', 'ano_avaliacao', 'periodo_avaliacao'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    aluno_id = db.Column(db.Integer, db.ForeignKey('aluno.id', ondelete='CASCADE'), nullable=False)
+    serie = db.Column(db.Integer, nullable=False)  # Série do caderno
+    componente = db.Column(db.String(50), nullable=False)
+    ano_avaliacao = db.Column(db.Integer, nullable=True)
+    periodo_avaliacao = db.Column(db.String(50), nullable=True)
+    resultados = db.Column(db.Integer, default=0)  # Cadernos somados na linha
+    total_questoes = db.Column(db.Integer, default=0)
+    acertos = db.Column(db.Integer, default=0)
+
+class GrupoRanking(db.Model):
+    """Grupo de rankings (usuário, ano, período e série): versao muda a cada gravação, versao_calculada no recálculo"""
+    __tablename__ = 'grupo_ranking'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'ano_avaliacao', 'periodo_avaliacao', 'serie', name='uq_grupo_ranking'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    ano_avaliacao = db.Column(db.Integer, nullable=False)
+    periodo_avaliacao = db.Column(db.String(50), nullable=False)
+    serie = db.Column(db.Integer, nullable=False)
+    versao = db.Column(db.Integer, nullable=False, default=0)
+    versao_calculada = db.Column(db.Integer, nullable=False, default=0)
+    calculado_em = db.Column(db.DateTime, nullable=True)
+    posicoes = db.relationship('PosicaoRanking', backref='grupo', lazy=True, cascade='all, delete-orphan')
+
+    @classmethod
+    def incrementar(cls, user_id, ano, periodo, serie):
+        """
+        Incrementa a versão do grupo na transação corrente (cria o grupo na primeira gravação).
+        Upsert na chave única uq_grupo_ranking, como VersaoDados.incrementar: a primeira gravação
+        simultânea de dois lançamentos não falha com IntegrityError.
+        """
+        chave = dict(user_id=user_id, ano_avaliacao=ano, periodo_avaliacao=periodo, serie=serie)
+        dialeto = db.session.get_bind().dialect.name
+        if dialeto in ('postgresql', 'sqlite'):
+            insert = postgresql.insert if dialeto == 'postgresql' else sqlite.insert
+            stmt = insert(cls).values(**chave, versao=1, versao_calculada=0)
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=list(chave), set_={'versao': cls.versao + 1}
+            ))
+        elif dialeto in ('mysql', 'mariadb'):
+            stmt = mysql.insert(cls).values(**chave, versao=1, versao_calculada=0)
+            db.session.execute(stmt.on_duplicate_key_update(versao=cls.versao + 1))
+        else:
+            if not cls._somar_versao(chave):
+                try:
+                    with db.session.begin_nested():
+                        db.session.add(cls(**chave, versao=1, versao_calculada=0))
+                except IntegrityError:
+                    cls._somar_versao(chave)
+
+    @classmethod
+    def _somar_versao(cls, chave):
+        return cls.query.filter_by(**chave).update({cls.versao: cls.versao + 1}, synchronize_session=False)
+
+class PosicaoRanking(db.Model):
+    """Posição pré-calculada de uma escola, turma ou aluno no ranking de um grupo e componente ('Geral' = todos)"""
+    __tablename__ = 'posicao_ranking'
+    __table_args__ = (
+        db.UniqueConstraint('grupo_id', 'escopo', 'componente', 'referencia_id', name='uq_posicao_ranking'),
+        db.Index('ix_posicao_ranking_ordem', 'grupo_id', 'escopo', 'componente', 'posicao'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    grupo_id = db.Column(db.Integer, db.ForeignKey('grupo_ranking.id', ondelete='CASCADE'), nullable=False)
+    escopo = db.Column(db.String(10), nullable=False)  # 'escola', 'turma' ou 'aluno'
+    componente = db.Column(db.String(50), nullable=False)
+    referencia_id = db.Column(db.Integer, nullable=False)  # ID da escola, turma ou aluno
+    posicao = db.Column(db.Integer, nullable=False)  # Empates recebem a mesma posição (1, 2, 2, 4...)
+    participantes = db.Column(db.Integer, nullable=False)  # Total de posições no ranking
+    alunos = db.Column(db.Integer, default=0)
+    total_questoes = db.Column(db.Integer, default=0)
+    acertos = db.Column(db.Integer, default=0)
+    percentual = db.Column(db.Float, default=0.0)
+
+class VersaoDados(db.Model):
+    """Contador de versão por escopo (ex.: gabarito de um caderno), usado para invalidar caches entre workers"""
+    __tablename__ = 'versao_dados'
+    __table_args__ = (
+        db.UniqueConstraint('escopo', 'referencia_id', name='uq_versao_dados_escopo_referencia'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    escopo = db.Column(db.String(30), nullable=False)  # 'gabarito', ...
+    referencia_id = db.Column(db.Integer, nullable=False)  # ID do registro versionado (caderno, turma...)
+    versao = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def atual(cls, escopo, referencia_id):
+        """Retorna a versão atual do escopo (0 se nunca foi alterado)"""
+        versao = db.session.query(cls.versao).filter_by(escopo=escopo, referencia_id=referencia_id).scalar()
+        return versao or 0
+
+    @classmethod
+    def incrementar(cls, escopo, referencia_id):
+        """
+        Incrementa a versão na transação corrente (efetivada junto com o commit da alteração).
+        Uma única instrução de upsert na chave única (escopo, referencia_id): dois primeiros incrementos
+        simultâneos não criam linhas duplicadas nem falham; em outros bancos, a inserção que perder a
+        corrida (IntegrityError) vira UPDATE.
+        """
+        dialeto = db.session.get_bind().dialect.name
+        if dialeto in ('postgresql', 'sqlite'):
+            insert = postgresql.insert if dialeto == 'postgresql' else sqlite.insert
+            stmt = insert(cls).values(escopo=escopo, referencia_id=referencia_id, versao=1)
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=['escopo', 'referencia_id'], set_={'versao': cls.versao + 1}
+            ))
+        elif dialeto in ('mysql', 'mariadb'):
+            stmt = mysql.insert(cls).values(escopo=escopo, referencia_id=referencia_id, versao=1)
+            db.session.execute(stmt.on_duplicate_key_update(versao=cls.versao + 1))
+        else:
+            atualizados = cls._somar_versao(escopo, referencia_id)
+            if not atualizados:
+                try:
+                    with db.session.begin_nested():
+                        db.session.add(cls(escopo=escopo, referencia_id=referencia_id, versao=1))
+                except IntegrityError:
+                    cls._somar_versao(escopo, referencia_id)
+
+    @classmethod
+    def _somar_versao(cls, escopo, referencia_id):
+        return cls.query.filter_by(escopo=escopo, referencia_id=referencia_id).update(
+            {cls.versao: cls.versao + 1}, synchronize_session=False
+        )
+
+    @classmethod
+    def remover(cls, escopo, referencia_id):
+        """Apaga a versão de um registro excluído (na transação corrente)"""
+        cls.query.filter_by(escopo=escopo, referencia_id=referencia_id).delete(synchronize_session=False)
+
+class TarefaCorrecao(db.Model):
+    """Fila local de correção automática: um lote de PDFs processado em segundo plano pelo worker_correcao.py"""
+    __tablename__ = 'tarefa_correcao'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='pendente')  # pendente, processando, concluida, cancelada, erro
+    num_quadrilateros = db.Column(db.Integer, nullable=False, default=4)
+    num_questoes = db.Column(db.Integer, nullable=False, default=11)
+    num_alternativas = db.Column(db.Integer, nullable=False, default=4)
+    cancelamento_solicitado = db.Column(db.Boolean, default=False)
+    criado_em = db.Column(db.DateTime, server_default=db.func.now())
+    iniciado_em = db.Column(db.DateTime, nullable=True)
+    finalizado_em = db.Column(db.DateTime, nullable=True)
+
+    arquivos = db.relationship('ArquivoTarefaCorrecao', backref='tarefa', lazy=True, cascade='all, delete-orphan',
+                               order_by='ArquivoTarefaCorrecao.ordem')
+
+class ArquivoTarefaCorrecao(db.Model):
+    """Arquivo (PDF) de uma tarefa de correção, com o resultado de cada página em JSON"""
+    __tablename__ = 'arquivo_tarefa_correcao'
+    id = db.Column(db.Integer, primary_key=True)
+    tarefa_id = db.Column(db.Integer, db.ForeignKey('tarefa_correcao.id'), nullable=False, index=True)
+    ordem = db.Column(db.Integer, nullable=False)
+    nome = db.Column(db.String(255), nullable=False)
+    caminho = db.Column(db.String(500), nullable=False)  # PDF salvo no diretório da fila
+    status = db.Column(db.String(20), nullable=False, default='pendente')  # pendente, processando, sucesso, erro, cancelado
+    tentativas = db.Column(db.Integer, default=0)
+    resultado = db.Column(db.Text)  # Lista JSON no formato de /api/correcao-automatica/processar
+    erro = db.Column(db.Text)
+
 
 
 def init_db():
@@ -0,0 +1,185 @@
+"""
+Comparação de desempenho entre períodos (diagnóstica, bimestres, final...).
+
+DesempenhoAlunoPeriodo guarda, por aluno, série do caderno, componente, ano e período, a soma dos
+acertos de ResultadoComponente dos resultados em que o aluno fez a prova. As linhas dos alunos
+afetados são refeitas a cada gravação (junto com os demais agregados dos resultados), então a
+comparação lê uma linha por aluno/período/componente em vez de percorrer as respostas.
+"""
+from database import db, Aluno, Turma, Caderno, ResultadoAluno, ResultadoComponente, DesempenhoAlunoPeriodo
+
+
+def alunos_dos_resultados(resultado_ids):
+    return {aluno_id for (aluno_id,) in db.session.query(ResultadoAluno.aluno_id).filter(
+        ResultadoAluno.id.in_(list(resultado_ids))
+    ).distinct()}
+
+
+def _grupos_dos_alunos(aluno_ids):
+    """(user_id, ano, período, série) presentes nas linhas de desempenho dos alunos"""
+    return {tuple(linha) for linha in db.session.query(
+        Aluno.user_id,
+        DesempenhoAlunoPeriodo.ano_avaliacao,
+        DesempenhoAlunoPeriodo.periodo_avaliacao,
+        DesempenhoAlunoPeriodo.serie
+    ).join(
+        Aluno, DesempenhoAlunoPeriodo.aluno_id == Aluno.id
+    ).filter(DesempenhoAlunoPeriodo.aluno_id.in_(aluno_ids)).distinct()}
+
+
+def atualizar_desempenho_alunos(aluno_ids):
+    """
+    Refaz as linhas de DesempenhoAlunoPeriodo dos alunos (a partir de ResultadoComponente).
+    Retorna os grupos (user_id, ano, período, série) afetados, antes e depois da atualização.
+    """
+    aluno_ids = sorted(set(aluno_ids))
+    if not aluno_ids:
+        return set()
+
+    db.session.flush()
+    linhas = db.session.query(
+        ResultadoAluno.aluno_id,
+        Caderno.serie,
+        ResultadoComponente.componente,
+        ResultadoAluno.ano_avaliacao,
+        ResultadoAluno.periodo_avaliacao,
+        db.func.count(db.distinct(ResultadoAluno.id)),
+        db.func.sum(ResultadoComponente.total_questoes),
+        db.func.sum(ResultadoComponente.acertos)
+    ).join(
+        ResultadoComponente, ResultadoComponente.resultado_id == ResultadoAluno.id
+    ).join(
+        Caderno, ResultadoAluno.caderno_id == Caderno.id
+    ).filter(
+        ResultadoAluno.aluno_id.in_(aluno_ids),
+        ResultadoAluno.fez_prova == True
+    ).group_by(
+        ResultadoAluno.aluno_id, Caderno.serie, ResultadoComponente.componente,
+        ResultadoAluno.ano_avaliacao, ResultadoAluno.periodo_avaliacao
+    ).all()
+
+    grupos = _grupos_dos_alunos(aluno_ids)
+    DesempenhoAlunoPeriodo.query.filter(
+        DesempenhoAlunoPeriodo.aluno_id.in_(aluno_ids)
+    ).delete(synchronize_session=False)
+    novas = [{
+        'aluno_id': aluno_id,
+        'serie': serie,
+        'componente': componente,
+        'ano_avaliacao': ano,
+        'periodo_avaliacao': periodo,
+        'resultados': int(resultados),
+        'total_questoes': int(total or 0),
+        'acertos': int(acertos or 0)
+    } for aluno_id, serie, componente, ano, periodo, resultados, total, acertos in linhas]
+    if novas:
+        db.session.execute(db.insert(DesempenhoAlunoPeriodo), novas)
+        grupos |= _grupos_dos_alunos(aluno_ids)
+    return grupos
+
+
+def _percentual(acertos, total):
+    return round(acertos / total * 100, 1) if total else None
+
+
+def _variacoes(periodos, percentuais):
+    """Diferença (pontos percentuais) entre períodos consecutivos e entre o primeiro e o último com dados"""
+    variacoes = []
+    for anterior, atual in zip(periodos, periodos[1:]):
+        if percentuais.get(anterior) is not None and percentuais.get(atual) is not None:
+            delta = round(percentuais[atual] - percentuais[anterior], 1)
+        else:
+            delta = None
+        variacoes.append({'de': anterior, 'para': atual, 'delta': delta})
+
+    com_dados = [percentuais[p] for p in periodos if percentuais.get(p) is not None]
+    total = round(com_dados[-1] - com_dados[0], 1) if len(com_dados) >= 2 else None
+    return variacoes, total
+
+
+def _consulta_desempenho(colunas, user_id, ano, periodos, componente, serie, turma_id, escola_id):
+    query = db.session.query(*colunas).select_from(DesempenhoAlunoPeriodo).join(
+        Aluno, DesempenhoAlunoPeriodo.aluno_id == Aluno.id
+    ).join(
+        Turma, Aluno.turma_id == Turma.id
+    ).filter(
+        Aluno.user_id == user_id,
+        DesempenhoAlunoPeriodo.ano_avaliacao == ano,
+        DesempenhoAlunoPeriodo.periodo_avaliacao.in_(periodos)
+    )
+    if componente and componente != 'Ambos':
+        query = query.filter(DesempenhoAlunoPeriodo.componente == componente)
+    if serie:
+        query = query.filter(DesempenhoAlunoPeriodo.serie == serie)
+    if turma_id:
+        query = query.filter(Aluno.turma_id == turma_id)
+    if escola_id:
+        query = query.filter(Turma.escola_id == escola_id)
+    return query
+
+
+def comparar_periodos(user_id, ano, periodos, componente=None, serie=None, turma_id=None, escola_id=None,
+                      incluir_alunos=True):
+    """Desempenho por aluno e por turma em cada período pedido (na ordem informada), com as variações"""
+    filtros = (user_id, ano, periodos, componente, serie, turma_id, escola_id)
+    total = db.func.sum(DesempenhoAlunoPeriodo.total_questoes)
+    acertos = db.func.sum(DesempenhoAlunoPeriodo.acertos)
+
+    alunos = {}
+    turmas = {}
+    if incluir_alunos:
+        linhas = _consulta_desempenho(
+            [Aluno.id, Aluno.nome, Turma.id, Turma.nome, DesempenhoAlunoPeriodo.periodo_avaliacao, total, acertos],
+            *filtros
+        ).group_by(
+            Aluno.id, Aluno.nome, Turma.id, Turma.nome, DesempenhoAlunoPeriodo.periodo_avaliacao
+        ).order_by(Turma.nome, Aluno.nome, Aluno.id).all()
+
+        for aluno_id, aluno_nome, turma_id_linha, turma_nome, periodo, total_aluno, acertos_aluno in linhas:
+            total_aluno, acertos_aluno = int(total_aluno or 0), int(acertos_aluno or 0)
+            aluno = alunos.setdefault(aluno_id, {
+                'aluno_id': aluno_id, 'nome': aluno_nome, 'turma_id': turma_id_linha, 'turma_nome': turma_nome,
+                'periodos': {}
+            })
+            aluno['periodos'][periodo] = {
+                'acertos': acertos_aluno, 'total_questoes': total_aluno,
+                'percentual': _percentual(acertos_aluno, total_aluno)
+            }
+
+            turma = turmas.setdefault(turma_id_linha, {'turma_id': turma_id_linha, 'turma_nome': turma_nome, 'periodos': {}})
+            soma = turma['periodos'].setdefault(periodo, {'alunos': 0, 'acertos': 0, 'total_questoes': 0})
+            soma['alunos'] += 1
+            soma['acertos'] += acertos_aluno
+            soma['total_questoes'] += total_aluno
+    else:
+        # Só as turmas: somar direto no banco
+        linhas = _consulta_desempenho(
+            [Turma.id, Turma.nome, DesempenhoAlunoPeriodo.periodo_avaliacao,
+             db.func.count(db.distinct(Aluno.id)), total, acertos],
+            *filtros
+        ).group_by(
+            Turma.id, Turma.nome, DesempenhoAlunoPeriodo.periodo_avaliacao
+        ).order_by(Turma.nome, Turma.id).all()
+
+        for turma_id_linha, turma_nome, periodo, quantidade, total_turma, acertos_turma in linhas:
+            turma = turmas.setdefault(turma_id_linha, {'turma_id': turma_id_linha, 'turma_nome': turma_nome, 'periodos': {}})
+            turma['periodos'][periodo] = {
+                'alunos': int(quantidade), 'acertos': int(acertos_turma or 0), 'total_questoes': int(total_turma or 0)
+            }
+
+    for turma in turmas.values():
+        for soma in turma['periodos'].values():
+            soma['percentual'] = _percentual(soma['acertos'], soma['total_questoes'])
+        turma['variacoes'], turma['variacao_total'] = _variacoes(
+            periodos, {p: dados['percentual'] for p, dados in turma['periodos'].items()}
+        )
+    for aluno in alunos.values():
+        aluno['variacoes'], aluno['variacao_total'] = _variacoes(
+            periodos, {p: dados['percentual'] for p, dados in aluno['periodos'].items()}
+        )
+
+    return {
+        'periodos': periodos,
+        'turmas': list(turmas.values()),
+        'alunos': list(alunos.values())
+    }
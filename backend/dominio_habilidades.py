@@ -0,0 +1,230 @@
+"""
+Domínio de habilidades (BNCC) a partir dos resultados.
+
+Duas tabelas são mantidas a cada gravação de respostas:
+- ResultadoHabilidade: tentativas/acertos de cada resultado por habilidade (respostas do resultado + Questao.habilidade_id);
+- DominioHabilidadeTurma: soma por turma, habilidade, ano e período; a cada gravação recebe só a diferença
+  entre as linhas antigas e as novas de ResultadoHabilidade dos resultados alterados (recalcular_dominio_turmas
+  refaz turmas inteiras, na reconstrução dos agregados).
+Só os resultados de quem fez a prova têm linhas em ResultadoHabilidade.
+Os relatórios por turma, escola, rede e zona somam poucas linhas do consolidado por turma;
+o relatório por aluno lê as linhas de ResultadoHabilidade dos seus resultados.
+"""
+from database import (
+    db, Aluno, Turma, Escola, Habilidade, Questao, ResultadoAluno,
+    ResultadoHabilidade, DominioHabilidadeTurma
+)
+from respostas_compactas import respostas_dos_resultados
+
+NIVEIS = ('aluno', 'turma', 'escola', 'rede', 'zona')
+
+
+def _somas_por_turma(resultado_ids):
+    """{(turma_id, habilidade_id, ano, periodo): [tentativas, acertos]} das linhas de ResultadoHabilidade dos resultados"""
+    linhas = db.session.query(
+        Aluno.turma_id,
+        ResultadoHabilidade.habilidade_id,
+        ResultadoAluno.ano_avaliacao,
+        ResultadoAluno.periodo_avaliacao,
+        db.func.sum(ResultadoHabilidade.tentativas),
+        db.func.sum(ResultadoHabilidade.acertos)
+    ).join(
+        ResultadoAluno, ResultadoHabilidade.resultado_id == ResultadoAluno.id
+    ).join(
+        Aluno, ResultadoAluno.aluno_id == Aluno.id
+    ).filter(
+        ResultadoHabilidade.resultado_id.in_(resultado_ids)
+    ).group_by(
+        Aluno.turma_id, ResultadoHabilidade.habilidade_id,
+        ResultadoAluno.ano_avaliacao, ResultadoAluno.periodo_avaliacao
+    ).all()
+    return {
+        (turma_id, habilidade_id, ano, periodo): [int(tentativas or 0), int(acertos or 0)]
+        for turma_id, habilidade_id, ano, periodo, tentativas, acertos in linhas
+    }
+
+
+def _aplicar_diferenca_dominio(antes, depois):
+    """Soma em DominioHabilidadeTurma a diferença entre as somas novas e as antigas dos resultados alterados"""
+    diferencas = {}
+    for chave in set(antes) | set(depois):
+        tentativas_antes, acertos_antes = antes.get(chave, (0, 0))
+        tentativas_depois, acertos_depois = depois.get(chave, (0, 0))
+        if (tentativas_antes, acertos_antes) != (tentativas_depois, acertos_depois):
+            diferencas[chave] = (tentativas_depois - tentativas_antes, acertos_depois - acertos_antes)
+    if not diferencas:
+        return
+
+    # Upsert que soma a diferença na chave única: gravações simultâneas na mesma turma não se sobrescrevem
+    # nem duplicam linhas (ordem estável das chaves para os bloqueios)
+    DominioHabilidadeTurma.somar([{
+        'turma_id': turma_id,
+        'habilidade_id': habilidade_id,
+        'ano_avaliacao': ano,
+        'periodo_avaliacao': periodo,
+        'tentativas': tentativas,
+        'acertos': acertos
+    } for (turma_id, habilidade_id, ano, periodo), (tentativas, acertos) in sorted(
+        diferencas.items(), key=lambda item: tuple(str(valor) for valor in item[0])
+    )])
+
+    # Habilidades que ficaram sem tentativas na turma saem do consolidado
+    DominioHabilidadeTurma.query.filter(
+        DominioHabilidadeTurma.turma_id.in_({turma_id for turma_id, _, _, _ in diferencas}),
+        DominioHabilidadeTurma.tentativas <= 0
+    ).delete(synchronize_session=False)
+
+
+def atualizar_resultados_habilidade(resultado_ids, respostas=None):
+    """Recalcula ResultadoHabilidade dos resultados e aplica a diferença no consolidado das turmas dos alunos"""
+    resultado_ids = sorted({rid for rid in resultado_ids if rid is not None})
+    if not resultado_ids:
+        return
+
+    db.session.flush()
+    if respostas is None:
+        respostas = respostas_dos_resultados(resultado_ids)
+    fizeram_prova = {rid for (rid,) in db.session.query(ResultadoAluno.id).filter(
+        ResultadoAluno.id.in_(resultado_ids),
+        ResultadoAluno.fez_prova == True
+    )}
+    questoes = {resposta.questao_id for rid in fizeram_prova for resposta in respostas.get(rid, ()) if resposta.questao_id}
+    habilidades = dict(db.session.query(Questao.id, Questao.habilidade_id).filter(
+        Questao.id.in_(questoes)
+    ).all()) if questoes else {}
+    contagens = {}  # {(resultado_id, habilidade_id): [tentativas, acertos]}
+    for resultado_id in resultado_ids:
+        if resultado_id not in fizeram_prova:
+            continue
+        for resposta in respostas.get(resultado_id, ()):
+            habilidade_id = habilidades.get(resposta.questao_id)
+            if habilidade_id is None:
+                continue
+            contagem = contagens.setdefault((resultado_id, habilidade_id), [0, 0])
+            contagem[0] += 1
+            contagem[1] += resposta.acertou
+
+    antes = _somas_por_turma(resultado_ids)
+    ResultadoHabilidade.query.filter(
+        ResultadoHabilidade.resultado_id.in_(resultado_ids)
+    ).delete(synchronize_session=False)
+    novas = [{
+        'resultado_id': resultado_id,
+        'habilidade_id': habilidade_id,
+        'tentativas': tentativas,
+        'acertos': acertos
+    } for (resultado_id, habilidade_id), (tentativas, acertos) in contagens.items()]
+    if novas:
+        db.session.execute(db.insert(ResultadoHabilidade), novas)
+    _aplicar_diferenca_dominio(antes, _somas_por_turma(resultado_ids))
+
+
+def remover_resultados_habilidade(resultado_ids):
+    """Apaga ResultadoHabilidade dos resultados (antes de DELETE em lote de ResultadoAluno) e desconta das turmas"""
+    resultado_ids = list(resultado_ids)
+    if not resultado_ids:
+        return
+    db.session.flush()
+    antes = _somas_por_turma(resultado_ids)
+    ResultadoHabilidade.query.filter(
+        ResultadoHabilidade.resultado_id.in_(resultado_ids)
+    ).delete(synchronize_session=False)
+    _aplicar_diferenca_dominio(antes, {})
+
+
+def recalcular_dominio_turmas(turma_ids):
+    """Refaz do zero as linhas de DominioHabilidadeTurma das turmas informadas (reconstrução dos agregados)"""
+    turma_ids = sorted(set(turma_ids))
+    if not turma_ids:
+        return
+
+    db.session.flush()
+    linhas = db.session.query(
+        Aluno.turma_id,
+        ResultadoHabilidade.habilidade_id,
+        ResultadoAluno.ano_avaliacao,
+        ResultadoAluno.periodo_avaliacao,
+        db.func.sum(ResultadoHabilidade.tentativas),
+        db.func.sum(ResultadoHabilidade.acertos)
+    ).join(
+        ResultadoAluno, ResultadoHabilidade.resultado_id == ResultadoAluno.id
+    ).join(
+        Aluno, ResultadoAluno.aluno_id == Aluno.id
+    ).filter(
+        Aluno.turma_id.in_(turma_ids),
+        ResultadoAluno.fez_prova == True
+    ).group_by(
+        Aluno.turma_id, ResultadoHabilidade.habilidade_id,
+        ResultadoAluno.ano_avaliacao, ResultadoAluno.periodo_avaliacao
+    ).all()
+
+    DominioHabilidadeTurma.query.filter(
+        DominioHabilidadeTurma.turma_id.in_(turma_ids)
+    ).delete(synchronize_session=False)
+    novas = [{
+        'turma_id': turma_id,
+        'habilidade_id': habilidade_id,
+        'ano_avaliacao': ano,
+        'periodo_avaliacao': periodo,
+        'tentativas': int(tentativas or 0),
+        'acertos': int(acertos or 0)
+    } for turma_id, habilidade_id, ano, periodo, tentativas, acertos in linhas]
+    if novas:
+        db.session.execute(db.insert(DominioHabilidadeTurma), novas)
+
+
+def consultar_dominio(user_id, nivel, referencia=None, ano=None, periodo=None, componente=None):
+    """
+    Domínio por habilidade no nível pedido:
+    aluno/turma/escola -> referencia é o ID; rede/zona -> referencia é o nome da rede/zona (None = todas).
+    """
+    if nivel == 'aluno':
+        tentativas = db.func.sum(ResultadoHabilidade.tentativas)
+        acertos = db.func.sum(ResultadoHabilidade.acertos)
+        query = db.session.query(Habilidade, tentativas, acertos).join(
+            ResultadoHabilidade, ResultadoHabilidade.habilidade_id == Habilidade.id
+        ).join(
+            ResultadoAluno, ResultadoHabilidade.resultado_id == ResultadoAluno.id
+        ).join(
+            Aluno, ResultadoAluno.aluno_id == Aluno.id
+        ).filter(
+            Aluno.id == referencia,
+            Aluno.user_id == user_id,
+            ResultadoAluno.fez_prova == True
+        )
+        coluna_ano, coluna_periodo = ResultadoAluno.ano_avaliacao, ResultadoAluno.periodo_avaliacao
+    else:
+        tentativas = db.func.sum(DominioHabilidadeTurma.tentativas)
+        acertos = db.func.sum(DominioHabilidadeTurma.acertos)
+        query = db.session.query(Habilidade, tentativas, acertos).join(
+            DominioHabilidadeTurma, DominioHabilidadeTurma.habilidade_id == Habilidade.id
+        ).join(
+            Turma, DominioHabilidadeTurma.turma_id == Turma.id
+        ).filter(Turma.user_id == user_id)
+        if nivel == 'turma':
+            query = query.filter(Turma.id == referencia)
+        elif nivel == 'escola':
+            query = query.filter(Turma.escola_id == referencia)
+        elif referencia:
+            query = query.join(Escola, Turma.escola_id == Escola.id).filter(
+                (Escola.rede if nivel == 'rede' else Escola.zona) == referencia
+            )
+        coluna_ano, coluna_periodo = DominioHabilidadeTurma.ano_avaliacao, DominioHabilidadeTurma.periodo_avaliacao
+
+    if ano:
+        query = query.filter(coluna_ano == ano)
+    if periodo:
+        query = query.filter(coluna_periodo == periodo)
+    if componente:
+        query = query.filter(Habilidade.componente == componente)
+
+    linhas = query.group_by(Habilidade.id).order_by(Habilidade.codigo).all()
+    return [{
+        'habilidade_id': habilidade.id,
+        'codigo': habilidade.codigo,
+        'descricao': habilidade.descricao,
+        'componente': habilidade.componente,
+        'tentativas': int(total or 0),
+        'acertos': int(certos or 0),
+        'percentual': round(int(certos or 0) / int(total) * 100, 1) if total else 0
+    } for habilidade, total, certos in linhas]
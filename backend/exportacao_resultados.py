@@ -0,0 +1,173 @@
+"""
+Exportação dos resultados (CSV ou XLSX) para uma rede inteira, sem montar o conjunto em memória.
+
+As linhas são lidas com cursor do lado do servidor (yield_per/stream_results) e escritas à medida
+que chegam:
+- CSV: cada bloco de linhas é enviado ao cliente assim que é formatado (o download começa na hora);
+- XLSX: planilha no modo write-only do openpyxl, que grava as linhas em arquivo temporário; o arquivo
+  final é enviado em pedaços. O consumo de memória não depende do número de linhas nos dois formatos.
+Na exportação por resposta, as respostas compactas de cada resultado são expandidas com o gabarito do
+caderno à medida que as linhas chegam.
+"""
+import io
+import csv
+import tempfile
+
+from openpyxl import Workbook
+
+from database import db, Aluno, Turma, Escola, Caderno, BlocoCaderno, ResultadoAluno, RespostaAluno
+from gabarito_compilado import obter_gabarito_compilado
+from respostas_compactas import expandir_compactas
+
+TIPOS = ('resultados', 'respostas')
+FORMATOS = ('csv', 'xlsx')
+LINHAS_POR_LOTE = 1000  # Linhas buscadas por ida ao banco e enviadas por pedaço do CSV
+TAMANHO_PEDACO = 256 * 1024  # Bytes por pedaço ao enviar o XLSX
+
+CABECALHO_RESULTADOS = [
+    'Escola', 'Rede', 'Zona', 'Turma', 'Série', 'Aluno ID', 'Aluno', 'Caderno ID', 'Caderno',
+    'Ano', 'Período', 'Fez a prova', 'Total de questões', 'Acertos', 'Percentual'
+]
+CABECALHO_RESPOSTAS = [
+    'Escola', 'Rede', 'Zona', 'Turma', 'Série', 'Aluno ID', 'Aluno', 'Caderno ID', 'Caderno',
+    'Ano', 'Período', 'Bloco', 'Componente', 'Questão', 'Questão ID', 'Resposta marcada',
+    'Resposta correta', 'Acertou'
+]
+
+
+def cabecalho_exportacao(tipo):
+    return CABECALHO_RESPOSTAS if tipo == 'respostas' else CABECALHO_RESULTADOS
+
+
+def consulta_exportacao(user_id, tipo='resultados', ano=None, periodo=None, caderno_id=None,
+                        escola_id=None, turma_id=None):
+    """Monta o SELECT da exportação (uma linha por resultado ou por resposta) com os filtros informados"""
+    colunas = [
+        Escola.nome, Escola.rede, Escola.zona, Turma.nome, Turma.ano, Aluno.id, Aluno.nome,
+        Caderno.id, Caderno.titulo, ResultadoAluno.ano_avaliacao, ResultadoAluno.periodo_avaliacao
+    ]
+    if tipo == 'respostas':
+        # Respostas compactas (expandidas em iterar_linhas) ou, nos resultados antigos, uma linha por RespostaAluno
+        colunas += [
+            ResultadoAluno.caderno_id, ResultadoAluno.respostas_compactas, ResultadoAluno.acertos_compactos,
+            ResultadoAluno.layout_respostas,
+            BlocoCaderno.ordem, BlocoCaderno.componente, RespostaAluno.questao_ordem,
+            RespostaAluno.questao_id, RespostaAluno.resposta_marcada, RespostaAluno.resposta_correta,
+            RespostaAluno.acertou
+        ]
+    else:
+        colunas += [
+            ResultadoAluno.fez_prova, ResultadoAluno.total_questoes, ResultadoAluno.total_acertos,
+            ResultadoAluno.percentual_acertos
+        ]
+
+    consulta = db.select(*colunas).select_from(ResultadoAluno).join(
+        Aluno, ResultadoAluno.aluno_id == Aluno.id
+    ).join(
+        Turma, Aluno.turma_id == Turma.id
+    ).join(
+        Escola, Turma.escola_id == Escola.id
+    ).join(
+        Caderno, ResultadoAluno.caderno_id == Caderno.id
+    ).where(ResultadoAluno.user_id == user_id)
+
+    if tipo == 'respostas':
+        consulta = consulta.outerjoin(
+            RespostaAluno, db.and_(
+                RespostaAluno.resultado_id == ResultadoAluno.id,
+                ResultadoAluno.respostas_compactas.is_(None)
+            )
+        ).outerjoin(
+            BlocoCaderno, RespostaAluno.bloco_id == BlocoCaderno.id
+        ).where(ResultadoAluno.fez_prova == True)
+
+    if ano:
+        consulta = consulta.where(ResultadoAluno.ano_avaliacao == ano)
+    if periodo:
+        consulta = consulta.where(ResultadoAluno.periodo_avaliacao == periodo)
+    if caderno_id:
+        consulta = consulta.where(ResultadoAluno.caderno_id == caderno_id)
+    if escola_id:
+        consulta = consulta.where(Turma.escola_id == escola_id)
+    if turma_id:
+        consulta = consulta.where(Aluno.turma_id == turma_id)
+
+    ordem = [Escola.nome, Turma.nome, Aluno.nome, ResultadoAluno.id]
+    if tipo == 'respostas':
+        ordem += [BlocoCaderno.ordem, RespostaAluno.questao_ordem]
+    return consulta.order_by(*ordem)
+
+
+def iterar_linhas(consulta, tipo='resultados'):
+    """Percorre o resultado com cursor do lado do servidor, LINHAS_POR_LOTE linhas por vez"""
+    if tipo == 'respostas':
+        # Gabaritos carregados antes: nenhuma outra consulta enquanto o cursor está aberto
+        cadernos = db.session.execute(
+            consulta.with_only_columns(ResultadoAluno.caderno_id).distinct().order_by(None)
+        ).scalars().all()
+        gabaritos = {caderno_id: obter_gabarito_compilado(caderno_id) for caderno_id in cadernos}
+
+    resultado = db.session.execute(consulta, execution_options={'yield_per': LINHAS_POR_LOTE})
+    try:
+        for linha in resultado:
+            if tipo != 'respostas':
+                yield tuple(_formatar_valor(valor) for valor in linha)
+                continue
+            dados = linha[:11]
+            caderno_id, texto, bitmap, layout = linha[11:15]
+            if texto is None:
+                if linha[15] is not None:  # Resultado antigo: a linha já é uma resposta
+                    yield tuple(_formatar_valor(valor) for valor in dados + linha[15:])
+                continue
+            for resposta in expandir_compactas(gabaritos[caderno_id], texto, bitmap, layout):
+                yield tuple(_formatar_valor(valor) for valor in dados + (
+                    resposta.bloco_ordem, resposta.componente, resposta.questao_ordem, resposta.questao_id,
+                    resposta.resposta_marcada, resposta.resposta_correta, resposta.acertou
+                ))
+    finally:
+        resultado.close()
+
+
+def _formatar_valor(valor):
+    if valor is True:
+        return 'Sim'
+    if valor is False:
+        return 'Não'
+    return valor
+
+
+def gerar_csv(cabecalho, linhas):
+    """Gera o CSV em pedaços de bytes (UTF-8 com BOM e ';' para abrir direto no Excel)"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, delimiter=';')
+    buffer.write('\ufeff')
+    escritor.writerow(cabecalho)
+
+    pendentes = 0
+    for linha in linhas:
+        escritor.writerow(linha)
+        pendentes += 1
+        if pendentes >= LINHAS_POR_LOTE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            pendentes = 0
+    yield buffer.getvalue().encode('utf-8')
+
+
+def gerar_xlsx(cabecalho, linhas, titulo='Resultados'):
+    """Gera o XLSX (openpyxl write-only, linhas em arquivo temporário) e o envia em pedaços de bytes"""
+    planilha = Workbook(write_only=True)
+    aba = planilha.create_sheet(title=titulo[:31])
+    aba.append(cabecalho)
+    for linha in linhas:
+        aba.append(linha)
+
+    with tempfile.TemporaryFile() as arquivo:
+        planilha.save(arquivo)
+        arquivo.seek(0)
+        while True:
+            pedaco = arquivo.read(TAMANHO_PEDACO)
+            if not pedaco:
+                break
+            yield pedaco
@@ -0,0 +1,246 @@
+"""
+Fila local de tarefas de correção automática.
+
+O endpoint de processamento grava os PDFs em disco e cria uma TarefaCorrecao; o worker_correcao.py
+(processo separado ou thread do servidor web, sem serviços externos) reserva as tarefas pendentes,
+processa os arquivos em grupos usando o pool da correcao_paralela e grava o progresso e os resultados
+de cada arquivo. Um erro inesperado em um grupo marca os arquivos do grupo como 'erro' (com a mensagem)
+e a tarefa termina com status 'erro'; os arquivos podem ser reprocessados depois.
+Os PDFs ficam em OMR_DIRETORIO_TAREFAS: o worker precisa enxergar o mesmo disco que o servidor web.
+"""
+import os
+import json
+import shutil
+import traceback
+from datetime import datetime, timedelta
+
+from ambiente import inteiro_do_ambiente
+from database import db, TarefaCorrecao, ArquivoTarefaCorrecao
+from correcao_paralela import processar_por_arquivo, formatar_resultado, NUM_PROCESSOS
+
+DIRETORIO_TAREFAS = os.getenv(
+    'OMR_DIRETORIO_TAREFAS',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads', 'correcao')
+)
+RETENCAO_HORAS = inteiro_do_ambiente('OMR_RETENCAO_HORAS', 72)
+
+STATUS_FINALIZADOS = ('concluida', 'cancelada', 'erro')
+
+
+def enfileirar_tarefa(user_id, arquivos, num_quadrilateros, num_questoes, num_alternativas):
+    """Salva os arquivos (lista de FileStorage) no diretório da fila e cria a tarefa pendente"""
+    tarefa = TarefaCorrecao(
+        user_id=user_id,
+        status='pendente',
+        num_quadrilateros=num_quadrilateros,
+        num_questoes=num_questoes,
+        num_alternativas=num_alternativas
+    )
+    db.session.add(tarefa)
+    db.session.flush()  # Gerar ID para o diretório da tarefa
+
+    diretorio = os.path.join(DIRETORIO_TAREFAS, str(tarefa.id))
+    os.makedirs(diretorio, exist_ok=True)
+    for ordem, arquivo in enumerate(arquivos, 1):
+        caminho = os.path.join(diretorio, f"{ordem:04d}.pdf")
+        arquivo.save(caminho)
+        db.session.add(ArquivoTarefaCorrecao(
+            tarefa_id=tarefa.id,
+            ordem=ordem,
+            nome=arquivo.filename,
+            caminho=caminho,
+            status='pendente'
+        ))
+    db.session.commit()
+    return tarefa
+
+
+def serializar_tarefa(tarefa, incluir_resultados=True):
+    """Converte a tarefa para dicionário com progresso e resultados por arquivo"""
+    arquivos = []
+    resultados = []
+    for arquivo in tarefa.arquivos:
+        resultados_arquivo = json.loads(arquivo.resultado) if arquivo.resultado else []
+        resultados.extend(resultados_arquivo)
+        dados = {
+            'ordem': arquivo.ordem,
+            'nome': arquivo.nome,
+            'status': arquivo.status,
+            'tentativas': arquivo.tentativas,
+            'erro': arquivo.erro
+        }
+        if incluir_resultados:
+            dados['resultados'] = resultados_arquivo
+        arquivos.append(dados)
+
+    finalizados = [a for a in tarefa.arquivos if a.status in ('sucesso', 'erro', 'cancelado')]
+    dados = {
+        'id': tarefa.id,
+        'status': tarefa.status,
+        'erro': next((a.erro for a in tarefa.arquivos if a.erro), None) if tarefa.status == 'erro' else None,
+        'cancelamento_solicitado': bool(tarefa.cancelamento_solicitado),
+        'total_arquivos': len(tarefa.arquivos),
+        'arquivos_finalizados': len(finalizados),
+        'progresso': round(len(finalizados) / len(tarefa.arquivos) * 100, 1) if tarefa.arquivos else 100,
+        'total_sucesso': len([r for r in resultados if r.get('sucesso')]),
+        'total_erros': len([r for r in resultados if not r.get('sucesso')]),
+        'criado_em': tarefa.criado_em.isoformat() if tarefa.criado_em else None,
+        'iniciado_em': tarefa.iniciado_em.isoformat() if tarefa.iniciado_em else None,
+        'finalizado_em': tarefa.finalizado_em.isoformat() if tarefa.finalizado_em else None,
+        'arquivos': arquivos
+    }
+    if incluir_resultados:
+        # Mesmo formato da resposta síncrona para vários arquivos
+        dados['resultados'] = resultados
+    return dados
+
+
+def solicitar_cancelamento(tarefa):
+    """Cancela imediatamente uma tarefa pendente ou sinaliza o worker para parar entre um grupo e outro"""
+    if tarefa.status == 'pendente':
+        _finalizar_cancelada(tarefa)
+    elif tarefa.status == 'processando':
+        tarefa.cancelamento_solicitado = True
+    db.session.commit()
+
+
+def reenfileirar_falhas(tarefa):
+    """Volta para a fila os arquivos com erro (de uma tarefa finalizada); retorna quantos foram reenfileirados"""
+    falhas = [a for a in tarefa.arquivos if a.status in ('erro', 'cancelado')]
+    for arquivo in falhas:
+        arquivo.status = 'pendente'
+        arquivo.erro = None
+        arquivo.resultado = None
+    if falhas:
+        tarefa.status = 'pendente'
+        tarefa.cancelamento_solicitado = False
+        tarefa.finalizado_em = None
+    db.session.commit()
+    return len(falhas)
+
+
+def _finalizar_cancelada(tarefa):
+    for arquivo in tarefa.arquivos:
+        if arquivo.status in ('pendente', 'processando'):
+            arquivo.status = 'cancelado'
+    tarefa.status = 'cancelada'
+    tarefa.finalizado_em = datetime.now()
+
+
+def recuperar_tarefas_interrompidas():
+    """Devolve para a fila as tarefas que estavam em processamento quando o worker parou"""
+    interrompidas = TarefaCorrecao.query.filter_by(status='processando').all()
+    for tarefa in interrompidas:
+        tarefa.status = 'pendente'
+        for arquivo in tarefa.arquivos:
+            if arquivo.status == 'processando':
+                arquivo.status = 'pendente'
+    db.session.commit()
+    return len(interrompidas)
+
+
+def reservar_proxima_tarefa():
+    """Reserva a tarefa pendente mais antiga (UPDATE condicional: seguro mesmo com mais de um worker)"""
+    candidata = db.session.query(TarefaCorrecao.id).filter_by(status='pendente').order_by(TarefaCorrecao.id).first()
+    if not candidata:
+        return None
+    reservadas = TarefaCorrecao.query.filter_by(id=candidata.id, status='pendente').update(
+        {'status': 'processando', 'iniciado_em': datetime.now()}, synchronize_session=False
+    )
+    db.session.commit()
+    return TarefaCorrecao.query.get(candidata.id) if reservadas else None
+
+
+def _marcar_erro(arquivos, mensagem):
+    for arquivo in arquivos:
+        arquivo.tentativas = (arquivo.tentativas or 0) + 1
+        arquivo.status = 'erro'
+        arquivo.erro = mensagem
+
+
+def _processar_grupo(tarefa, grupo):
+    for arquivo in grupo:
+        arquivo.status = 'processando'
+    db.session.commit()
+
+    # Os PDFs são passados pelo caminho: as páginas são lidas do disco sob demanda
+    processaveis = []
+    for arquivo in grupo:
+        if os.path.exists(arquivo.caminho):
+            processaveis.append(arquivo)
+        else:
+            _marcar_erro([arquivo], 'Arquivo indisponível')
+
+    paginas_por_arquivo = processar_por_arquivo(
+        [(a.nome, a.caminho) for a in processaveis],
+        tarefa.num_quadrilateros,
+        tarefa.num_questoes,
+        tarefa.num_alternativas
+    )
+
+    for arquivo, paginas in zip(processaveis, paginas_por_arquivo):
+        resultados = [formatar_resultado(nome, resultado) for nome, resultado in paginas]
+        arquivo.resultado = json.dumps(resultados)
+        arquivo.tentativas = (arquivo.tentativas or 0) + 1
+        erros = [r['erro'] for r in resultados if not r['sucesso']]
+        arquivo.status = 'erro' if erros else 'sucesso'
+        arquivo.erro = erros[0] if erros else None
+    db.session.commit()
+
+
+def executar_tarefa(tarefa):
+    """
+    Processa os arquivos pendentes da tarefa em grupos do tamanho do pool, gravando o progresso a cada grupo.
+    A tarefa sempre termina: 'concluida', 'cancelada' ou 'erro' (se algum grupo falhou de forma inesperada).
+    """
+    pendentes = [a for a in tarefa.arquivos if a.status == 'pendente']
+    tamanho_grupo = max(NUM_PROCESSOS, 1)
+    falhou = False
+
+    try:
+        for inicio in range(0, len(pendentes), tamanho_grupo):
+            db.session.refresh(tarefa)
+            if tarefa.cancelamento_solicitado:
+                _finalizar_cancelada(tarefa)
+                db.session.commit()
+                print(f"🛑 Tarefa de correção {tarefa.id} cancelada")
+                return
+
+            grupo = pendentes[inicio:inicio + tamanho_grupo]
+            try:
+                _processar_grupo(tarefa, grupo)
+            except Exception as e:
+                db.session.rollback()
+                print(f"❌ Erro ao processar arquivos da tarefa de correção {tarefa.id}: {e}")
+                traceback.print_exc()
+                _marcar_erro(grupo, f'Erro no processamento: {e}')
+                db.session.commit()
+                falhou = True
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Erro na tarefa de correção {tarefa.id}: {e}")
+        traceback.print_exc()
+        _marcar_erro([a for a in tarefa.arquivos if a.status in ('pendente', 'processando')], f'Erro no processamento: {e}')
+        falhou = True
+
+    tarefa.status = 'erro' if falhou else 'concluida'
+    tarefa.finalizado_em = datetime.now()
+    db.session.commit()
+    if falhou:
+        print(f"⚠️ Tarefa de correção {tarefa.id} finalizada com erro")
+    else:
+        print(f"✅ Tarefa de correção {tarefa.id} concluída ({len(pendentes)} arquivo(s))")
+
+
+def limpar_tarefas_antigas():
+    """Remove tarefas finalizadas (e seus PDFs) após o período de retenção"""
+    limite = datetime.now() - timedelta(hours=RETENCAO_HORAS)
+    antigas = TarefaCorrecao.query.filter(
+        TarefaCorrecao.status.in_(STATUS_FINALIZADOS),
+        TarefaCorrecao.finalizado_em < limite
+    ).all()
+    for tarefa in antigas:
+        shutil.rmtree(os.path.join(DIRETORIO_TAREFAS, str(tarefa.id)), ignore_errors=True)
+        db.session.delete(tarefa)
+    db.session.commit()
+    return len(antigas)
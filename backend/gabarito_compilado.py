@@ -0,0 +1,152 @@
+"""
+Gabarito compilado por caderno.
+
+Monta, em uma única consulta, o mapa (ordem do bloco, ordem da questão) -> questão/letra correta
+de um caderno, já resolvendo o modelo híbrido (Questao.resposta_correta ou tabela Alternativa).
+O resultado fica em cache no processo e é invalidado pela versão 'gabarito' do caderno
+(VersaoDados), que é incrementada sempre que blocos ou questões do caderno são alterados.
+"""
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from database import db, Questao, Alternativa, BlocoCaderno, BlocoQuestao, VersaoDados
+from motor_correcao import codificar_gabarito, CODIGO_SEM_GABARITO
+
+ESCOPO_GABARITO = 'gabarito'
+LIMITE_CACHE = 256
+
+BlocoGabarito = namedtuple('BlocoGabarito', ['id', 'ordem', 'indice', 'componente', 'total_questoes'])
+ItemGabarito = namedtuple('ItemGabarito', ['questao_id', 'resposta_correta'])
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+class GabaritoCompilado:
+    """Gabarito pronto para correção de um caderno"""
+
+    def __init__(self, caderno_id, versao, blocos, itens):
+        self.caderno_id = caderno_id
+        self.versao = versao
+        self.blocos = blocos  # Lista de BlocoGabarito na ordem do caderno
+        self.itens = itens  # {(ordem_bloco, ordem_questao): ItemGabarito}
+        self._blocos_por_id = {b.id: b for b in blocos}
+        blocos_por_ordem = {b.ordem: b for b in reversed(blocos)}
+        self._ordem_por_questao = {}
+        for (ordem_bloco, ordem_questao), item in sorted(itens.items()):
+            bloco = blocos_por_ordem[ordem_bloco]
+            self._ordem_por_questao.setdefault((bloco.id, item.questao_id), ordem_questao)
+
+        # Layout vetorizado usado pelo motor de correção: uma coluna por questão, na ordem bloco/questão
+        self.colunas = [(b, ordem) for b in blocos for ordem in range(1, b.total_questoes + 1)]
+        self.inicio_blocos = np.cumsum([0] + [b.total_questoes for b in blocos[:-1]], dtype=np.intp)[:len(blocos)]
+        chave = []
+        for b, ordem in self.colunas:
+            item = itens.get((b.ordem, ordem))
+            chave.append(codificar_gabarito(item.resposta_correta) if item else CODIGO_SEM_GABARITO)
+        self.chave = np.array(chave, dtype=np.uint8)
+
+    @property
+    def total_questoes(self):
+        return sum(b.total_questoes for b in self.blocos)
+
+    def bloco_por_id(self, bloco_id):
+        return self._blocos_por_id.get(bloco_id)
+
+    def item(self, ordem_bloco, ordem_questao):
+        """Retorna o ItemGabarito da posição, ou None se a questão não foi atribuída ao bloco"""
+        return self.itens.get((ordem_bloco, ordem_questao))
+
+    def ordem_da_questao(self, bloco_id, questao_id):
+        """Retorna a ordem de uma questão dentro do bloco, ou None se ela não pertence ao bloco"""
+        return self._ordem_por_questao.get((bloco_id, questao_id))
+
+
+def _compilar(caderno_id, versao):
+    linhas = db.session.query(
+        BlocoCaderno.id,
+        BlocoCaderno.ordem,
+        BlocoCaderno.componente,
+        BlocoCaderno.total_questoes,
+        BlocoQuestao.ordem,
+        BlocoQuestao.questao_id,
+        Questao.resposta_correta
+    ).outerjoin(
+        BlocoQuestao, BlocoQuestao.bloco_id == BlocoCaderno.id
+    ).outerjoin(
+        Questao, Questao.id == BlocoQuestao.questao_id
+    ).filter(
+        BlocoCaderno.caderno_id == caderno_id
+    ).order_by(BlocoCaderno.ordem, BlocoCaderno.id, BlocoQuestao.ordem, BlocoQuestao.id).all()
+
+    blocos = []
+    posicoes = {}  # {(ordem_bloco, ordem_questao): (questao_id, resposta_correta)}
+    for bloco_id, bloco_ordem, componente, total_questoes, questao_ordem, questao_id, resposta_correta in linhas:
+        if not blocos or blocos[-1].id != bloco_id:
+            blocos.append(BlocoGabarito(bloco_id, bloco_ordem, len(blocos), componente, total_questoes))
+        if questao_id is not None:
+            # Em caso de ordem duplicada no bloco, vale a primeira atribuição
+            posicoes.setdefault((bloco_ordem, questao_ordem), (questao_id, resposta_correta or None))
+
+    # Questões do modelo antigo: resolver a letra correta pela tabela Alternativa
+    sem_letra = {questao_id for questao_id, letra in posicoes.values() if not letra}
+    letras_antigas = {}
+    if sem_letra:
+        alternativas = db.session.query(Alternativa.questao_id, Alternativa.correta).filter(
+            Alternativa.questao_id.in_(sem_letra)
+        ).order_by(Alternativa.questao_id, Alternativa.id).all()
+        indice_por_questao = {}
+        for questao_id, correta in alternativas:
+            indice = indice_por_questao.get(questao_id, 0)
+            indice_por_questao[questao_id] = indice + 1
+            if correta and questao_id not in letras_antigas:
+                letras_antigas[questao_id] = chr(65 + indice)  # A, B, C, D
+
+    itens = {
+        posicao: ItemGabarito(questao_id, letra or letras_antigas.get(questao_id))
+        for posicao, (questao_id, letra) in posicoes.items()
+    }
+    return GabaritoCompilado(caderno_id, versao, blocos, itens)
+
+
+def obter_gabarito_compilado(caderno_id):
+    """Retorna o gabarito compilado do caderno, reaproveitando o cache se a versão não mudou"""
+    versao = VersaoDados.atual(ESCOPO_GABARITO, caderno_id)
+    with _lock:
+        gabarito = _cache.get(caderno_id)
+        if gabarito is not None and gabarito.versao == versao:
+            _cache.move_to_end(caderno_id)
+            return gabarito
+
+    gabarito = _compilar(caderno_id, versao)
+    with _lock:
+        _cache[caderno_id] = gabarito
+        _cache.move_to_end(caderno_id)
+        while len(_cache) > LIMITE_CACHE:
+            _cache.popitem(last=False)
+    return gabarito
+
+
+def invalidar_gabarito(caderno_id):
+    """Marca o gabarito do caderno como alterado (deve ser chamado antes do commit da alteração)"""
+    VersaoDados.incrementar(ESCOPO_GABARITO, caderno_id)
+    with _lock:
+        _cache.pop(caderno_id, None)
+
+
+def descartar_gabarito(caderno_id):
+    """Remove a versão e o cache do gabarito de um caderno excluído (antes do commit da exclusão)"""
+    VersaoDados.remover(ESCOPO_GABARITO, caderno_id)
+    with _lock:
+        _cache.pop(caderno_id, None)
+
+
+def invalidar_gabaritos_da_questao(questao_id):
+    """Invalida o gabarito de todos os cadernos que usam a questão"""
+    cadernos_ids = db.session.query(BlocoCaderno.caderno_id).join(
+        BlocoQuestao, BlocoQuestao.bloco_id == BlocoCaderno.id
+    ).filter(BlocoQuestao.questao_id == questao_id).distinct().all()
+    for (caderno_id,) in cadernos_ids:
+        invalidar_gabarito(caderno_id)
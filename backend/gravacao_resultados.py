@@ -0,0 +1,132 @@
+"""
+Gravação de ResultadoAluno por upsert na chave natural (aluno, caderno, ano, período).
+
+Em vez de buscar o resultado e inserir quando não existe (duas idas ao banco e duplicatas quando
+dois aparelhos lançam o mesmo aluno ao mesmo tempo), cada lote é uma única instrução apoiada no
+índice único uq_resultado_aluno_chave_periodo (ano e período com COALESCE, então resultados sem ano ou
+período, como os dos lançamentos por scan, também conflitam):
+- PostgreSQL e SQLite: INSERT ... ON CONFLICT DO UPDATE ... RETURNING id;
+- MySQL 8.0.13+: INSERT ... ON DUPLICATE KEY UPDATE (o id do resultado único vem de LAST_INSERT_ID,
+  o de lotes com uma consulta pela chave).
+Só em outros bancos a gravação busca antes e insere quando não encontra.
+"""
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from database import db, ResultadoAluno, CHAVE_RESULTADO_ALUNO
+
+CHAVE_RESULTADO = ('aluno_id', 'caderno_id', 'ano_avaliacao', 'periodo_avaliacao')
+NAO_ATUALIZAR = CHAVE_RESULTADO + ('user_id', 'data_lancamento')  # Mantidos do primeiro lançamento
+LINHAS_POR_INSTRUCAO = 500
+
+_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+    'mysql': mysql.insert,
+    'mariadb': mysql.insert,
+}
+
+
+def chave_resultado(linha):
+    return tuple(linha.get(coluna) for coluna in CHAVE_RESULTADO)
+
+
+def _chave_normalizada(linha):
+    """Chave com os tipos do banco (o ano e os ids podem chegar como texto no JSON)"""
+    ano, periodo = linha.get('ano_avaliacao'), linha.get('periodo_avaliacao')
+    return {
+        'aluno_id': int(linha['aluno_id']),
+        'caderno_id': int(linha['caderno_id']),
+        'ano_avaliacao': int(ano) if ano not in (None, '') else None,
+        'periodo_avaliacao': str(periodo) if periodo not in (None, '') else None
+    }
+
+
+def _upsert(insert, dialeto, linhas):
+    """Uma instrução para até LINHAS_POR_INSTRUCAO linhas; retorna {chave: id}"""
+    stmt = insert(ResultadoAluno).values(linhas)
+    colunas = [coluna for coluna in linhas[0] if coluna not in NAO_ATUALIZAR]
+
+    if dialeto in ('mysql', 'mariadb'):
+        stmt = stmt.on_duplicate_key_update(
+            id=db.func.last_insert_id(ResultadoAluno.id),
+            **{coluna: stmt.inserted[coluna] for coluna in colunas}
+        )
+        resultado = db.session.execute(stmt)
+        if len(linhas) == 1:
+            return {chave_resultado(linhas[0]): resultado.lastrowid}
+        return _ids_pela_chave(linhas)
+
+    # Sem colunas a atualizar, o "update" da própria chave faz o RETURNING devolver a linha existente
+    atualizar = {coluna: stmt.excluded[coluna] for coluna in colunas} or {'aluno_id': stmt.excluded.aluno_id}
+    stmt = stmt.on_conflict_do_update(index_elements=list(CHAVE_RESULTADO_ALUNO), set_=atualizar).returning(
+        ResultadoAluno.id, *[getattr(ResultadoAluno, coluna) for coluna in CHAVE_RESULTADO]
+    )
+    return {tuple(linha[1:]): linha[0] for linha in db.session.execute(stmt)}
+
+
+def _filtro_coluna(coluna, valor):
+    """Comparação que trata NULL como valor (IS NULL), como o índice da chave"""
+    atributo = getattr(ResultadoAluno, coluna)
+    return atributo.is_(None) if valor is None else atributo == valor
+
+
+def _ids_pela_chave(linhas):
+    """{chave: id} dos resultados de um lote que tem caderno, ano e período em comum"""
+    caderno_id, ano, periodo = linhas[0]['caderno_id'], linhas[0]['ano_avaliacao'], linhas[0]['periodo_avaliacao']
+    mesmos = all((l['caderno_id'], l['ano_avaliacao'], l['periodo_avaliacao']) == (caderno_id, ano, periodo) for l in linhas)
+    if not mesmos:
+        return {chave_resultado(linha): _buscar_ou_criar(linha) for linha in linhas}
+    return {(aluno_id, caderno_id, ano, periodo): resultado_id for resultado_id, aluno_id in db.session.query(
+        ResultadoAluno.id, ResultadoAluno.aluno_id
+    ).filter(
+        ResultadoAluno.caderno_id == caderno_id,
+        _filtro_coluna('ano_avaliacao', ano),
+        _filtro_coluna('periodo_avaliacao', periodo),
+        ResultadoAluno.aluno_id.in_([linha['aluno_id'] for linha in linhas])
+    )}
+
+
+def _buscar_ou_criar(linha):
+    """Caminho sem upsert: busca pela chave (tratando NULL) e atualiza ou insere; retorna o id"""
+    filtros = [_filtro_coluna(coluna, linha.get(coluna)) for coluna in CHAVE_RESULTADO]
+    resultado = ResultadoAluno.query.filter(*filtros).order_by(ResultadoAluno.id).first()
+    if resultado is None:
+        resultado = ResultadoAluno(**linha)
+        db.session.add(resultado)
+    else:
+        for coluna, valor in linha.items():
+            if coluna not in NAO_ATUALIZAR:
+                setattr(resultado, coluna, valor)
+    db.session.flush()
+    return resultado.id
+
+
+def upsert_resultados(linhas):
+    """
+    Insere ou atualiza os resultados (dicts com a chave natural, user_id e os valores a gravar, todos
+    com as mesmas colunas). Em conflito, os valores substituem os gravados, exceto user_id e
+    data_lancamento. Chaves repetidas no lote: a última prevalece. Retorna {chave: resultado_id}.
+    """
+    unicas = {}
+    for linha in linhas:
+        linha = dict(linha, **_chave_normalizada(linha))
+        unicas[chave_resultado(linha)] = linha
+    if not unicas:
+        return {}
+
+    db.session.flush()  # Alterações pendentes do ORM antes das instruções diretas
+    dialeto = db.session.get_bind().dialect.name
+    insert = _INSERTS.get(dialeto)
+
+    if insert is None:
+        return {chave: _buscar_ou_criar(linha) for chave, linha in unicas.items()}
+    linhas = list(unicas.values())
+    ids = {}
+    for inicio in range(0, len(linhas), LINHAS_POR_INSTRUCAO):
+        ids.update(_upsert(insert, dialeto, linhas[inicio:inicio + LINHAS_POR_INSTRUCAO]))
+    return ids
+
+
+def upsert_resultado(**linha):
+    """Upsert de um único resultado; retorna o id"""
+    return upsert_resultados([linha])[chave_resultado(_chave_normalizada(linha))]
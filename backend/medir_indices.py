@@ -0,0 +1,196 @@
+"""
+Medição dos índices das consultas frequentes (migração acfb8a207ef8) em uma rede municipal sintética.
+
+Cria um banco SQLite temporário com os modelos atuais, sem os índices da migração, mede as consultas,
+cria os índices como a migração faz e mede de novo. Uso: python medir_indices.py [escolas]
+(padrão 60 escolas: 1.200 turmas, 30 mil alunos, 90 mil resultados e 1,98 milhão de respostas).
+Os tempos variam com a máquina; a comparação que importa é antes x depois na mesma execução.
+Índices de migrações posteriores (como a chave única de resultado_aluno) existem nas duas medições,
+então a busca do resultado de um aluno já é rápida antes.
+"""
+import os
+import time
+import random
+import tempfile
+import importlib.util
+
+from flask import Flask
+
+from database import (
+    db, User, Escola, Turma, Aluno, Habilidade, Questao, Caderno, BlocoCaderno, BlocoQuestao,
+    ResultadoAluno, RespostaAluno
+)
+
+TURMAS_POR_ESCOLA = 20
+ALUNOS_POR_TURMA = 25
+PERIODOS = ('1', '2', 'final')
+HABILIDADES = 2000
+QUESTOES = 20000
+CADERNOS = 270  # 2 blocos de 11 questões cada
+TAMANHO_LOTE = 200000  # Respostas inseridas por comando
+
+
+def _indices_da_migracao():
+    caminho = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'migrations', 'versions', 'acfb8a207ef8_indices_consultas_frequentes.py'
+    )
+    spec = importlib.util.spec_from_file_location('indices_consultas_frequentes', caminho)
+    migracao = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migracao)
+    return migracao.INDICES
+
+
+def _popular(escolas):
+    turmas = escolas * TURMAS_POR_ESCOLA
+    alunos = turmas * ALUNOS_POR_TURMA
+    aleatorio = random.Random(1)
+    inserir = lambda modelo, linhas: db.session.execute(db.insert(modelo), linhas)
+
+    inserir(User, [dict(id=1, name='Rede', email='rede@exemplo', password_hash='x')])
+    inserir(Habilidade, [dict(
+        id=i + 1, codigo=f'EF{1 + i % 9:02d}{"MA" if i % 2 else "LP"}{i:04d}',
+        componente='Matemática' if i % 2 else 'Língua Portuguesa', ano=1 + i % 9, descricao='d'
+    ) for i in range(HABILIDADES)])
+    inserir(Escola, [dict(id=e + 1, nome=f'Escola {e}', rede='municipal', zona='urbana', user_id=1) for e in range(escolas)])
+    inserir(Turma, [dict(
+        id=t + 1, nome=f'Turma {t}', ano=1 + t % 9, turno='Manhã', escola_id=1 + t // TURMAS_POR_ESCOLA, user_id=1
+    ) for t in range(turmas)])
+    inserir(Aluno, [dict(
+        id=a + 1, nome=f'Aluno {a}', sexo='M', turma_id=1 + a // ALUNOS_POR_TURMA,
+        escola_id=1 + a // (ALUNOS_POR_TURMA * TURMAS_POR_ESCOLA), user_id=1
+    ) for a in range(alunos)])
+    inserir(Questao, [dict(
+        id=q + 1, enunciado='Enunciado', habilidade_id=1 + q % HABILIDADES, ano=1 + q % 9,
+        escola_id=1 + q % escolas, user_id=1, componente='Matemática'
+    ) for q in range(QUESTOES)])
+    inserir(Caderno, [dict(
+        id=c + 1, titulo=f'Caderno {c}', serie=1 + c % 9, qtd_blocos=2, qtd_questoes_por_bloco=11, user_id=1
+    ) for c in range(CADERNOS)])
+    inserir(BlocoCaderno, [dict(
+        id=b + 1, caderno_id=1 + b // 2, ordem=1 + b % 2,
+        componente=('Língua Portuguesa', 'Matemática')[b % 2], total_questoes=11
+    ) for b in range(CADERNOS * 2)])
+    inserir(BlocoQuestao, [dict(
+        bloco_id=1 + i // 11, questao_id=1 + aleatorio.randrange(QUESTOES), ordem=1 + i % 11
+    ) for i in range(CADERNOS * 2 * 11)])
+
+    # Cada aluno faz o caderno da sua série (cadernos 1 a 9) nos três períodos
+    resultados = []
+    for a in range(alunos):
+        serie = 1 + (a // ALUNOS_POR_TURMA) % 9
+        for periodo in PERIODOS:
+            resultados.append(dict(
+                id=len(resultados) + 1, aluno_id=a + 1, caderno_id=serie, user_id=1, fez_prova=True,
+                ano_avaliacao=2025, periodo_avaliacao=periodo, total_acertos=10
+            ))
+    inserir(ResultadoAluno, resultados)
+    respostas = []
+    for resultado in resultados:
+        for bloco in (0, 1):
+            for ordem in range(1, 12):
+                respostas.append(dict(
+                    resultado_id=resultado['id'], bloco_id=2 * (resultado['caderno_id'] - 1) + bloco + 1,
+                    questao_ordem=ordem, resposta_marcada='A', acertou=ordem % 2 == 0
+                ))
+        if len(respostas) > TAMANHO_LOTE:
+            inserir(RespostaAluno, respostas)
+            respostas = []
+    if respostas:
+        inserir(RespostaAluno, respostas)
+    db.session.commit()
+    return alunos, len(resultados)
+
+
+def _consultas(escolas, alunos, resultados):
+    """(descrição, função, repetições) de cada consulta medida"""
+    turmas = escolas * TURMAS_POR_ESCOLA
+    aleatorio = random.Random(7)
+    aluno = lambda: aleatorio.randrange(1, alunos + 1)
+
+    def resultado_do_aluno():
+        aluno_id = aluno()
+        return ResultadoAluno.query.filter_by(
+            aluno_id=aluno_id, caderno_id=1 + ((aluno_id - 1) // ALUNOS_POR_TURMA) % 9, user_id=1,
+            ano_avaliacao=2025, periodo_avaliacao='2'
+        ).first()
+
+    def resultados_da_turma():
+        inicio = aleatorio.randrange(turmas) * ALUNOS_POR_TURMA + 1
+        return ResultadoAluno.query.filter(
+            ResultadoAluno.aluno_id.in_(range(inicio, inicio + ALUNOS_POR_TURMA))
+        ).all()
+
+    return [
+        ('resultado de um aluno (aluno, caderno, user, ano, período)', resultado_do_aluno, 300),
+        ('resultados de um caderno/período (contagem)', lambda: ResultadoAluno.query.filter_by(
+            caderno_id=aleatorio.randrange(1, 10), ano_avaliacao=2025, periodo_avaliacao='final'
+        ).count(), 30),
+        ('resultados dos alunos de uma turma (IN)', resultados_da_turma, 100),
+        ('respostas de um resultado', lambda: RespostaAluno.query.filter_by(
+            resultado_id=aleatorio.randrange(1, resultados + 1)
+        ).all(), 300),
+        ('bloco_questao de um bloco, em ordem', lambda: BlocoQuestao.query.filter_by(
+            bloco_id=aleatorio.randrange(1, CADERNOS * 2 + 1)
+        ).order_by(BlocoQuestao.ordem).all(), 300),
+        ('questões por (user, habilidade)', lambda: Questao.query.filter_by(
+            user_id=1, habilidade_id=aleatorio.randrange(1, HABILIDADES + 1)
+        ).all(), 300),
+        ('questões por (escola, ano)', lambda: Questao.query.filter_by(
+            escola_id=aleatorio.randrange(1, escolas + 1), ano=aleatorio.randrange(1, 10)
+        ).all(), 100),
+        ('alunos de uma turma', lambda: Aluno.query.filter_by(turma_id=aleatorio.randrange(1, turmas + 1)).all(), 300),
+        ('habilidades por (componente, ano)', lambda: Habilidade.query.filter_by(
+            componente='Matemática', ano=aleatorio.randrange(1, 10)
+        ).all(), 100),
+    ]
+
+
+def _medir(consultas):
+    tempos = []
+    for _, funcao, repeticoes in consultas:
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            funcao()
+        tempos.append((time.perf_counter() - inicio) / repeticoes * 1000)
+    return tempos
+
+
+def medir_indices(escolas=60):
+    """Mede as consultas sem e com os índices da migração (python medir_indices.py [escolas])"""
+    indices = _indices_da_migracao()
+    with tempfile.TemporaryDirectory() as diretorio:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(diretorio, 'rede.db')}"
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            with db.engine.begin() as conexao:
+                for nome, _, _ in indices:
+                    conexao.execute(db.text(f'DROP INDEX IF EXISTS {nome}'))
+
+            inicio = time.perf_counter()
+            alunos, resultados = _popular(escolas)
+            print(f"📦 Rede sintética: {escolas} escolas, {escolas * TURMAS_POR_ESCOLA} turmas, {alunos} alunos, "
+                  f"{resultados} resultados, {RespostaAluno.query.count()} respostas "
+                  f"({time.perf_counter() - inicio:.0f}s)")
+
+            consultas = _consultas(escolas, alunos, resultados)
+            antes = _medir(consultas)
+
+            inicio = time.perf_counter()
+            with db.engine.begin() as conexao:
+                for nome, tabela, colunas in indices:
+                    conexao.execute(db.text(f"CREATE INDEX {nome} ON {tabela} ({', '.join(colunas)})"))
+            print(f"🔧 {len(indices)} índices criados em {time.perf_counter() - inicio:.1f}s")
+
+            depois = _medir(consultas)
+            print("⏱️ ms por consulta (antes -> depois):")
+            for (descricao, _, _), tempo_antes, tempo_depois in zip(consultas, antes, depois):
+                print(f"  {descricao:<60} {tempo_antes:8.2f} -> {tempo_depois:.2f}")
+            db.session.remove()
+            db.engine.dispose()
+
+
+if __name__ == '__main__':
+    import sys
+    medir_indices(int(sys.argv[1]) if len(sys.argv) > 1 else 60)
@@ -0,0 +1,85 @@
+"""chave unica de resultado_aluno
+
+Um resultado por (aluno, caderno, ano, período): o índice único uq_resultado_aluno_chave substitui
+ix_resultado_aluno_aluno_caderno_periodo (mesmas colunas) e é o alvo do upsert dos lançamentos.
+
+Antes de criar o índice, as duplicatas existentes são removidas mantendo o resultado mais antigo
+(o mesmo que as telas já exibiam), junto com as respostas e os totais por componente/habilidade
+das cópias. Depois da migração, rodar `flask recalcular-resultados` para refazer os agregados dos
+alunos afetados (o número de duplicatas removidas é informado).
+
+Revision ID: 5d2e9c41b7a3
+Revises: acfb8a207ef8
+Create Date: 2026-10-18 15:02:17.118240
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2e9c41b7a3'
+down_revision = 'acfb8a207ef8'
+branch_labels = None
+depends_on = None
+
+CHAVE = ['aluno_id', 'caderno_id', 'ano_avaliacao', 'periodo_avaliacao']
+DEPENDENTES = ['resposta_aluno', 'resultado_componente', 'resultado_habilidade']
+LOTE = 1000
+
+
+def _indices_existentes(tabela):
+    return {indice['name'] for indice in sa.inspect(op.get_bind()).get_indexes(tabela)}
+
+
+def _criar_indice(nome, colunas, unico=False):
+    if nome in _indices_existentes('resultado_aluno'):
+        return
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.create_index(nome, 'resultado_aluno', colunas, unique=unico, postgresql_concurrently=True)
+    else:
+        op.create_index(nome, 'resultado_aluno', colunas, unique=unico)
+
+
+def _remover_duplicatas():
+    """Apaga as cópias (id maior) de resultados com a mesma chave (ano/período NULL contam como iguais); retorna quantas"""
+    conexao = op.get_bind()
+    duplicadas = [linha[0] for linha in conexao.execute(sa.text(
+        'SELECT r.id FROM resultado_aluno r WHERE EXISTS ('
+        ' SELECT 1 FROM resultado_aluno o'
+        ' WHERE o.aluno_id = r.aluno_id AND o.caderno_id = r.caderno_id'
+        ' AND COALESCE(o.ano_avaliacao, 0) = COALESCE(r.ano_avaliacao, 0)'
+        " AND COALESCE(o.periodo_avaliacao, '') = COALESCE(r.periodo_avaliacao, '')"
+        ' AND o.id < r.id)'
+    ))]
+    tabelas = set(sa.inspect(conexao).get_table_names())
+    for inicio in range(0, len(duplicadas), LOTE):
+        ids = duplicadas[inicio:inicio + LOTE]
+        for tabela in DEPENDENTES:
+            if tabela in tabelas:
+                conexao.execute(
+                    sa.text(f'DELETE FROM {tabela} WHERE resultado_id IN :ids').bindparams(sa.bindparam('ids', expanding=True)),
+                    {'ids': ids}
+                )
+        conexao.execute(
+            sa.text('DELETE FROM resultado_aluno WHERE id IN :ids').bindparams(sa.bindparam('ids', expanding=True)),
+            {'ids': ids}
+        )
+    return len(duplicadas)
+
+
+def upgrade():
+    removidas = _remover_duplicatas()
+    if removidas:
+        print(f'⚠️  {removidas} resultado(s) duplicado(s) removido(s); rode `flask recalcular-resultados`')
+
+    _criar_indice('uq_resultado_aluno_chave', CHAVE, unico=True)
+    if 'ix_resultado_aluno_aluno_caderno_periodo' in _indices_existentes('resultado_aluno'):
+        op.drop_index('ix_resultado_aluno_aluno_caderno_periodo', table_name='resultado_aluno')
+
+
+def downgrade():
+    _criar_indice('ix_resultado_aluno_aluno_caderno_periodo', CHAVE)
+    if 'uq_resultado_aluno_chave' in _indices_existentes('resultado_aluno'):
+        op.drop_index('uq_resultado_aluno_chave', table_name='resultado_aluno')
@@ -0,0 +1,36 @@
+"""respostas compactas
+
+Colunas das respostas compactas em resultado_aluno (ver respostas_compactas.py): marcações
+(um caractere por questão), bitmap de acertos e layout dos blocos da correção. Os resultados
+existentes ficam com as colunas NULL e continuam lidos de resposta_aluno; depois da migração,
+`flask compactar-respostas` converte esses resultados (e `--remover-linhas` apaga as linhas antigas).
+
+Revision ID: 9b4f1e6c2d80
+Revises: 5d2e9c41b7a3
+Create Date: 2026-10-18 17:40:52.602114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b4f1e6c2d80'
+down_revision = '5d2e9c41b7a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('resultado_aluno', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('respostas_compactas', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('acertos_compactos', sa.LargeBinary(), nullable=True))
+        batch_op.add_column(sa.Column('layout_respostas', sa.Text(), nullable=True))
+
+
+def downgrade():
+    # Resultados gravados só na forma compacta perdem as respostas por questão (os totais são mantidos)
+    with op.batch_alter_table('resultado_aluno', schema=None) as batch_op:
+        batch_op.drop_column('layout_respostas')
+        batch_op.drop_column('acertos_compactos')
+        batch_op.drop_column('respostas_compactas')
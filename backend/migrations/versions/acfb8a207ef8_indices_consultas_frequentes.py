@@ -0,0 +1,75 @@
+"""indices das consultas frequentes
+
+Índices compostos desenhados a partir das consultas do app (mesmos nomes declarados em database.py):
+- resultado_aluno: resultado de um aluno em um caderno/período; resultados de um caderno em um
+  período; resultados do usuário em um período
+- resposta_aluno: respostas de um resultado (na ordem bloco/questão) e por questão
+- bloco_questao / bloco_caderno: itens de um bloco e blocos de um caderno, já na ordem
+- questao: por usuário e habilidade, por escola e ano, e listagem paginada do usuário
+- habilidade: por componente e ano, e ordem da listagem paginada (código, id)
+- aluno, turma, alternativa, caderno: chaves estrangeiras usadas nos filtros
+
+Bancos criados depois desta versão já recebem os índices pelo db.create_all(); por isso cada
+índice só é criado se ainda não existir. No PostgreSQL a criação é CONCURRENTLY, sem bloquear
+gravações durante a migração.
+
+Revision ID: acfb8a207ef8
+Revises:
+Create Date: 2026-10-18 10:12:41.503318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'acfb8a207ef8'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+INDICES = [
+    ('ix_resultado_aluno_aluno_caderno_periodo', 'resultado_aluno',
+     ['aluno_id', 'caderno_id', 'ano_avaliacao', 'periodo_avaliacao']),
+    ('ix_resultado_aluno_caderno_periodo', 'resultado_aluno', ['caderno_id', 'ano_avaliacao', 'periodo_avaliacao']),
+    ('ix_resultado_aluno_user_periodo', 'resultado_aluno', ['user_id', 'ano_avaliacao', 'periodo_avaliacao']),
+    ('ix_resposta_aluno_resultado_bloco_questao', 'resposta_aluno', ['resultado_id', 'bloco_id', 'questao_ordem']),
+    ('ix_resposta_aluno_questao_id', 'resposta_aluno', ['questao_id']),
+    ('ix_bloco_questao_bloco_ordem', 'bloco_questao', ['bloco_id', 'ordem']),
+    ('ix_bloco_questao_questao_id', 'bloco_questao', ['questao_id']),
+    ('ix_bloco_caderno_caderno_ordem', 'bloco_caderno', ['caderno_id', 'ordem']),
+    ('ix_questao_user_habilidade', 'questao', ['user_id', 'habilidade_id']),
+    ('ix_questao_user_paginacao', 'questao', ['user_id', 'id']),
+    ('ix_questao_escola_ano', 'questao', ['escola_id', 'ano']),
+    ('ix_alternativa_questao_id', 'alternativa', ['questao_id']),
+    ('ix_habilidade_componente_ano', 'habilidade', ['componente', 'ano']),
+    ('ix_habilidade_codigo_id', 'habilidade', ['codigo', 'id']),
+    ('ix_aluno_turma_id', 'aluno', ['turma_id']),
+    ('ix_aluno_escola_id', 'aluno', ['escola_id']),
+    ('ix_aluno_user_id', 'aluno', ['user_id']),
+    ('ix_turma_escola_id', 'turma', ['escola_id']),
+    ('ix_turma_user_id', 'turma', ['user_id']),
+    ('ix_caderno_user_paginacao', 'caderno', ['user_id', 'id']),
+]
+
+
+def _indices_existentes(tabela):
+    return {indice['name'] for indice in sa.inspect(op.get_bind()).get_indexes(tabela)}
+
+
+def upgrade():
+    postgresql = op.get_bind().dialect.name == 'postgresql'
+    for nome, tabela, colunas in INDICES:
+        if nome in _indices_existentes(tabela):
+            continue
+        if postgresql:
+            with op.get_context().autocommit_block():
+                op.create_index(nome, tabela, colunas, postgresql_concurrently=True)
+        else:
+            op.create_index(nome, tabela, colunas)
+
+
+def downgrade():
+    for nome, tabela, _ in reversed(INDICES):
+        if nome in _indices_existentes(tabela):
+            op.drop_index(nome, table_name=tabela)
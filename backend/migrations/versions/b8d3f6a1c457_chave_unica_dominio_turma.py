@@ -0,0 +1,91 @@
+"""chave unica do dominio por turma
+
+Índice único uq_dominio_habilidade_turma_chave em (turma, habilidade, COALESCE(ano, 0), COALESCE(período, '')),
+alvo do upsert que soma as diferenças de cada gravação (DominioHabilidadeTurma.somar). Sem ele, duas primeiras
+gravações simultâneas da mesma chave criavam duas linhas e os incrementos seguintes somavam nas duas.
+
+Antes de criar o índice, as turmas com chaves repetidas têm o consolidado refeito a partir de
+resultado_habilidade (a mesma soma de recalcular_dominio_turmas). Bancos em que a tabela ainda não existe
+a recebem já com o índice pelo db.create_all().
+
+Revision ID: b8d3f6a1c457
+Revises: e5a1c9d7b302
+Create Date: 2026-10-18 22:05:48.913027
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8d3f6a1c457'
+down_revision = 'e5a1c9d7b302'
+branch_labels = None
+depends_on = None
+
+TABELA = 'dominio_habilidade_turma'
+INDICE = 'uq_dominio_habilidade_turma_chave'
+CHAVE = [
+    sa.column('turma_id'),
+    sa.column('habilidade_id'),
+    sa.func.coalesce(sa.column('ano_avaliacao'), sa.literal_column('0')),
+    sa.func.coalesce(sa.column('periodo_avaliacao'), sa.literal_column("''")),
+]
+
+
+def _indice_existe(nome):
+    conexao = op.get_bind()
+    if conexao.dialect.name == 'sqlite':
+        # O inspetor do SQLite não reflete índices com expressões
+        return conexao.execute(
+            sa.text("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = :nome"), {'nome': nome}
+        ).first() is not None
+    return nome in {indice['name'] for indice in sa.inspect(conexao).get_indexes(TABELA)}
+
+
+def _refazer_turmas_duplicadas():
+    """Refaz o consolidado das turmas com chaves repetidas; retorna quantas turmas foram refeitas"""
+    conexao = op.get_bind()
+    turmas = [linha[0] for linha in conexao.execute(sa.text(
+        f'SELECT DISTINCT turma_id FROM {TABELA}'
+        " GROUP BY turma_id, habilidade_id, COALESCE(ano_avaliacao, 0), COALESCE(periodo_avaliacao, '')"
+        ' HAVING COUNT(*) > 1'
+    ))]
+    if not turmas:
+        return 0
+    conexao.execute(
+        sa.text(f'DELETE FROM {TABELA} WHERE turma_id IN :turmas').bindparams(sa.bindparam('turmas', expanding=True)),
+        {'turmas': turmas}
+    )
+    conexao.execute(
+        sa.text(
+            f'INSERT INTO {TABELA} (turma_id, habilidade_id, ano_avaliacao, periodo_avaliacao, tentativas, acertos)'
+            ' SELECT a.turma_id, rh.habilidade_id, r.ano_avaliacao, r.periodo_avaliacao, SUM(rh.tentativas), SUM(rh.acertos)'
+            ' FROM resultado_habilidade rh'
+            ' JOIN resultado_aluno r ON rh.resultado_id = r.id'
+            ' JOIN aluno a ON r.aluno_id = a.id'
+            ' WHERE a.turma_id IN :turmas AND r.fez_prova = :fez_prova'
+            ' GROUP BY a.turma_id, rh.habilidade_id, r.ano_avaliacao, r.periodo_avaliacao'
+        ).bindparams(sa.bindparam('turmas', expanding=True), sa.bindparam('fez_prova', type_=sa.Boolean)),
+        {'turmas': turmas, 'fez_prova': True}
+    )
+    return len(turmas)
+
+
+def upgrade():
+    if TABELA not in sa.inspect(op.get_bind()).get_table_names() or _indice_existe(INDICE):
+        return
+    refeitas = _refazer_turmas_duplicadas()
+    if refeitas:
+        print(f'♻️ Domínio de {refeitas} turma(s) com linhas repetidas refeito a partir dos resultados')
+
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.create_index(INDICE, TABELA, CHAVE, unique=True, postgresql_concurrently=True)
+    else:
+        op.create_index(INDICE, TABELA, CHAVE, unique=True)
+
+
+def downgrade():
+    if TABELA in sa.inspect(op.get_bind()).get_table_names() and _indice_existe(INDICE):
+        op.drop_index(INDICE, table_name=TABELA)
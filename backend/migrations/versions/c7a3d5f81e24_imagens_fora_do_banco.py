@@ -0,0 +1,95 @@
+"""imagens fora do banco
+
+Coluna questao.imagem_hash e migração das imagens em base64 para o armazenamento de imagens
+(ver armazenamento_imagens.py): cada imagem é decodificada, gravada pelo hash do conteúdo
+(imagens repetidas viram um único arquivo) e a coluna imagem fica NULL. URLs externas continuam
+em imagem; valores que não são uma imagem válida ficam como estão e são listados no final.
+Depois da migração, o espaço da tabela questao só é devolvido ao disco com VACUUM (PostgreSQL/SQLite)
+ou OPTIMIZE TABLE questao (MySQL).
+
+Revision ID: c7a3d5f81e24
+Revises: 9b4f1e6c2d80
+Create Date: 2026-10-18 19:12:37.418206
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7a3d5f81e24'
+down_revision = '9b4f1e6c2d80'
+branch_labels = None
+depends_on = None
+
+TAMANHO_LOTE = 200  # Questões lidas por consulta (cada uma traz a imagem inteira)
+
+questao = sa.table(
+    'questao',
+    sa.column('id', sa.Integer),
+    sa.column('imagem', sa.Text),
+    sa.column('imagem_hash', sa.String),
+)
+
+
+def _em_lotes(conexao, filtro):
+    ultimo_id = 0
+    while True:
+        linhas = conexao.execute(
+            sa.select(questao.c.id, questao.c.imagem, questao.c.imagem_hash)
+            .where(filtro, questao.c.id > ultimo_id)
+            .order_by(questao.c.id).limit(TAMANHO_LOTE)
+        ).all()
+        if not linhas:
+            break
+        yield linhas
+        ultimo_id = linhas[-1].id
+
+
+def upgrade():
+    from armazenamento_imagens import guardar_imagem, decodificar_base64, eh_url, ImagemInvalida
+
+    with op.batch_alter_table('questao', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('imagem_hash', sa.String(length=64), nullable=True))
+        batch_op.create_index(batch_op.f('ix_questao_imagem_hash'), ['imagem_hash'], unique=False)
+
+    conexao = op.get_bind()
+    movidas, tamanho, invalidas = 0, 0, []
+    for linhas in _em_lotes(conexao, questao.c.imagem.isnot(None)):
+        for linha in linhas:
+            if not linha.imagem.strip() or eh_url(linha.imagem):
+                continue
+            try:
+                chave = guardar_imagem(decodificar_base64(linha.imagem))
+            except ImagemInvalida as e:
+                invalidas.append((linha.id, str(e)))
+                continue
+            conexao.execute(
+                questao.update().where(questao.c.id == linha.id).values(imagem=None, imagem_hash=chave)
+            )
+            movidas += 1
+            tamanho += len(linha.imagem)
+
+    print(f"✅ {movidas} imagem(ns) movida(s) para o armazenamento ({tamanho / (1024 * 1024):.1f} MB de base64 fora do banco)")
+    for questao_id, erro in invalidas:
+        print(f"⚠️ Questão {questao_id}: {erro} (mantida na coluna imagem)")
+
+
+def downgrade():
+    from armazenamento_imagens import ler_imagem, tipo_da_imagem
+    import base64
+
+    # Volta as imagens guardadas para a coluna imagem (data URI); os arquivos ficam no armazenamento
+    conexao = op.get_bind()
+    for linhas in _em_lotes(conexao, questao.c.imagem_hash.isnot(None)):
+        for linha in linhas:
+            conteudo = ler_imagem(linha.imagem_hash)
+            conexao.execute(
+                questao.update().where(questao.c.id == linha.id).values(
+                    imagem=f"data:{tipo_da_imagem(conteudo)};base64,{base64.b64encode(conteudo).decode('ascii')}"
+                )
+            )
+
+    with op.batch_alter_table('questao', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_questao_imagem_hash'))
+        batch_op.drop_column('imagem_hash')
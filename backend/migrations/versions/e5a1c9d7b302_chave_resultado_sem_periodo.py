@@ -0,0 +1,99 @@
+"""chave de resultado_aluno com ano e periodo nulos
+
+O índice único uq_resultado_aluno_chave não impedia duplicatas de resultados sem ano ou período
+(NULLs são distintos em índices únicos), caso dos lançamentos por scan. Ele é substituído por
+uq_resultado_aluno_chave_periodo, com COALESCE(ano, 0) e COALESCE(período, ''), que é o alvo do upsert
+(gravacao_resultados.py). No MySQL exige a versão 8.0.13+ (índices com expressões).
+
+Antes de criar o índice, as duplicatas com ano/período nulos são removidas mantendo o resultado mais
+antigo, como em 5d2e9c41b7a3. Depois da migração, rodar `flask recalcular-resultados` se alguma
+duplicata for removida.
+
+Revision ID: e5a1c9d7b302
+Revises: c7a3d5f81e24
+Create Date: 2026-10-18 21:40:12.604518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a1c9d7b302'
+down_revision = 'c7a3d5f81e24'
+branch_labels = None
+depends_on = None
+
+CHAVE = ['aluno_id', 'caderno_id', 'ano_avaliacao', 'periodo_avaliacao']
+CHAVE_COALESCE = [
+    sa.column('aluno_id'),
+    sa.column('caderno_id'),
+    sa.func.coalesce(sa.column('ano_avaliacao'), sa.literal_column('0')),
+    sa.func.coalesce(sa.column('periodo_avaliacao'), sa.literal_column("''")),
+]
+DEPENDENTES = ['resposta_aluno', 'resultado_componente', 'resultado_habilidade']
+LOTE = 1000
+
+
+def _indice_existe(nome):
+    conexao = op.get_bind()
+    if conexao.dialect.name == 'sqlite':
+        # O inspetor do SQLite não reflete índices com expressões
+        return conexao.execute(
+            sa.text("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = :nome"), {'nome': nome}
+        ).first() is not None
+    return nome in {indice['name'] for indice in sa.inspect(conexao).get_indexes('resultado_aluno')}
+
+
+def _criar_indice(nome, colunas, unico=False):
+    if _indice_existe(nome):
+        return
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.create_index(nome, 'resultado_aluno', colunas, unique=unico, postgresql_concurrently=True)
+    else:
+        op.create_index(nome, 'resultado_aluno', colunas, unique=unico)
+
+
+def _remover_duplicatas():
+    """Apaga as cópias (id maior) de resultados com a mesma chave, com ano/período NULL contando como iguais"""
+    conexao = op.get_bind()
+    duplicadas = [linha[0] for linha in conexao.execute(sa.text(
+        'SELECT r.id FROM resultado_aluno r WHERE EXISTS ('
+        ' SELECT 1 FROM resultado_aluno o'
+        ' WHERE o.aluno_id = r.aluno_id AND o.caderno_id = r.caderno_id'
+        ' AND COALESCE(o.ano_avaliacao, 0) = COALESCE(r.ano_avaliacao, 0)'
+        " AND COALESCE(o.periodo_avaliacao, '') = COALESCE(r.periodo_avaliacao, '')"
+        ' AND o.id < r.id)'
+    ))]
+    tabelas = set(sa.inspect(conexao).get_table_names())
+    for inicio in range(0, len(duplicadas), LOTE):
+        ids = duplicadas[inicio:inicio + LOTE]
+        for tabela in DEPENDENTES:
+            if tabela in tabelas:
+                conexao.execute(
+                    sa.text(f'DELETE FROM {tabela} WHERE resultado_id IN :ids').bindparams(sa.bindparam('ids', expanding=True)),
+                    {'ids': ids}
+                )
+        conexao.execute(
+            sa.text('DELETE FROM resultado_aluno WHERE id IN :ids').bindparams(sa.bindparam('ids', expanding=True)),
+            {'ids': ids}
+        )
+    return len(duplicadas)
+
+
+def upgrade():
+    removidas = _remover_duplicatas()
+    if removidas:
+        print(f'⚠️  {removidas} resultado(s) duplicado(s) sem ano/período removido(s); rode `flask recalcular-resultados`')
+
+    # O novo índice é criado antes de apagar o antigo (no MySQL um deles sustenta a chave estrangeira de aluno_id)
+    _criar_indice('uq_resultado_aluno_chave_periodo', CHAVE_COALESCE, unico=True)
+    if _indice_existe('uq_resultado_aluno_chave'):
+        op.drop_index('uq_resultado_aluno_chave', table_name='resultado_aluno')
+
+
+def downgrade():
+    _criar_indice('uq_resultado_aluno_chave', CHAVE, unico=True)
+    if _indice_existe('uq_resultado_aluno_chave_periodo'):
+        op.drop_index('uq_resultado_aluno_chave_periodo', table_name='resultado_aluno')
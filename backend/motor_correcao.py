@@ -0,0 +1,138 @@
+"""
+Motor de correção vetorizado.
+
+As respostas de uma turma inteira são convertidas em uma matriz uint8 (alunos x questões do caderno,
+na ordem bloco/questão do gabarito compilado) e corrigidas em uma única operação NumPy.
+"""
+import numpy as np
+
+# Códigos das marcações na matriz de respostas
+CODIGO_BRANCO = 0
+CODIGO_MULTIPLA = 6  # Gravado como 'X'
+CODIGO_AUSENTE = 255  # Questão não enviada: não é gravada nem contada
+CODIGO_SEM_GABARITO = 0  # No vetor do gabarito: questão sem letra correta (nunca conta acerto)
+LETRAS = ['A', 'B', 'C', 'D', 'E']
+
+_CODIGOS = {letra: indice + 1 for indice, letra in enumerate(LETRAS)}
+_CODIGOS.update({None: CODIGO_BRANCO, '': CODIGO_BRANCO, 'Blank': CODIGO_BRANCO, 'X': CODIGO_MULTIPLA})
+_MARCACOES = {codigo: letra for letra, codigo in _CODIGOS.items() if letra not in (None, 'Blank')}
+
+
+def codificar_resposta(resposta):
+    """Converte uma marcação ('A'..'E', '', 'Blank', 'X', 'Multiple:...') no código da matriz"""
+    return _CODIGOS.get(resposta, CODIGO_MULTIPLA)
+
+
+def codificar_gabarito(letra):
+    """Converte a letra correta no código do vetor do gabarito (apenas 'A'..'E' são válidas)"""
+    return _CODIGOS[letra] if letra in LETRAS else CODIGO_SEM_GABARITO
+
+
+def decodificar_resposta(codigo):
+    """Converte um código da matriz na marcação das respostas ('A'..'E', '' ou 'X')"""
+    return _MARCACOES.get(int(codigo))
+
+
+def _preencher_por_chave(gabarito, linha, respostas):
+    """Formato do lança-resultado: {"<indice_bloco>-<questao>": "A", ...}"""
+    for coluna, (bloco, ordem) in enumerate(gabarito.colunas):
+        chave = f"{bloco.indice}-{ordem}"
+        if chave in respostas:
+            linha[coluna] = codificar_resposta(respostas[chave])
+
+
+def _preencher_por_bloco(gabarito, linha, respostas_blocos):
+    """Formato da correção automática: [["A", "Blank", ...], [...]] (uma lista por bloco)"""
+    for bloco in gabarito.blocos:
+        if bloco.indice >= len(respostas_blocos):
+            break
+        respostas_bloco = list(respostas_blocos[bloco.indice])[:bloco.total_questoes]
+        inicio = gabarito.inicio_blocos[bloco.indice]
+        linha[inicio:inicio + len(respostas_bloco)] = [codificar_resposta(r) for r in respostas_bloco]
+
+
+def matriz_de_respostas(gabarito, lista_respostas):
+    """
+    Monta a matriz alunos x questões. Cada aluno pode vir no formato do lança-resultado (dict)
+    ou no formato da correção automática (lista de respostas por bloco).
+    """
+    matriz = np.full((len(lista_respostas), len(gabarito.colunas)), CODIGO_AUSENTE, dtype=np.uint8)
+    for indice, respostas in enumerate(lista_respostas):
+        if isinstance(respostas, dict):
+            _preencher_por_chave(gabarito, matriz[indice], respostas)
+        elif respostas:
+            _preencher_por_bloco(gabarito, matriz[indice], respostas)
+    return matriz
+
+
+class CorrecaoTurma:
+    """Resultado da correção de uma matriz de respostas"""
+
+    def __init__(self, gabarito, matriz):
+        self.gabarito = gabarito
+        self.matriz = matriz
+        self.respondidas = matriz != CODIGO_AUSENTE
+        self.acertou = (matriz == gabarito.chave) & (gabarito.chave != CODIGO_SEM_GABARITO)
+
+        self.total_questoes = self.respondidas.sum(axis=1)
+        self.acertos = self.acertou.sum(axis=1)
+
+        # Somas acumuladas por coluna: acertos de cada bloco = acumulado no fim - acumulado no início
+        acumulado = np.zeros((matriz.shape[0], matriz.shape[1] + 1), dtype=np.int32)
+        np.cumsum(self.acertou, axis=1, out=acumulado[:, 1:])
+        limites = np.append(gabarito.inicio_blocos, matriz.shape[1])
+        self.acertos_por_bloco = acumulado[:, limites[1:]] - acumulado[:, limites[:-1]]
+
+        # Agrupar blocos por componente com uma multiplicação pela matriz bloco x componente
+        self.componentes = list(dict.fromkeys(b.componente for b in gabarito.blocos))
+        agrupamento = np.zeros((len(gabarito.blocos), len(self.componentes)), dtype=np.int32)
+        for bloco in gabarito.blocos:
+            agrupamento[bloco.indice, self.componentes.index(bloco.componente)] = 1
+        self.acertos_por_componente = self.acertos_por_bloco @ agrupamento
+
+    @property
+    def percentuais(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.total_questoes > 0, self.acertos / self.total_questoes * 100, 0.0)
+
+    def respostas_do_aluno(self, linha):
+        """
+        Itera sobre as questões enviadas de um aluno:
+        (bloco, questao_ordem, questao_id, resposta_marcada, resposta_correta, acertou)
+        """
+        for coluna in np.flatnonzero(self.respondidas[linha]):
+            bloco, ordem = self.gabarito.colunas[coluna]
+            item = self.gabarito.item(bloco.ordem, ordem)
+            yield (
+                bloco,
+                ordem,
+                item.questao_id if item else None,
+                decodificar_resposta(self.matriz[linha, coluna]),
+                item.resposta_correta if item else None,
+                bool(self.acertou[linha, coluna])
+            )
+
+    def resumo_do_aluno(self, linha):
+        """Totais do aluno por bloco e por componente, no formato das respostas JSON"""
+        total = int(self.total_questoes[linha])
+        acertos = int(self.acertos[linha])
+        return {
+            'total_questoes': total,
+            'total_acertos': acertos,
+            'percentual_acertos': round(acertos / total * 100, 1) if total > 0 else 0,
+            'por_bloco': [{
+                'bloco_id': bloco.id,
+                'ordem': bloco.ordem,
+                'componente': bloco.componente,
+                'acertos': int(self.acertos_por_bloco[linha, bloco.indice])
+            } for bloco in self.gabarito.blocos],
+            'por_componente': {
+                componente: int(self.acertos_por_componente[linha, indice])
+                for indice, componente in enumerate(self.componentes)
+            }
+        }
+
+
+def corrigir_matriz(gabarito, matriz):
+    """Corrige todas as linhas da matriz contra o gabarito compilado em uma única passada"""
+    return CorrecaoTurma(gabarito, np.asarray(matriz, dtype=np.uint8))
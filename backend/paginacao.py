@@ -0,0 +1,94 @@
+"""
+Paginação por cursor (keyset) e filtros das listagens (questões, cadernos, habilidades, resultados).
+
+Cada listagem tem uma ordem estável terminada pela chave primária; o cursor é o valor dessa ordem
+no último item da página (JSON em base64 url-safe) e a página seguinte começa com
+`(colunas) > cursor`, que o banco resolve pelo índice sem percorrer as páginas anteriores
+(diferente de OFFSET). A paginação é opcional: sem `limite` nem `cursor` a listagem vem inteira,
+como antes; o total só é contado quando pedido (`total=1`).
+"""
+import json
+import base64
+
+from database import db
+
+LIMITE_PADRAO = 50
+LIMITE_MAXIMO = 500
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def codificar_cursor(valores):
+    texto = json.dumps(list(valores), separators=(',', ':'), ensure_ascii=False)
+    return base64.urlsafe_b64encode(texto.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    try:
+        texto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        valores = json.loads(texto)
+    except (ValueError, UnicodeDecodeError):
+        raise CursorInvalido('Cursor inválido')
+    if not isinstance(valores, list) or not valores:
+        raise CursorInvalido('Cursor inválido')
+    return valores
+
+
+def parametros_paginacao(args):
+    """(limite ou None, valores do cursor ou None, contar total?) a partir da query string"""
+    cursor = args.get('cursor') or None
+    limite = args.get('limite') or args.get('per_page')
+    if limite is None and cursor is None:
+        return None, None, args.get('total') in ('1', 'true')
+    try:
+        limite = int(limite) if limite is not None else LIMITE_PADRAO
+    except ValueError:
+        raise CursorInvalido('Limite inválido')
+    limite = max(1, min(limite, LIMITE_MAXIMO))
+    return limite, decodificar_cursor(cursor) if cursor else None, args.get('total') in ('1', 'true')
+
+
+def _escapar_like(texto):
+    return texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def filtro_prefixo(coluna, texto):
+    """coluna começa com `texto` (sem diferenciar maiúsculas; % e _ do texto são literais)"""
+    return coluna.ilike(f'{_escapar_like(texto)}%', escape='\\')
+
+
+def filtro_contem(coluna, texto):
+    """coluna contém `texto` em qualquer posição (sem diferenciar maiúsculas; não usa índice)"""
+    return coluna.ilike(f'%{_escapar_like(texto)}%', escape='\\')
+
+
+def paginar(query, colunas, limite=None, cursor=None, decrescente=False):
+    """
+    Ordena a consulta por `colunas` e aplica o cursor e o limite.
+    Retorna (linhas, tem_mais); o próximo cursor vem de `proximo_cursor(...)` com a última linha.
+    """
+    if cursor is not None:
+        if len(cursor) != len(colunas):
+            raise CursorInvalido('Cursor inválido')
+        chave = db.tuple_(*colunas) if len(colunas) > 1 else colunas[0]
+        valor = db.tuple_(*cursor) if len(colunas) > 1 else cursor[0]
+        query = query.filter(chave < valor if decrescente else chave > valor)
+    query = query.order_by(*[coluna.desc() if decrescente else coluna for coluna in colunas])
+    if limite is None:
+        return query.all(), False
+    linhas = query.limit(limite + 1).all()
+    return linhas[:limite], len(linhas) > limite
+
+
+def dados_paginacao(limite, tem_mais, chave_ultimo=None, total=None):
+    """Bloco 'paginacao' da resposta (o cursor só existe quando há próxima página)"""
+    dados = {
+        'limite': limite,
+        'tem_mais': tem_mais,
+        'proximo_cursor': codificar_cursor(chave_ultimo) if tem_mais and chave_ultimo is not None else None
+    }
+    if total is not None:
+        dados['total'] = total
+    return dados
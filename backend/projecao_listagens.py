@@ -0,0 +1,72 @@
+"""
+Projeção das listagens (questões, habilidades, cadernos): só as colunas exibidas saem do banco.
+
+Cada listagem declara os campos da resposta, com as colunas (e relações) de que cada um precisa.
+A consulta carrega só essas colunas (load_only; as demais, como textos longos que a listagem não mostra,
+ficam fora do SELECT) e o JSON traz só esses campos. Sem `campos=`/`fields=` vêm os campos padrão
+da listagem (os que as telas usam); com `fields=id,codigo` vêm só os pedidos. As rotas de detalhe
+(GET /api/<recurso>/<id>) continuam devolvendo a linha inteira.
+"""
+from collections import namedtuple
+from operator import attrgetter
+
+from database import db
+
+
+class CampoInvalido(ValueError):
+    pass
+
+
+# colunas: carregadas quando o campo é pedido; valor: função(objeto) -> valor no JSON; relacoes: pré-carregadas (selectinload)
+# derivado (opcional): função(objeto) calculada uma vez por linha e compartilhada pelos campos que a usam;
+# nesse caso valor recebe o resultado dela em vez do objeto
+Campo = namedtuple('Campo', 'colunas valor relacoes derivado', defaults=(None,))
+
+
+def coluna(atributo):
+    """Campo que é uma coluna do modelo, devolvida como está"""
+    return Campo((atributo,), attrgetter(atributo.key), ())
+
+
+class Projecao:
+    def __init__(self, campos, padrao=None, chave=()):
+        self.campos = campos  # {nome: Campo}, na ordem da resposta
+        self.padrao = list(padrao or campos)
+        self.chave = list(chave)  # Colunas sempre carregadas (chave primária e ordem do cursor)
+
+    def campos_pedidos(self, args):
+        """Nomes dos campos pedidos na query string (padrão da listagem, se nenhum)"""
+        texto = args.get('campos') or args.get('fields')
+        if not texto:
+            return self.padrao
+        nomes = list(dict.fromkeys(nome.strip() for nome in texto.split(',') if nome.strip()))
+        invalidos = [nome for nome in nomes if nome not in self.campos]
+        if invalidos or not nomes:
+            raise CampoInvalido(
+                f"Campo(s) inválido(s): {', '.join(invalidos) or texto}. Disponíveis: {', '.join(self.campos)}"
+            )
+        return nomes
+
+    def opcoes(self, nomes):
+        """Opções da consulta (load_only + selectinload) para carregar só o necessário aos campos"""
+        colunas = list(self.chave)
+        relacoes = []
+        for nome in nomes:
+            colunas.extend(self.campos[nome].colunas)
+            relacoes.extend(self.campos[nome].relacoes)
+        colunas = {atributo.key: atributo for atributo in colunas}.values()
+        relacoes = {relacao.key: relacao for relacao in relacoes}.values()
+        return [db.load_only(*colunas)] + [db.selectinload(relacao) for relacao in relacoes]
+
+    def serializar(self, objeto, nomes):
+        derivados = {}  # Valores derivados desta linha, por função
+        resultado = {}
+        for nome in nomes:
+            campo = self.campos[nome]
+            if campo.derivado is None:
+                resultado[nome] = campo.valor(objeto)
+                continue
+            if campo.derivado not in derivados:
+                derivados[campo.derivado] = campo.derivado(objeto)
+            resultado[nome] = campo.valor(derivados[campo.derivado])
+        return resultado
@@ -0,0 +1,80 @@
+"""
+QR Codes das folhas de resposta desenhados como vetor.
+
+A matriz de módulos gerada pelo `qrcode` é desenhada diretamente no canvas do ReportLab como
+retângulos (sem gerar e decodificar PNG). As matrizes ficam em cache pelo conteúdo do QR Code,
+então gerar novamente os cartões de uma turma não recalcula os códigos.
+"""
+import json
+import hashlib
+from functools import lru_cache
+
+import qrcode
+from reportlab.platypus.flowables import Flowable
+
+LIMITE_CACHE = 4096  # Matrizes de QR Code em cache (uma por aluno/caderno)
+
+
+def identificador_gabarito(caderno_id, aluno_id):
+    """ID do gabarito (8 caracteres) estável para o par caderno/aluno: reimpressões geram o mesmo QR Code"""
+    return hashlib.sha1(f"{caderno_id}-{aluno_id}".encode()).hexdigest()[:8].upper()
+
+
+def conteudo_qr(dados_qr):
+    """Serializa os dados do QR Code no mesmo formato JSON compacto lido pelo scanner"""
+    return json.dumps(dados_qr, separators=(',', ':'))
+
+
+@lru_cache(maxsize=LIMITE_CACHE)
+def matriz_qr(conteudo, borda=2):
+    """Matriz de módulos (tupla de linhas de bool, com a borda) do QR Code de um conteúdo"""
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_M,
+        border=borda,
+    )
+    qr.add_data(conteudo)
+    qr.make(fit=True)
+    return tuple(tuple(linha) for linha in qr.get_matrix())
+
+
+def desenhar_qr(canvas, dados_qr, x, y, tamanho, borda=2):
+    """Desenha o QR Code (fundo branco + módulos pretos) com o canto inferior esquerdo em (x, y)"""
+    matriz = matriz_qr(conteudo_qr(dados_qr), borda)
+    modulo = tamanho / len(matriz)
+
+    canvas.saveState()
+    canvas.setFillColorRGB(1, 1, 1)
+    canvas.rect(x, y, tamanho, tamanho, stroke=0, fill=1)
+
+    # Módulos pretos consecutivos de uma linha viram um único retângulo
+    caminho = canvas.beginPath()
+    for indice_linha, linha in enumerate(matriz):
+        topo = y + tamanho - (indice_linha + 1) * modulo
+        coluna = 0
+        while coluna < len(linha):
+            if not linha[coluna]:
+                coluna += 1
+                continue
+            inicio = coluna
+            while coluna < len(linha) and linha[coluna]:
+                coluna += 1
+            caminho.rect(x + inicio * modulo, topo, (coluna - inicio) * modulo, modulo)
+    canvas.setFillColorRGB(0, 0, 0)
+    canvas.drawPath(caminho, stroke=0, fill=1)
+    canvas.restoreState()
+
+
+class QRCodeVetorial(Flowable):
+    """Flowable do platypus que desenha o QR Code como vetor (substitui Image(png_do_qr))"""
+
+    def __init__(self, dados_qr, tamanho, borda=4):
+        super().__init__()
+        self.dados_qr = dados_qr
+        self.tamanho = tamanho
+        self.borda = borda
+        self.width = tamanho
+        self.height = tamanho
+
+    def draw(self):
+        desenhar_qr(self.canv, self.dados_qr, 0, 0, self.tamanho, self.borda)
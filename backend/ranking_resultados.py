@@ -0,0 +1,211 @@
+"""
+Rankings pré-calculados de escolas, turmas e alunos por ano, período, série e componente.
+
+As posições ficam em PosicaoRanking, agrupadas em GrupoRanking (usuário, ano, período, série):
+- cada gravação de resultados incrementa GrupoRanking.versao dos grupos dos alunos afetados
+  (via atualizar_agregados_resultados), sem recalcular nada na hora do lançamento;
+- na primeira consulta de um grupo desatualizado (ou no comando `flask recalcular-rankings`) as
+  posições do grupo são refeitas: somas por escola/turma/aluno a partir de DesempenhoAlunoPeriodo
+  e ordenação vetorizada com NumPy (empates recebem a mesma posição: 1, 2, 2, 4...);
+- top-N e "posição de X" são leituras por índice em PosicaoRanking.
+"""
+from datetime import datetime
+
+import numpy as np
+
+from database import db, Aluno, Turma, Escola, DesempenhoAlunoPeriodo, GrupoRanking, PosicaoRanking
+
+ESCOPOS = ('escola', 'turma', 'aluno')
+COMPONENTE_GERAL = 'Geral'  # Todos os componentes somados
+
+
+def marcar_rankings_alterados(grupos):
+    """Incrementa a versão dos grupos (user_id, ano, período, série) na transação corrente"""
+    for user_id, ano, periodo, serie in sorted(grupos, key=str):
+        if ano is None or periodo is None or serie is None:
+            continue  # Resultados sem ano/período não entram nos rankings
+        GrupoRanking.incrementar(user_id, ano, periodo, serie)
+
+
+def _coluna_referencia(escopo):
+    return {'aluno': Aluno.id, 'turma': Aluno.turma_id, 'escola': Turma.escola_id}[escopo]
+
+
+def _posicoes(percentuais):
+    """Posição de cada valor na ordem decrescente (empates com a mesma posição)"""
+    ordem = np.argsort(-percentuais, kind='stable')
+    ordenados = -percentuais[ordem]
+    posicoes = np.empty(len(percentuais), dtype=np.int64)
+    posicoes[ordem] = np.searchsorted(ordenados, ordenados, side='left') + 1
+    return posicoes
+
+
+def _somas(grupo, escopo):
+    """{componente: [(referencia_id, alunos, total_questoes, acertos)]} do grupo no escopo, incluindo 'Geral'"""
+    referencia = _coluna_referencia(escopo)
+
+    def consulta(*colunas):
+        return db.session.query(
+            *colunas,
+            referencia,
+            db.func.count(db.distinct(Aluno.id)),
+            db.func.sum(DesempenhoAlunoPeriodo.total_questoes),
+            db.func.sum(DesempenhoAlunoPeriodo.acertos)
+        ).select_from(DesempenhoAlunoPeriodo).join(
+            Aluno, DesempenhoAlunoPeriodo.aluno_id == Aluno.id
+        ).join(
+            Turma, Aluno.turma_id == Turma.id
+        ).filter(
+            Aluno.user_id == grupo.user_id,
+            DesempenhoAlunoPeriodo.ano_avaliacao == grupo.ano_avaliacao,
+            DesempenhoAlunoPeriodo.periodo_avaliacao == grupo.periodo_avaliacao,
+            DesempenhoAlunoPeriodo.serie == grupo.serie
+        ).group_by(*colunas, referencia)
+
+    somas = {COMPONENTE_GERAL: [tuple(linha) for linha in consulta().all()]}
+    for componente, *linha in consulta(DesempenhoAlunoPeriodo.componente).all():
+        somas.setdefault(componente, []).append(tuple(linha))
+    return somas
+
+
+def recalcular_posicoes(grupo):
+    """Refaz todas as posições do grupo (escopos x componentes + 'Geral'); retorna o número de linhas"""
+    PosicaoRanking.query.filter_by(grupo_id=grupo.id).delete(synchronize_session=False)
+
+    novas = []
+    for escopo in ESCOPOS:
+        for componente, linhas in _somas(grupo, escopo).items():
+            if not linhas:
+                continue
+            referencias, alunos, totais, acertos = np.array(
+                [[int(valor or 0) for valor in linha] for linha in linhas], dtype=np.int64
+            ).T
+            percentuais = np.where(totais > 0, acertos / np.maximum(totais, 1), 0.0)
+            posicoes = _posicoes(percentuais)
+            novas.extend({
+                'grupo_id': grupo.id,
+                'escopo': escopo,
+                'componente': componente,
+                'referencia_id': int(referencias[i]),
+                'posicao': int(posicoes[i]),
+                'participantes': len(linhas),
+                'alunos': int(alunos[i]),
+                'total_questoes': int(totais[i]),
+                'acertos': int(acertos[i]),
+                'percentual': round(float(percentuais[i]) * 100, 2)
+            } for i in range(len(linhas)))
+
+    if novas:
+        db.session.execute(db.insert(PosicaoRanking), novas)
+    return len(novas)
+
+
+def obter_grupo_atualizado(user_id, ano, periodo, serie):
+    """Grupo do ranking com as posições em dia (recalcula se houve gravações desde o último cálculo)"""
+    grupo = GrupoRanking.query.filter_by(
+        user_id=user_id, ano_avaliacao=ano, periodo_avaliacao=periodo, serie=serie
+    ).first()
+    if grupo is None or grupo.versao_calculada >= grupo.versao:
+        return grupo
+
+    # Reserva condicional: entre workers simultâneos, só um recalcula a mesma versão
+    versao = grupo.versao
+    reservado = GrupoRanking.query.filter(
+        GrupoRanking.id == grupo.id,
+        GrupoRanking.versao_calculada < versao
+    ).update({
+        GrupoRanking.versao_calculada: versao,
+        GrupoRanking.calculado_em: datetime.now()
+    }, synchronize_session=False)
+    if reservado:
+        recalcular_posicoes(grupo)
+    db.session.commit()
+    return grupo
+
+
+def recalcular_rankings_pendentes(user_id=None):
+    """Recalcula todos os grupos desatualizados (comando de manutenção); retorna quantos foram refeitos"""
+    query = GrupoRanking.query.filter(GrupoRanking.versao_calculada < GrupoRanking.versao)
+    if user_id:
+        query = query.filter(GrupoRanking.user_id == user_id)
+    chaves = [(g.user_id, g.ano_avaliacao, g.periodo_avaliacao, g.serie) for g in query.all()]
+    for chave in chaves:
+        obter_grupo_atualizado(*chave)
+    return len(chaves)
+
+
+def _nomes(escopo, referencia_ids):
+    if not referencia_ids:
+        return {}
+    if escopo == 'aluno':
+        linhas = db.session.query(Aluno.id, Aluno.nome, Turma.nome).join(
+            Turma, Aluno.turma_id == Turma.id
+        ).filter(Aluno.id.in_(referencia_ids)).all()
+        return {rid: {'nome': nome, 'turma_nome': turma} for rid, nome, turma in linhas}
+    if escopo == 'turma':
+        linhas = db.session.query(Turma.id, Turma.nome, Escola.nome).join(
+            Escola, Turma.escola_id == Escola.id
+        ).filter(Turma.id.in_(referencia_ids)).all()
+        return {rid: {'nome': nome, 'escola_nome': escola} for rid, nome, escola in linhas}
+    linhas = db.session.query(Escola.id, Escola.nome).filter(Escola.id.in_(referencia_ids)).all()
+    return {rid: {'nome': nome} for rid, nome in linhas}
+
+
+def _serializar(posicoes, escopo, componente):
+    """Itens do ranking com nome e, no ranking 'Geral', o percentual de cada componente"""
+    ids = [p.referencia_id for p in posicoes]
+    nomes = _nomes(escopo, ids)
+    por_componente = {}
+    if posicoes and componente == COMPONENTE_GERAL:
+        for referencia_id, nome_componente, percentual in db.session.query(
+            PosicaoRanking.referencia_id, PosicaoRanking.componente, PosicaoRanking.percentual
+        ).filter(
+            PosicaoRanking.grupo_id == posicoes[0].grupo_id,
+            PosicaoRanking.escopo == escopo,
+            PosicaoRanking.componente != COMPONENTE_GERAL,
+            PosicaoRanking.referencia_id.in_(ids)
+        ):
+            por_componente.setdefault(referencia_id, {})[nome_componente] = round(percentual, 1)
+
+    return [{
+        'posicao': p.posicao,
+        'referencia_id': p.referencia_id,
+        **nomes.get(p.referencia_id, {'nome': None}),
+        'alunos': p.alunos,
+        'acertos': p.acertos,
+        'total_questoes': p.total_questoes,
+        'percentual': round(p.percentual, 1),
+        'componentes': por_componente.get(p.referencia_id, {})
+    } for p in posicoes]
+
+
+def consultar_ranking(user_id, ano, periodo, serie, escopo='escola', componente=None, limite=10, deslocamento=0):
+    """Top-N do ranking (a partir de `deslocamento`) e o total de participantes"""
+    componente = componente or COMPONENTE_GERAL
+    grupo = obter_grupo_atualizado(user_id, ano, periodo, serie)
+    if grupo is None:
+        return {'participantes': 0, 'itens': []}
+
+    posicoes = PosicaoRanking.query.filter_by(
+        grupo_id=grupo.id, escopo=escopo, componente=componente
+    ).order_by(PosicaoRanking.posicao, PosicaoRanking.referencia_id).offset(deslocamento).limit(limite).all()
+    return {
+        'participantes': posicoes[0].participantes if posicoes else 0,
+        'calculado_em': grupo.calculado_em.isoformat() if grupo.calculado_em else None,
+        'itens': _serializar(posicoes, escopo, componente)
+    }
+
+
+def posicao_no_ranking(user_id, ano, periodo, serie, escopo, referencia_id, componente=None):
+    """Posição de uma escola/turma/aluno no ranking (None se não participa)"""
+    componente = componente or COMPONENTE_GERAL
+    grupo = obter_grupo_atualizado(user_id, ano, periodo, serie)
+    if grupo is None:
+        return None
+
+    posicao = PosicaoRanking.query.filter_by(
+        grupo_id=grupo.id, escopo=escopo, componente=componente, referencia_id=referencia_id
+    ).first()
+    if posicao is None:
+        return None
+    return {'participantes': posicao.participantes, **_serializar([posicao], escopo, componente)[0]}
@@ -0,0 +1,331 @@
+"""
+Respostas compactas por resultado.
+
+Em vez de uma linha de RespostaAluno por questão, cada ResultadoAluno guarda:
+- respostas_compactas: um caractere por questão, na ordem bloco/questão do gabarito compilado usado na
+  correção ('A'..'E', '-' em branco, 'X' marcação múltipla, '.' questão não enviada);
+- acertos_compactos: bitmap de acertos na mesma ordem (np.packbits);
+- layout_respostas: blocos e questões da correção ("bloco_id=57A.58B.,bloco_id=..."): para cada posição,
+  o id da questão e a letra correta no momento da correção (vazio se a posição não tinha questão).
+Correção e leitura trabalham direto sobre esse formato (o texto vira a linha da matriz do motor de
+correção sem passar por objetos). Questão, letra correta e acerto de cada posição são os da correção:
+alterações posteriores nos blocos do caderno (troca, remoção ou reordenação de questões) não mudam
+o histórico.
+
+RespostaAluno passa a ser só leitura de compatibilidade: resultados gravados antes do formato
+compacto (colunas NULL) continuam lidos das linhas até `flask compactar-respostas`.
+"""
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+from database import db, BlocoCaderno, ResultadoAluno, RespostaAluno
+from gabarito_compilado import obter_gabarito_compilado
+from motor_correcao import (
+    codificar_resposta, decodificar_resposta, LETRAS, CODIGO_BRANCO, CODIGO_MULTIPLA, CODIGO_AUSENTE
+)
+
+COLUNAS_COMPACTAS = ('respostas_compactas', 'acertos_compactos', 'layout_respostas')
+SEM_RESPOSTAS = {'respostas_compactas': '', 'acertos_compactos': b'', 'layout_respostas': ''}
+TAMANHO_LOTE = 500
+
+RespostaExpandida = namedtuple('RespostaExpandida', [
+    'bloco_id', 'bloco_ordem', 'componente', 'questao_ordem', 'questao_id',
+    'resposta_marcada', 'resposta_correta', 'acertou'
+])
+
+# Tabelas de conversão código da matriz <-> caractere gravado
+_CARACTERES = {CODIGO_AUSENTE: '.', CODIGO_BRANCO: '-', CODIGO_MULTIPLA: 'X'}
+_CARACTERES.update({codificar_resposta(letra): letra for letra in LETRAS})
+_PARA_CARACTERE = np.full(256, ord('.'), dtype=np.uint8)
+_PARA_CODIGO = np.full(256, CODIGO_AUSENTE, dtype=np.uint8)
+for _codigo, _caractere in _CARACTERES.items():
+    _PARA_CARACTERE[_codigo] = ord(_caractere)
+    _PARA_CODIGO[ord(_caractere)] = _codigo
+
+
+PosicaoLayout = namedtuple('PosicaoLayout', ['bloco_id', 'questao_ordem', 'questao_id', 'resposta_correta'])
+
+
+def _item_layout(questao_id, letra):
+    if questao_id is None:
+        return ''
+    return f"{questao_id}{letra if letra in LETRAS else ''}"
+
+
+def layout_do_gabarito(gabarito, questoes=None):
+    """
+    Layout das posições do gabarito, com a questão e a letra de cada uma.
+    `questoes` ({(bloco_id, ordem): (questao_id, letra)}) substitui o gabarito nas posições informadas.
+    """
+    partes = []
+    for bloco in gabarito.blocos:
+        itens = []
+        for ordem in range(1, bloco.total_questoes + 1):
+            item = gabarito.item(bloco.ordem, ordem)
+            questao_id, letra = item if item else (None, None)
+            if questoes:
+                questao_id, letra = questoes.get((bloco.id, ordem), (questao_id, letra))
+            itens.append(_item_layout(questao_id, letra))
+        partes.append(f"{bloco.id}={'.'.join(itens)}")
+    return ','.join(partes)
+
+
+@lru_cache(maxsize=1024)
+def colunas_do_layout(layout):
+    """PosicaoLayout de cada posição do texto compacto (questao_id None: posição sem questão)"""
+    colunas = []
+    for parte in layout.split(',') if layout else ():
+        bloco_id, itens = parte.split('=')
+        for ordem, item in enumerate(itens.split('.'), start=1):
+            letra = item[-1] if item and item[-1] in LETRAS else None
+            numero = item[:-1] if letra else item
+            colunas.append(PosicaoLayout(int(bloco_id), ordem, int(numero) if numero else None, letra))
+    return tuple(colunas)
+
+
+def compactar_correcao(correcao, linha):
+    """Colunas compactas de uma linha da correção (valores para o upsert do ResultadoAluno)"""
+    return {
+        'respostas_compactas': _PARA_CARACTERE[correcao.matriz[linha]].tobytes().decode('ascii'),
+        'acertos_compactos': np.packbits(correcao.acertou[linha]).tobytes(),
+        'layout_respostas': layout_do_gabarito(correcao.gabarito)
+    }
+
+
+def compactar_linhas(gabarito, linhas):
+    """
+    Colunas compactas a partir de respostas já corrigidas (dicts com bloco_id, questao_ordem, resposta_marcada
+    e acertou; questao_id e resposta_correta, se presentes, são os registrados no layout)
+    """
+    indice_coluna = {(bloco.id, ordem): coluna for coluna, (bloco, ordem) in enumerate(gabarito.colunas)}
+    codigos = np.full(len(gabarito.colunas), CODIGO_AUSENTE, dtype=np.uint8)
+    acertou = np.zeros(len(gabarito.colunas), dtype=bool)
+    questoes = {}
+    for linha in linhas:
+        posicao = (linha['bloco_id'], linha['questao_ordem'])
+        coluna = indice_coluna.get(posicao)
+        if coluna is not None:
+            codigos[coluna] = codificar_resposta(linha['resposta_marcada'])
+            acertou[coluna] = bool(linha['acertou'])
+            if linha.get('questao_id') is not None:
+                questoes[posicao] = (linha['questao_id'], linha.get('resposta_correta'))
+    return {
+        'respostas_compactas': _PARA_CARACTERE[codigos].tobytes().decode('ascii'),
+        'acertos_compactos': np.packbits(acertou).tobytes(),
+        'layout_respostas': layout_do_gabarito(gabarito, questoes)
+    }
+
+
+def _codigos(texto):
+    return _PARA_CODIGO[np.frombuffer(texto.encode('ascii'), dtype=np.uint8)]
+
+
+def decodificar(texto, bitmap):
+    """(códigos da matriz, acertos) de um resultado compacto"""
+    codigos = _codigos(texto)
+    acertou = np.unpackbits(np.frombuffer(bitmap or b'', dtype=np.uint8), count=len(codigos)).astype(bool)
+    return codigos, acertou
+
+
+def matriz_compacta(gabarito, linhas):
+    """
+    Matriz de respostas (uma linha por resultado, colunas do gabarito atual) a partir de
+    (respostas_compactas, layout_respostas). Textos gravados com o layout atual são convertidos em bloco.
+    """
+    matriz = np.full((len(linhas), len(gabarito.colunas)), CODIGO_AUSENTE, dtype=np.uint8)
+    layout_atual = layout_do_gabarito(gabarito)
+    mesmo_layout = [indice for indice, (_, layout) in enumerate(linhas) if layout == layout_atual]
+    if mesmo_layout and len(gabarito.colunas):
+        texto = ''.join(linhas[indice][0] for indice in mesmo_layout)
+        matriz[mesmo_layout] = _codigos(texto).reshape(len(mesmo_layout), -1)
+
+    indice_coluna = None
+    for indice, (texto, layout) in enumerate(linhas):
+        if layout == layout_atual or not texto:
+            continue
+        if indice_coluna is None:
+            indice_coluna = {(bloco.id, ordem): coluna for coluna, (bloco, ordem) in enumerate(gabarito.colunas)}
+        # Caderno alterado depois da correção: cada resposta vai para a coluna atual da mesma questão;
+        # questões que saíram do caderno (e posições de blocos removidos) são ignoradas
+        for posicao, codigo in zip(colunas_do_layout(layout), _codigos(texto)):
+            if posicao.questao_id is None:
+                continue
+            ordem = gabarito.ordem_da_questao(posicao.bloco_id, posicao.questao_id)
+            coluna = indice_coluna.get((posicao.bloco_id, ordem))
+            if coluna is not None:
+                matriz[indice, coluna] = codigo
+    return matriz
+
+
+def expandir_compactas(gabarito, texto, bitmap, layout):
+    """RespostaExpandida de cada questão enviada de um resultado compacto (sem consultas ao banco)"""
+    if not texto:
+        return []
+    respostas = []
+    codigos, acertou = decodificar(texto, bitmap)
+    colunas = colunas_do_layout(layout)
+    for coluna in np.flatnonzero(codigos != CODIGO_AUSENTE):
+        posicao = colunas[coluna]
+        bloco = gabarito.bloco_por_id(posicao.bloco_id)
+        if bloco is None:
+            continue  # Bloco removido do caderno depois da correção
+        respostas.append(RespostaExpandida(
+            posicao.bloco_id, bloco.ordem, bloco.componente, posicao.questao_ordem, posicao.questao_id,
+            decodificar_resposta(codigos[coluna]), posicao.resposta_correta, bool(acertou[coluna])
+        ))
+    return respostas
+
+
+def expandir_respostas(resultados):
+    """
+    Respostas por questão de cada resultado: {resultado_id: [RespostaExpandida, ...]}, na ordem bloco/questão.
+    `resultados` traz (resultado_id, caderno_id, respostas_compactas, acertos_compactos, layout_respostas);
+    os que ainda não têm a forma compacta são lidos de RespostaAluno.
+    """
+    respostas = {}
+    antigos = []
+    gabaritos = {}
+    for resultado_id, caderno_id, texto, bitmap, layout in resultados:
+        if texto is None:
+            antigos.append(resultado_id)
+            continue
+        if texto and caderno_id not in gabaritos:
+            gabaritos[caderno_id] = obter_gabarito_compilado(caderno_id)
+        respostas[resultado_id] = expandir_compactas(gabaritos.get(caderno_id), texto, bitmap, layout)
+
+    for inicio in range(0, len(antigos), TAMANHO_LOTE):
+        ids = antigos[inicio:inicio + TAMANHO_LOTE]
+        linhas = db.session.query(
+            RespostaAluno.resultado_id, RespostaAluno.bloco_id, BlocoCaderno.ordem, BlocoCaderno.componente,
+            RespostaAluno.questao_ordem, RespostaAluno.questao_id, RespostaAluno.resposta_marcada,
+            RespostaAluno.resposta_correta, RespostaAluno.acertou
+        ).join(
+            BlocoCaderno, RespostaAluno.bloco_id == BlocoCaderno.id
+        ).filter(
+            RespostaAluno.resultado_id.in_(ids)
+        ).order_by(RespostaAluno.resultado_id, BlocoCaderno.ordem, RespostaAluno.questao_ordem).all()
+        for resultado_id in ids:
+            respostas[resultado_id] = []
+        for resultado_id, *valores in linhas:
+            valores[-1] = bool(valores[-1])
+            respostas[resultado_id].append(RespostaExpandida(*valores))
+    return respostas
+
+
+def _colunas_consulta():
+    return [ResultadoAluno.id, ResultadoAluno.caderno_id] + [getattr(ResultadoAluno, c) for c in COLUNAS_COMPACTAS]
+
+
+def respostas_dos_resultados(resultado_ids):
+    """expandir_respostas para os resultados informados (lidos em lotes)"""
+    resultado_ids = sorted({rid for rid in resultado_ids if rid is not None})
+    respostas = {}
+    for inicio in range(0, len(resultado_ids), TAMANHO_LOTE):
+        respostas.update(expandir_respostas(db.session.query(*_colunas_consulta()).filter(
+            ResultadoAluno.id.in_(resultado_ids[inicio:inicio + TAMANHO_LOTE])
+        ).all()))
+    return respostas
+
+
+def resultados_com_questao(questao_id):
+    """IDs dos resultados que podem ter resposta da questão"""
+    # Layout com a questão registrada (o filtro pode trazer resultados a mais, ex.: 57 em 570, sem prejuízo)
+    compactos = db.session.query(ResultadoAluno.id).filter(
+        ResultadoAluno.respostas_compactas.isnot(None),
+        db.or_(
+            ResultadoAluno.layout_respostas.like(f'%={questao_id}%'),
+            ResultadoAluno.layout_respostas.like(f'%.{questao_id}%')
+        )
+    )
+    antigos = db.session.query(RespostaAluno.resultado_id).filter(RespostaAluno.questao_id == questao_id)
+    return {resultado_id for (resultado_id,) in compactos.union(antigos)}
+
+
+def _layout_das_posicoes(colunas):
+    """Texto do layout a partir das PosicaoLayout (inverso de colunas_do_layout)"""
+    blocos = {}
+    for posicao in colunas:
+        blocos.setdefault(posicao.bloco_id, []).append(_item_layout(posicao.questao_id, posicao.resposta_correta))
+    return ','.join(f"{bloco_id}={'.'.join(itens)}" for bloco_id, itens in blocos.items())
+
+
+def remover_questao_dos_resultados(questao_id, resultado_ids):
+    """
+    Tira a questão excluída das respostas compactas dos resultados: a posição fica sem questão no layout
+    e sem resposta ('.', sem acerto), como as linhas de RespostaAluno apagadas. Retorna quantos mudaram.
+    """
+    resultado_ids = sorted(resultado_ids)
+    alterados = 0
+    for inicio in range(0, len(resultado_ids), TAMANHO_LOTE):
+        valores = []
+        for resultado_id, _, texto, bitmap, layout in db.session.query(*_colunas_consulta()).filter(
+            ResultadoAluno.id.in_(resultado_ids[inicio:inicio + TAMANHO_LOTE]),
+            ResultadoAluno.respostas_compactas.isnot(None)
+        ):
+            colunas = colunas_do_layout(layout)
+            posicoes = [coluna for coluna, posicao in enumerate(colunas) if posicao.questao_id == questao_id]
+            if not posicoes:
+                continue  # Só o filtro LIKE casou (ex.: 57 em 570)
+            codigos, acertou = decodificar(texto, bitmap)
+            codigos[posicoes] = CODIGO_AUSENTE
+            acertou[posicoes] = False
+            valores.append({
+                'id': resultado_id,
+                'respostas_compactas': _PARA_CARACTERE[codigos].tobytes().decode('ascii'),
+                'acertos_compactos': np.packbits(acertou).tobytes(),
+                'layout_respostas': _layout_das_posicoes(
+                    posicao._replace(questao_id=None, resposta_correta=None) if coluna in posicoes else posicao
+                    for coluna, posicao in enumerate(colunas)
+                )
+            })
+        if valores:
+            db.session.execute(db.update(ResultadoAluno), valores)
+            alterados += len(valores)
+    return alterados
+
+
+def compactar_resultados_antigos(remover_linhas=False):
+    """
+    Converte para a forma compacta os resultados gravados só em RespostaAluno, em lotes
+    (as respostas fora dos blocos atuais do caderno são descartadas). Com remover_linhas=True
+    apaga também as linhas de RespostaAluno dos resultados já compactados.
+    Retorna (resultados compactados, linhas apagadas).
+    """
+    compactados = 0
+    ultimo_id = 0
+    gabaritos = {}
+    while True:
+        resultados = db.session.query(*_colunas_consulta()).filter(
+            ResultadoAluno.respostas_compactas.is_(None),
+            ResultadoAluno.id > ultimo_id
+        ).order_by(ResultadoAluno.id).limit(TAMANHO_LOTE).all()
+        if not resultados:
+            break
+        respostas = expandir_respostas(resultados)
+        valores = []
+        for resultado_id, caderno_id, *_ in resultados:
+            linhas = [resposta._asdict() for resposta in respostas[resultado_id]]
+            if linhas and caderno_id not in gabaritos:
+                gabaritos[caderno_id] = obter_gabarito_compilado(caderno_id)
+            compactas = compactar_linhas(gabaritos[caderno_id], linhas) if linhas else SEM_RESPOSTAS
+            valores.append(dict(compactas, id=resultado_id))
+        db.session.execute(db.update(ResultadoAluno), valores)
+        db.session.commit()
+        compactados += len(resultados)
+        ultimo_id = resultados[-1][0]
+
+    removidas = 0
+    if remover_linhas:
+        while True:
+            ids = [rid for (rid,) in db.session.query(RespostaAluno.resultado_id).join(
+                ResultadoAluno, RespostaAluno.resultado_id == ResultadoAluno.id
+            ).filter(ResultadoAluno.respostas_compactas.isnot(None)).distinct().limit(TAMANHO_LOTE).all()]
+            if not ids:
+                break
+            removidas += RespostaAluno.query.filter(
+                RespostaAluno.resultado_id.in_(ids)
+            ).delete(synchronize_session=False)
+            db.session.commit()
+    return compactados, removidas
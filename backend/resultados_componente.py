@@ -0,0 +1,149 @@
+"""
+Manutenção dos agregados dos resultados (acertos por componente, por habilidade e por período do aluno).
+
+Todo caminho que grava ou apaga respostas chama atualizar_agregados_resultados com os IDs
+dos resultados afetados, antes do commit: os totais são recalculados para o lote inteiro a partir
+das respostas compactas (ou de RespostaAluno, nos resultados antigos), na mesma transação das
+respostas. A mesma chamada incrementa as versões (VersaoDados) dos cadernos, das turmas e dos
+usuários afetados, usadas para invalidar os caches de relatórios, e marca como desatualizados os
+rankings dos grupos (ano, período, série) dos alunos.
+"""
+from database import db, Aluno, ResultadoAluno, ResultadoComponente, VersaoDados
+from respostas_compactas import respostas_dos_resultados
+from dominio_habilidades import atualizar_resultados_habilidade, remover_resultados_habilidade, recalcular_dominio_turmas
+from desempenho_periodos import alunos_dos_resultados, atualizar_desempenho_alunos
+from ranking_resultados import marcar_rankings_alterados
+
+ESCOPO_RESULTADOS = 'resultados'  # Por caderno
+ESCOPO_RESULTADOS_TURMA = 'resultados_turma'
+ESCOPO_RESULTADOS_USUARIO = 'resultados_usuario'
+TAMANHO_LOTE = 500  # Resultados recalculados por consulta na reconstrução completa
+
+
+def versao_resultados(caderno_id):
+    """Versão atual dos resultados gravados para o caderno"""
+    return VersaoDados.atual(ESCOPO_RESULTADOS, caderno_id)
+
+
+def marcar_resultados_alterados(caderno_ids):
+    """Incrementa a versão 'resultados' dos cadernos (na transação corrente)"""
+    for caderno_id in sorted(set(caderno_ids)):
+        VersaoDados.incrementar(ESCOPO_RESULTADOS, caderno_id)
+
+
+def _marcar_versoes_dos_resultados(resultado_ids):
+    """Incrementa as versões dos cadernos, turmas e usuários dos resultados"""
+    linhas = db.session.query(
+        ResultadoAluno.caderno_id, Aluno.turma_id, ResultadoAluno.user_id
+    ).join(
+        Aluno, ResultadoAluno.aluno_id == Aluno.id
+    ).filter(ResultadoAluno.id.in_(resultado_ids)).distinct().all()
+    marcar_resultados_alterados(caderno_id for caderno_id, _, _ in linhas)
+    for turma_id in sorted({turma_id for _, turma_id, _ in linhas}):
+        VersaoDados.incrementar(ESCOPO_RESULTADOS_TURMA, turma_id)
+    for user_id in sorted({user_id for _, _, user_id in linhas}):
+        VersaoDados.incrementar(ESCOPO_RESULTADOS_USUARIO, user_id)
+
+
+def atualizar_resultados_componente(resultado_ids, respostas=None):
+    """Recalcula as linhas de ResultadoComponente dos resultados informados (respostas: já expandidas, se houver)"""
+    resultado_ids = sorted({rid for rid in resultado_ids if rid is not None})
+    if not resultado_ids:
+        return 0
+
+    db.session.flush()  # Garantir que as respostas pendentes da sessão entrem na contagem
+    contagens = {}  # {(resultado_id, componente): [respondidas, acertos]}
+    if respostas is None:
+        respostas = respostas_dos_resultados(resultado_ids)
+    for resultado_id in resultado_ids:
+        for resposta in respostas.get(resultado_id, ()):
+            if resposta.componente is None:
+                continue
+            contagem = contagens.setdefault((resultado_id, resposta.componente), [0, 0])
+            contagem[0] += 1
+            contagem[1] += resposta.acertou
+
+    remover_resultados_componente(resultado_ids)
+    novas = [{
+        'resultado_id': resultado_id,
+        'componente': componente,
+        'total_questoes': total,
+        'acertos': acertos,
+        'percentual': round(acertos / total * 100, 1) if total else 0.0
+    } for (resultado_id, componente), (total, acertos) in contagens.items()]
+    if novas:
+        db.session.execute(db.insert(ResultadoComponente), novas)
+    return len(novas)
+
+
+def remover_resultados_componente(resultado_ids):
+    """Apaga as linhas de ResultadoComponente dos resultados (usar antes de DELETE em lote de ResultadoAluno)"""
+    if resultado_ids:
+        ResultadoComponente.query.filter(
+            ResultadoComponente.resultado_id.in_(list(resultado_ids))
+        ).delete(synchronize_session=False)
+
+
+def acertos_pelas_respostas(resultado_ids, componente):
+    """
+    Acertos do componente contados nas respostas ({resultado_id: acertos}), para resultados ainda sem
+    linhas de ResultadoComponente (gravados antes da tabela, até `flask recalcular-resultados`)
+    """
+    respostas = respostas_dos_resultados(resultado_ids)
+    return {resultado_id: sum(
+        resposta.acertou for resposta in respostas.get(resultado_id, ()) if resposta.componente == componente
+    ) for resultado_id in resultado_ids}
+
+
+def atualizar_agregados_resultados(resultado_ids):
+    """Atualiza componentes, habilidades, desempenho por período e as versões dos resultados alterados"""
+    resultado_ids = sorted({rid for rid in resultado_ids if rid is not None})
+    if not resultado_ids:
+        return
+    db.session.flush()
+    respostas = respostas_dos_resultados(resultado_ids)
+    atualizar_resultados_componente(resultado_ids, respostas)
+    atualizar_resultados_habilidade(resultado_ids, respostas)
+    marcar_rankings_alterados(atualizar_desempenho_alunos(alunos_dos_resultados(resultado_ids)))
+    _marcar_versoes_dos_resultados(resultado_ids)
+
+
+def remover_agregados_resultados(resultado_ids):
+    """Apaga os agregados dos resultados (usar antes de DELETE em lote de ResultadoAluno)"""
+    resultado_ids = list(resultado_ids)
+    if not resultado_ids:
+        return
+    alunos = alunos_dos_resultados(resultado_ids)
+    _marcar_versoes_dos_resultados(resultado_ids)
+    remover_resultados_componente(resultado_ids)
+    remover_resultados_habilidade(resultado_ids)
+    marcar_rankings_alterados(atualizar_desempenho_alunos(alunos))  # Refeito sem as linhas de componente removidas
+
+
+def reconstruir_agregados_resultados(caderno_id=None):
+    """Recalcula os agregados de todos os resultados (ou de um caderno), em lotes; retorna o total de resultados"""
+    query = db.session.query(ResultadoAluno.id).order_by(ResultadoAluno.id)
+    if caderno_id:
+        query = query.filter(ResultadoAluno.caderno_id == caderno_id)
+
+    total = 0
+    ultimo_id = 0
+    turmas = set()
+    while True:
+        ids = [rid for (rid,) in query.filter(ResultadoAluno.id > ultimo_id).limit(TAMANHO_LOTE).all()]
+        if not ids:
+            break
+        atualizar_agregados_resultados(ids)
+        db.session.commit()
+        turmas.update(turma_id for (turma_id,) in db.session.query(Aluno.turma_id).join(
+            ResultadoAluno, ResultadoAluno.aluno_id == Aluno.id
+        ).filter(ResultadoAluno.id.in_(ids)).distinct())
+        total += len(ids)
+        ultimo_id = ids[-1]
+
+    # As gravações só aplicam diferenças no domínio por turma; aqui ele é refeito do zero
+    turmas = sorted(turmas)
+    for inicio in range(0, len(turmas), TAMANHO_LOTE):
+        recalcular_dominio_turmas(turmas[inicio:inicio + TAMANHO_LOTE])
+        db.session.commit()
+    return total
@@ -0,0 +1,319 @@
+"""
+Snapshot analítico (Parquet) dos dados de avaliação, para consultas em pandas/pyarrow fora do banco.
+
+Layout do diretório de cada snapshot (particionamento no estilo Hive):
+    dimensoes/escola.parquet, turma, aluno, caderno, bloco_caderno, habilidade
+    resultado_aluno/ano_avaliacao=2025/periodo_avaliacao=1/dados.parquet
+    resposta_aluno/ano_avaliacao=2025/periodo_avaliacao=1/dados.parquet
+    manifesto.json
+
+Leitura: pd.read_parquet('<snapshot>/resposta_aluno') ou pyarrow.dataset.dataset(..., partitioning='hive').
+Resultados sem ano/período (lançados antes do filtro temporal) ficam em ano_avaliacao=0 e
+periodo_avaliacao=sem_periodo: partições nulas não são lidas pelo pandas.
+
+Atualização incremental: cada partição (ano, período) tem uma assinatura calculada a partir de
+quantidade/maior ID dos resultados e da versão 'resultados' (VersaoDados) de cada caderno presente.
+Somente as partições com assinatura diferente da gravada no manifesto são reescritas; as que não
+existem mais no banco são apagadas. As dimensões (tabelas pequenas) são reescritas a cada atualização.
+As linhas são lidas em lotes com cursor do lado do servidor e gravadas em row groups, sem carregar a
+tabela inteira em memória. resposta_aluno mantém uma linha por questão: as respostas compactas dos
+resultados são expandidas (com id nulo) na gravação da partição.
+"""
+import os
+import json
+import shutil
+import hashlib
+import threading
+from datetime import datetime
+from urllib.parse import quote
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from database import (
+    db, Escola, Turma, Aluno, Caderno, BlocoCaderno, Habilidade, Questao,
+    ResultadoAluno, RespostaAluno, VersaoDados
+)
+from resultados_componente import ESCOPO_RESULTADOS
+from gabarito_compilado import obter_gabarito_compilado
+from respostas_compactas import expandir_compactas
+
+DIRETORIO_SNAPSHOTS = os.getenv(
+    'ANALITICO_DIRETORIO',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads', 'analitico')
+)
+LINHAS_POR_LOTE = 50000  # Linhas por row group (e por ida ao banco)
+COMPRESSAO = 'zstd'
+ARQUIVO_MANIFESTO = 'manifesto.json'
+ANO_AUSENTE = 0
+PERIODO_AUSENTE = 'sem_periodo'
+
+_lock = threading.Lock()
+
+
+def _dimensoes(user_id):
+    """(nome, [(coluna, expressão, tipo)], filtro) de cada tabela de dimensão"""
+    por_usuario = lambda modelo: [modelo.user_id == user_id] if user_id else []
+    return [
+        ('escola', [
+            ('id', Escola.id, pa.int64()), ('nome', Escola.nome, pa.string()),
+            ('rede', Escola.rede, pa.string()), ('zona', Escola.zona, pa.string())
+        ], por_usuario(Escola)),
+        ('turma', [
+            ('id', Turma.id, pa.int64()), ('nome', Turma.nome, pa.string()), ('ano', Turma.ano, pa.int32()),
+            ('turno', Turma.turno, pa.string()), ('escola_id', Turma.escola_id, pa.int64())
+        ], por_usuario(Turma)),
+        ('aluno', [
+            ('id', Aluno.id, pa.int64()), ('nome', Aluno.nome, pa.string()), ('sexo', Aluno.sexo, pa.string()),
+            ('turma_id', Aluno.turma_id, pa.int64()), ('escola_id', Aluno.escola_id, pa.int64())
+        ], por_usuario(Aluno)),
+        ('caderno', [
+            ('id', Caderno.id, pa.int64()), ('titulo', Caderno.titulo, pa.string()), ('serie', Caderno.serie, pa.int32()),
+            ('qtd_blocos', Caderno.qtd_blocos, pa.int32()),
+            ('qtd_questoes_por_bloco', Caderno.qtd_questoes_por_bloco, pa.int32())
+        ], por_usuario(Caderno)),
+        ('bloco_caderno', [
+            ('id', BlocoCaderno.id, pa.int64()), ('caderno_id', BlocoCaderno.caderno_id, pa.int64()),
+            ('ordem', BlocoCaderno.ordem, pa.int32()), ('componente', BlocoCaderno.componente, pa.string()),
+            ('total_questoes', BlocoCaderno.total_questoes, pa.int32())
+        ], [BlocoCaderno.caderno_id.in_(db.select(Caderno.id).where(Caderno.user_id == user_id))] if user_id else []),
+        ('habilidade', [
+            ('id', Habilidade.id, pa.int64()), ('codigo', Habilidade.codigo, pa.string()),
+            ('componente', Habilidade.componente, pa.string()), ('ano', Habilidade.ano, pa.int32()),
+            ('descricao', Habilidade.descricao, pa.string()), ('etapa', Habilidade.etapa, pa.string())
+        ], []),
+    ]
+
+
+COLUNAS_RESULTADO = [
+    ('id', ResultadoAluno.id, pa.int64()), ('aluno_id', ResultadoAluno.aluno_id, pa.int64()),
+    ('caderno_id', ResultadoAluno.caderno_id, pa.int64()), ('fez_prova', ResultadoAluno.fez_prova, pa.bool_()),
+    ('total_questoes', ResultadoAluno.total_questoes, pa.int32()),
+    ('total_acertos', ResultadoAluno.total_acertos, pa.int32()),
+    ('percentual_acertos', ResultadoAluno.percentual_acertos, pa.float64()),
+    ('data_lancamento', ResultadoAluno.data_lancamento, pa.timestamp('us')),
+]
+COLUNAS_RESPOSTA = [
+    ('id', RespostaAluno.id, pa.int64()), ('resultado_id', RespostaAluno.resultado_id, pa.int64()),
+    ('aluno_id', ResultadoAluno.aluno_id, pa.int64()), ('caderno_id', ResultadoAluno.caderno_id, pa.int64()),
+    ('bloco_id', RespostaAluno.bloco_id, pa.int64()), ('questao_ordem', RespostaAluno.questao_ordem, pa.int32()),
+    ('questao_id', RespostaAluno.questao_id, pa.int64()), ('habilidade_id', Questao.habilidade_id, pa.int64()),
+    ('resposta_marcada', RespostaAluno.resposta_marcada, pa.string()),
+    ('resposta_correta', RespostaAluno.resposta_correta, pa.string()),
+    ('acertou', RespostaAluno.acertou, pa.bool_()),
+]
+
+
+# Resultados antigos trazem uma linha por RespostaAluno; os compactos, uma linha expandida em _expansao_respostas
+CONSULTA_RESPOSTAS = [
+    ResultadoAluno.id, ResultadoAluno.aluno_id, ResultadoAluno.caderno_id, ResultadoAluno.respostas_compactas,
+    ResultadoAluno.acertos_compactos, ResultadoAluno.layout_respostas, RespostaAluno.id, RespostaAluno.bloco_id,
+    RespostaAluno.questao_ordem, RespostaAluno.questao_id, Questao.habilidade_id, RespostaAluno.resposta_marcada,
+    RespostaAluno.resposta_correta, RespostaAluno.acertou,
+]
+
+
+def _expansao_respostas(filtros):
+    """
+    Função que converte um lote de CONSULTA_RESPOSTAS nas linhas de COLUNAS_RESPOSTA (respostas compactas
+    sem id). Gabaritos e habilidades são carregados antes, para não consultar o banco com o cursor aberto.
+    """
+    cadernos = db.session.execute(db.select(ResultadoAluno.caderno_id).where(
+        *filtros, ResultadoAluno.respostas_compactas.isnot(None)
+    ).distinct()).scalars().all()
+    gabaritos = {caderno_id: obter_gabarito_compilado(caderno_id) for caderno_id in cadernos}
+    questoes = {item.questao_id for gabarito in gabaritos.values() for item in gabarito.itens.values()}
+    habilidades = dict(db.session.execute(
+        db.select(Questao.id, Questao.habilidade_id).where(Questao.id.in_(questoes))
+    ).all()) if questoes else {}
+
+    def transformar(lote):
+        linhas = []
+        for resultado_id, aluno_id, caderno_id, texto, bitmap, layout, resposta_id, *resposta in lote:
+            if texto is None:
+                linhas.append((resposta_id, resultado_id, aluno_id, caderno_id, *resposta))
+                continue
+            for r in expandir_compactas(gabaritos[caderno_id], texto, bitmap, layout):
+                linhas.append((
+                    None, resultado_id, aluno_id, caderno_id, r.bloco_id, r.questao_ordem, r.questao_id,
+                    habilidades.get(r.questao_id), r.resposta_marcada, r.resposta_correta, r.acertou
+                ))
+        return linhas
+    return transformar
+
+
+def diretorio_snapshot(user_id=None):
+    """Diretório do snapshot de um usuário (ou de toda a base, para user_id=None)"""
+    return os.path.join(DIRETORIO_SNAPSHOTS, f"usuario_{user_id}" if user_id else 'todos')
+
+
+def _gravar_parquet(caminho, colunas, consulta, transformar=None):
+    """
+    Grava o resultado da consulta em Parquet, em row groups de LINHAS_POR_LOTE linhas; retorna o total de linhas.
+    `transformar` converte cada lote da consulta nas linhas gravadas (mesma ordem de `colunas`).
+    """
+    schema = pa.schema([(nome, tipo) for nome, _, tipo in colunas])
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = os.path.join(os.path.dirname(caminho), '.' + os.path.basename(caminho) + '.tmp')
+
+    total = 0
+    resultado = db.session.execute(consulta, execution_options={'yield_per': LINHAS_POR_LOTE})
+    try:
+        with pq.ParquetWriter(temporario, schema, compression=COMPRESSAO) as escritor:
+            for lote in resultado.partitions():
+                if transformar:
+                    lote = transformar(lote)
+                    if not lote:
+                        continue
+                valores = list(zip(*lote))
+                escritor.write_table(pa.table(
+                    [pa.array(coluna, type=tipo) for coluna, (_, _, tipo) in zip(valores, colunas)],
+                    schema=schema
+                ))
+                total += len(lote)
+            if not total:
+                escritor.write_table(schema.empty_table())
+    finally:
+        resultado.close()
+    os.replace(temporario, caminho)  # Leitores nunca veem um arquivo pela metade
+    return total
+
+
+def _caminho_particao(diretorio, tabela, ano, periodo):
+    partes = [
+        f"ano_avaliacao={ANO_AUSENTE if ano is None else ano}",
+        f"periodo_avaliacao={quote(PERIODO_AUSENTE if periodo is None else str(periodo), safe='')}"
+    ]
+    return os.path.join(diretorio, tabela, *partes)
+
+
+def _filtro_particao(ano, periodo):
+    return [
+        ResultadoAluno.ano_avaliacao.is_(None) if ano is None else ResultadoAluno.ano_avaliacao == ano,
+        ResultadoAluno.periodo_avaliacao.is_(None) if periodo is None else ResultadoAluno.periodo_avaliacao == periodo,
+    ]
+
+
+def assinaturas_particoes(user_id=None):
+    """Assinatura atual de cada partição (ano, período) a partir de contagens e versões dos cadernos"""
+    consulta = db.session.query(
+        ResultadoAluno.ano_avaliacao,
+        ResultadoAluno.periodo_avaliacao,
+        ResultadoAluno.caderno_id,
+        db.func.count(ResultadoAluno.id),
+        db.func.max(ResultadoAluno.id),
+        db.func.coalesce(db.func.max(VersaoDados.versao), 0)
+    ).outerjoin(
+        VersaoDados, db.and_(
+            VersaoDados.escopo == ESCOPO_RESULTADOS,
+            VersaoDados.referencia_id == ResultadoAluno.caderno_id
+        )
+    )
+    if user_id:
+        consulta = consulta.filter(ResultadoAluno.user_id == user_id)
+    linhas = consulta.group_by(
+        ResultadoAluno.ano_avaliacao, ResultadoAluno.periodo_avaliacao, ResultadoAluno.caderno_id
+    ).order_by(
+        ResultadoAluno.ano_avaliacao, ResultadoAluno.periodo_avaliacao, ResultadoAluno.caderno_id
+    ).all()
+
+    cadernos_por_particao = {}
+    for ano, periodo, caderno_id, quantidade, maior_id, versao in linhas:
+        cadernos_por_particao.setdefault((ano, periodo), []).append((caderno_id, quantidade, maior_id, versao))
+    return {
+        particao: hashlib.sha1(json.dumps(cadernos).encode()).hexdigest()
+        for particao, cadernos in cadernos_por_particao.items()
+    }
+
+
+def carregar_manifesto(user_id=None):
+    """Manifesto do último snapshot gravado (None se ainda não existe)"""
+    caminho = os.path.join(diretorio_snapshot(user_id), ARQUIVO_MANIFESTO)
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+
+def atualizar_snapshot(user_id=None, completo=False):
+    """Atualiza o snapshot (reescrevendo só as partições alteradas, ou todas com completo=True); retorna o manifesto"""
+    with _lock:
+        diretorio = diretorio_snapshot(user_id)
+        anterior = None if completo else carregar_manifesto(user_id)
+        gravadas = {
+            (p['ano_avaliacao'], p['periodo_avaliacao']): p for p in (anterior or {}).get('particoes', [])
+        }
+
+        dimensoes = {}
+        for nome, colunas, filtros in _dimensoes(user_id):
+            consulta = db.select(*[coluna for _, coluna, _ in colunas]).where(*filtros).order_by(colunas[0][1])
+            dimensoes[nome] = _gravar_parquet(os.path.join(diretorio, 'dimensoes', f"{nome}.parquet"), colunas, consulta)
+
+        filtro_usuario = [ResultadoAluno.user_id == user_id] if user_id else []
+        particoes = []
+        reescritas = 0
+        for (ano, periodo), assinatura in sorted(assinaturas_particoes(user_id).items(), key=lambda item: str(item[0])):
+            existente = gravadas.pop((ano, periodo), None)
+            if existente and existente['assinatura'] == assinatura:
+                particoes.append(existente)
+                continue
+
+            filtros = filtro_usuario + _filtro_particao(ano, periodo)
+            resultados = _gravar_parquet(
+                os.path.join(_caminho_particao(diretorio, 'resultado_aluno', ano, periodo), 'dados.parquet'),
+                COLUNAS_RESULTADO,
+                db.select(*[coluna for _, coluna, _ in COLUNAS_RESULTADO]).where(*filtros).order_by(ResultadoAluno.id)
+            )
+            respostas = _gravar_parquet(
+                os.path.join(_caminho_particao(diretorio, 'resposta_aluno', ano, periodo), 'dados.parquet'),
+                COLUNAS_RESPOSTA,
+                db.select(*CONSULTA_RESPOSTAS).outerjoin(
+                    RespostaAluno, db.and_(
+                        RespostaAluno.resultado_id == ResultadoAluno.id,
+                        ResultadoAluno.respostas_compactas.is_(None)
+                    )
+                ).outerjoin(
+                    Questao, RespostaAluno.questao_id == Questao.id
+                ).where(
+                    *filtros, db.or_(ResultadoAluno.respostas_compactas.isnot(None), RespostaAluno.id.isnot(None))
+                ).order_by(ResultadoAluno.id, RespostaAluno.id),
+                _expansao_respostas(filtros)
+            )
+            particoes.append({
+                'ano_avaliacao': ano,
+                'periodo_avaliacao': periodo,
+                'assinatura': assinatura,
+                'resultados': resultados,
+                'respostas': respostas,
+                'gerada_em': datetime.now().isoformat(timespec='seconds')
+            })
+            reescritas += 1
+
+        # Partições que não têm mais resultados no banco
+        for ano, periodo in gravadas:
+            for tabela in ('resultado_aluno', 'resposta_aluno'):
+                shutil.rmtree(_caminho_particao(diretorio, tabela, ano, periodo), ignore_errors=True)
+
+        manifesto = {
+            'atualizado_em': datetime.now().isoformat(timespec='seconds'),
+            'dimensoes': dimensoes,
+            'particoes': particoes,
+            'particoes_reescritas': reescritas,
+            'particoes_removidas': len(gravadas)
+        }
+        temporario = os.path.join(diretorio, '.' + ARQUIVO_MANIFESTO + '.tmp')
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            json.dump(manifesto, arquivo, ensure_ascii=False, indent=2)
+        os.replace(temporario, os.path.join(diretorio, ARQUIVO_MANIFESTO))
+        return manifesto
+
+
+def arquivos_snapshot(user_id=None):
+    """(caminho absoluto, caminho relativo) dos arquivos do snapshot, para download"""
+    diretorio = diretorio_snapshot(user_id)
+    for raiz, pastas, arquivos in os.walk(diretorio):
+        pastas.sort()
+        for nome in sorted(arquivos):
+            if not nome.startswith('.'):
+                caminho = os.path.join(raiz, nome)
+                yield caminho, os.path.relpath(caminho, diretorio)
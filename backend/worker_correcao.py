@@ -0,0 +1,101 @@
+"""
+Worker da fila local de correção automática.
+
+Executar em um processo separado do servidor web (ex.: `python worker_correcao.py`, entrada `worker`
+do Procfile) na mesma máquina/volume do servidor: os PDFs enviados ficam no disco local
+(OMR_DIRETORIO_TAREFAS). Em hospedagens com um único serviço e disco próprio (Railway, Render),
+use OMR_WORKER=embutido: o worker roda em uma thread do próprio servidor web.
+Em qualquer modo só um worker por máquina processa a fila (trava em arquivo no diretório das tarefas).
+Reserva as tarefas pendentes no banco, processa os PDFs e remove as tarefas antigas periodicamente.
+"""
+import os
+import time
+import threading
+import traceback
+
+from database import db
+from fila_correcao import (
+    recuperar_tarefas_interrompidas, reservar_proxima_tarefa, executar_tarefa, limpar_tarefas_antigas,
+    DIRETORIO_TAREFAS
+)
+
+INTERVALO_CONSULTA = float(os.getenv('OMR_INTERVALO_FILA', 2))
+INTERVALO_LIMPEZA = 3600  # Segundos entre limpezas das tarefas antigas
+
+_trava = None  # Arquivo da trava, mantido aberto enquanto o processo é o worker da máquina
+
+
+def _travar_arquivo(arquivo):
+    """Trava exclusiva sem espera no arquivo aberto (OSError se outro processo já a tem)"""
+    try:
+        import fcntl
+    except ImportError:  # Windows (desenvolvimento local)
+        import msvcrt
+        msvcrt.locking(arquivo.fileno(), msvcrt.LK_NBLCK, 1)
+    else:
+        fcntl.flock(arquivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def obter_trava_worker():
+    """Tenta se tornar o worker desta máquina; False se outro processo já é (a trava some quando ele termina)"""
+    global _trava
+    if _trava is not None:
+        return True
+    os.makedirs(DIRETORIO_TAREFAS, exist_ok=True)
+    arquivo = open(os.path.join(DIRETORIO_TAREFAS, '.worker.lock'), 'w')
+    try:
+        _travar_arquivo(arquivo)
+    except OSError:
+        arquivo.close()
+        return False
+    _trava = arquivo
+    return True
+
+
+def executar_worker(app):
+    with app.app_context():
+        # Só o dono da trava pode devolver à fila as tarefas 'processando' (são dele, de uma execução anterior)
+        recuperadas = recuperar_tarefas_interrompidas()
+        if recuperadas:
+            print(f"♻️ {recuperadas} tarefa(s) interrompida(s) devolvida(s) para a fila")
+        print("🚀 Worker da correção automática iniciado")
+
+        ultima_limpeza = 0
+        while True:
+            try:
+                if time.time() - ultima_limpeza > INTERVALO_LIMPEZA:
+                    removidas = limpar_tarefas_antigas()
+                    if removidas:
+                        print(f"🧹 {removidas} tarefa(s) antiga(s) removida(s)")
+                    ultima_limpeza = time.time()
+
+                tarefa = reservar_proxima_tarefa()
+                if tarefa is None:
+                    time.sleep(INTERVALO_CONSULTA)
+                    continue
+
+                print(f"⚙️ Processando tarefa de correção {tarefa.id}")
+                executar_tarefa(tarefa)
+            except Exception as e:
+                print(f"❌ Erro no worker da correção: {e}")
+                traceback.print_exc()
+                db.session.rollback()
+                time.sleep(INTERVALO_CONSULTA)
+            finally:
+                db.session.remove()
+
+
+def iniciar_worker_embutido(app):
+    """Roda o worker em uma thread do servidor web (só um processo do servidor por máquina fica com ele)"""
+    if not obter_trava_worker():
+        return False
+    threading.Thread(target=executar_worker, args=(app,), name='worker-correcao', daemon=True).start()
+    return True
+
+
+if __name__ == '__main__':
+    from app import app
+    if not obter_trava_worker():
+        print(f"⚠️ Já existe um worker da correção nesta máquina ({DIRETORIO_TAREFAS}); encerrando")
+    else:
+        executar_worker(app)
@@ -33,35 +33,37 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
-    // Configurar busca
+    // Configurar busca (no servidor, por trecho do título)
     const searchInput = document.getElementById('search-cadernos');
-    searchInput.addEventListener('input', function(e) {
-        const searchTerm = e.target.value.toLowerCase();
-        const cadernoCards = document.querySelectorAll('.caderno-card');
-        
-        cadernoCards.forEach(card => {
-            const titulo = card.querySelector('h3').textContent.toLowerCase();
-            if (titulo.includes(searchTerm)) {
-                card.style.display = 'block';
-            } else {
-                card.style.display = 'none';
-            }
-        });
+    let timerBusca = null;
+    searchInput.addEventListener('input', function() {
+        clearTimeout(timerBusca);
+        timerBusca = setTimeout(() => carregarCadernos(), 300);
     });
 
     // Atualizar estatísticas iniciais
     atualizarEstatisticas();
 });
 
-// Função para carregar cadernos do servidor
-function carregarCadernos() {
-    fetch('/api/cadernos')
+const CADERNOS_POR_PAGINA = 24;
+let proximoCursorCadernos = null;
+
+// Função para carregar cadernos do servidor (uma página por vez; `mais` acrescenta a próxima)
+function carregarCadernos(mais = false) {
+    const params = new URLSearchParams({ limite: CADERNOS_POR_PAGINA });
+    const busca = document.getElementById('search-cadernos').value.trim();
+    if (busca) params.set('busca', busca);
+    if (mais && proximoCursorCadernos) params.set('cursor', proximoCursorCadernos);
+
+    fetch(`/api/cadernos?${params}`)
         .then(response => response.json())
         .then(data => {
             const container = document.getElementById('cadernos-container');
             const emptyState = document.getElementById('empty-state');
             
-            container.innerHTML = '';
+            if (!mais) {
+                container.innerHTML = '';
+            }
             
             if (data.cadernos && data.cadernos.length > 0) {
                 emptyState.style.display = 'none';
@@ -70,11 +72,15 @@ function carregarCadernos() {
                     const card = criarCardCaderno(caderno);
                     container.appendChild(card);
                 });
-            } else {
+            } else if (!mais) {
                 emptyState.style.display = 'block';
             }
             
-            atualizarEstatisticas();
+            proximoCursorCadernos = data.paginacao ? data.paginacao.proximo_cursor : null;
+            atualizarBotaoCarregarMais(container);
+            if (!mais) {
+                atualizarEstatisticas();
+            }
         })
         .catch(error => {
             console.error('Erro ao carregar cadernos:', error);
@@ -83,6 +89,22 @@ function carregarCadernos() {
         });
 }
 
+// Botão "Carregar mais" abaixo da lista, visível enquanto houver próxima página
+function atualizarBotaoCarregarMais(container) {
+    let botao = document.getElementById('btn-carregar-mais-cadernos');
+    if (!botao) {
+        botao = document.createElement('button');
+        botao.id = 'btn-carregar-mais-cadernos';
+        botao.className = 'btn btn-outline';
+        botao.innerHTML = '<i class="fas fa-chevron-down"></i> Carregar mais';
+        botao.style.display = 'block';
+        botao.style.margin = '1rem auto';
+        botao.addEventListener('click', () => carregarCadernos(true));
+        container.insertAdjacentElement('afterend', botao);
+    }
+    botao.style.display = proximoCursorCadernos ? 'block' : 'none';
+}
+
 // Função para criar um card de caderno
 function criarCardCaderno(caderno) {
     const card = document.createElement('div');
@@ -633,26 +633,39 @@ class CorrecaoAutomatica {
             return;
         }
 
+        const config = this.getConfig();
+
         try {
-                const response = await fetch('/api/correcao-automatica/importar-resultado', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json'
-                    },
+            // Uma única requisição para todas as folhas (importação em lote no servidor)
+            const response = await fetch('/api/correcao-automatica/importar-resultados', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
                 body: JSON.stringify({
-                    resultados: resultadosValidos,
-                    config: this.getConfig()
+                    ano_avaliacao: config.ano_avaliacao,
+                    periodo_avaliacao: config.periodo_avaliacao,
+                    resultados: resultadosValidos.map(r => ({
+                        lote: r.lote,
+                        registration: r.matricula,
+                        answers: r.respostas
+                    }))
                 })
             });
 
             if (!response.ok) {
                 const errorData = await response.json();
-                throw new Error(errorData.error || 'Erro na importação em lote');
+                throw new Error(errorData.erro || errorData.error || 'Erro na importação em lote');
             }
 
             const data = await response.json();
-            
-            this.showToast('success', 'Sucesso', `${resultadosValidos.length} resultado(s) importado(s) com sucesso`);
+
+            if (data.total_erros > 0) {
+                data.resultados.filter(r => !r.sucesso).forEach(r => console.warn(`Folha ${r.indice + 1} não importada: ${r.erro}`));
+                this.showToast('warning', 'Atenção', `${data.total_sucesso} resultado(s) importado(s), ${data.total_erros} com erro`);
+            } else {
+                this.showToast('success', 'Sucesso', `${data.total_sucesso} resultado(s) importado(s) com sucesso`);
+            }
             
         } catch (error) {
             console.error('Erro na importação em lote:', error);
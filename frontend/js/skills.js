@@ -2,17 +2,25 @@ document.addEventListener('DOMContentLoaded', () => {
     const form = document.getElementById('habilidade-form');
     const tabela = document.getElementById('tabela-habilidades').getElementsByTagName('tbody')[0];
 
+    const POR_PAGINA = 10;
     let paginaAtual = 1;
     let totalPaginas = 1;
+    let cursores = [null]; // Cursor de início de cada página já visitada
     let habilidadeEditando = null;
 
-    // Função para atualizar tabela de habilidades
+    // Função para atualizar tabela de habilidades (paginação por cursor)
     async function atualizarTabela(page = 1) {
-        const resp = await fetch(`/api/habilidades?page=${page}&per_page=10`);
+        if (page > cursores.length) page = cursores.length;
+        const params = new URLSearchParams({ limite: POR_PAGINA, total: 1 });
+        if (cursores[page - 1]) params.set('cursor', cursores[page - 1]);
+        const resp = await fetch(`/api/habilidades?${params}`);
         const data = await resp.json();
         const habilidades = data.habilidades || [];
-        paginaAtual = data.page;
-        totalPaginas = data.pages;
+        const paginacao = data.paginacao || {};
+        paginaAtual = page;
+        totalPaginas = Math.max(1, Math.ceil((paginacao.total || 0) / POR_PAGINA));
+        cursores = cursores.slice(0, page);
+        if (paginacao.proximo_cursor) cursores.push(paginacao.proximo_cursor);
         tabela.innerHTML = '';
         habilidades.forEach(h => {
             tabela.innerHTML += `
@@ -43,7 +51,7 @@ document.addEventListener('DOMContentLoaded', () => {
         paginacao.innerHTML = `
             <button id="btn-anterior" ${paginaAtual <= 1 ? 'disabled' : ''}>Anterior</button>
             Página ${paginaAtual} de ${totalPaginas}
-            <button id="btn-proxima" ${paginaAtual >= totalPaginas ? 'disabled' : ''}>Próxima</button>
+            <button id="btn-proxima" ${cursores.length <= paginaAtual ? 'disabled' : ''}>Próxima</button>
         `;
         document.getElementById('btn-anterior').onclick = () => atualizarTabela(paginaAtual - 1);
         document.getElementById('btn-proxima').onclick = () => atualizarTabela(paginaAtual + 1);